@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def answer_key(processed_question):
+    """Canonical cache key for a processed question.
+
+    Two questions that resolve to the same concepts, question types and
+    reference type get the same answer, whatever their wording. Concepts
+    keep their order, as they are answered most specific first, and so do
+    question types: blocks are rendered in the order the question asks for
+    them.
+    """
+    concepts = tuple(dict.fromkeys(c.lower().strip() for c in processed_question['concepts']))
+    question_types = tuple(dict.fromkeys(processed_question.get('question_types') or ['definition']))
+    return concepts, question_types, processed_question.get('ref_type')
+
+
+class AnswerCache:
+    """Bounded LRU cache with a TTL for rendered answers.
+
+    Entries belong to one ontology version; switching to a different version
+    (e.g. a new snapshot digest) drops everything cached so far.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def set_version(self, version):
+        """Invalidate the cache if the ontology version changed"""
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.version = version
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            expires_at = self._clock() + self.ttl if self.ttl else None
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -1,60 +1,214 @@
+# Question type -> the ontology aspects its handler formats
+QUESTION_ASPECTS = {
+    'definition': ['definition', 'comments'],
+    'category': ['superclasses'],
+    'acronym': ['acronyms'],
+    'references': ['references'],
+    'alternative_names': ['alternative_names'],
+    'subclass': ['subclasses'],
+    'superclass': ['superclasses'],
+    'related': ['related'],
+    'comments': ['comments'],
+}
+
+# Reference type -> words looked for in a reference's predicate and URL
+REFERENCE_TYPES = {
+    'pdf': ['pdf', 'document', 'qb_pdf_link'],
+    'doi': ['doi'],
+    'url': ['url', 'link'],
+    'wiki': ['wikipedia', 'wiki'],
+    'paper': ['paper', 'article']
+}
+
+# Blocks rendered ahead for each concept: every question type, and the
+# references filtered by each reference type
+FRAGMENT_SLOTS = {(q_type, None): i for i, q_type in enumerate(QUESTION_ASPECTS)}
+FRAGMENT_SLOTS.update({('references', ref_type): len(FRAGMENT_SLOTS) + i
+                       for i, ref_type in enumerate(REFERENCE_TYPES)})
+
+
+class AnswerFragments:
+    """Answer blocks of every concept labelled in one version of the ontology.
+
+    A block is what one handler writes about one concept, or None when the
+    ontology has nothing for it. Each concept's blocks are kept with the
+    data they were rendered from, so that a new version of the ontology
+    only renders the concepts whose data changed.
+    """
+
+    def __init__(self):
+        self.blocks = {}        # concept -> tuple of blocks, indexed by FRAGMENT_SLOTS
+        self.sources = {}       # concept -> (record, names of its relations) the blocks show
+        self.suggestions = {}   # concept -> closest concept name, filled on first use
+        self.rendered = 0       # concepts rendered rather than taken over
+
+    def __contains__(self, concept):
+        return concept in self.blocks
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def block(self, concept, q_type, ref_type=None):
+        if q_type not in QUESTION_ASPECTS:
+            q_type = 'definition'
+        if q_type != 'references' or not ref_type:
+            ref_type = None
+        elif ref_type not in REFERENCE_TYPES:
+            return None
+        return self.blocks[concept][FRAGMENT_SLOTS[q_type, ref_type]]
+
+
 class AnswerGenerator:
     def __init__(self, ontology_parser):
         self.parser = ontology_parser
+        self.fragments = None
+
+    def precompute(self, previous=None):
+        """
+        Render the blocks of every concept labelled in the ontology, so that
+        answering about a known concept only joins strings.
+
+        Args:
+            previous (AnswerFragments): Blocks of the previous version of the
+                ontology; concepts whose data did not change keep theirs
+
+        Returns:
+            AnswerFragments: the blocks now used by this generator
+        """
+        fragments = AnswerFragments()
+        concepts = self.parser.get_all_concepts()
+        aspects = sorted({aspect for names in QUESTION_ASPECTS.values() for aspect in names})
+        records = self.parser.lookup(concepts, aspects)
+        for concept in concepts:
+            record = records[concept]
+            # Relations are shown by name, and names are read from the
+            # ontology too: a renamed relation changes the blocks
+            source = fragments.sources[concept] = (
+                record, [self.parser.relation_name(rel_type) for _, _, rel_type in record['related']])
+            # Comparing the records themselves is cheaper than hashing them
+            if previous is not None and previous.sources.get(concept) == source:
+                fragments.blocks[concept] = previous.blocks[concept]
+                continue
+            fragments.blocks[concept] = tuple(self._render(concept, q_type, record, ref_type)
+                                              for q_type, ref_type in FRAGMENT_SLOTS)
+            fragments.rendered += 1
+        self.fragments = fragments
+        return fragments
         
     def generate_answer(self, processed_question):
+        return "".join(self.stream_answer(processed_question))
+    
+    def stream_answer(self, processed_question):
+        """Yield the answer in pieces, one block per concept as soon as it is ready.
+        
+        Joining the pieces gives exactly the text of generate_answer.
+        """
         concepts = processed_question['concepts']
         question_types = processed_question.get('question_types', ['definition'])
-        text = processed_question.get('text', '')
         ref_type = processed_question.get('ref_type', None)
+        # Records fetched for these concepts so far, e.g. a follow-up's
+        # context; what else is fetched is added to it
+        records = processed_question.get('records')
         
         if not concepts:
-            return "👋 Hello! I'm sorry, I couldn't identify any specific concepts in your question. Could you please rephrase it?"
+            yield "👋 Hello! I'm sorry, I couldn't identify any specific concepts in your question. Could you please rephrase it?"
+            return
         
-        # Remove duplicates and normalize concepts
-        concepts = list(set([c.lower().strip() for c in concepts]))
+        # Remove duplicates and normalize concepts, keeping their order so the
+        # same question always gets the same answer
+        concepts = list(dict.fromkeys(c.lower().strip() for c in concepts))
         
-        all_answers = []
-        is_first_question = True  # Flag to track if this is the first question
+        aspects = set()
+        for q_type in question_types:
+            aspects.update(QUESTION_ASPECTS.get(q_type, QUESTION_ASPECTS['definition']))
+        aspects = sorted(aspects)
+        
+        answered = False
+        
+        if 'related' in question_types and len(concepts) > 1:
+            # "How is X related to Y": the chain of relations between the
+            # first two concepts, which come in the order the question
+            # names them, comes before what each is related to
+            path_answer = self._relation_path_answer(concepts[0], concepts[1])
+            if path_answer:
+                yield f"👋 Of course, here's how '{concepts[0]}' is related to '{concepts[1]}':\n\n{path_answer}"
+                answered = True
         
         for concept in concepts:
-            concept_answers = []
+            concept_answers = self._concept_answers(concept, question_types, aspects, ref_type, records)
+            if not concept_answers:
+                # Nothing under this spelling: try the closest concept name
+                suggestion = self._suggestion(concept)
+                if suggestion is not None and suggestion != concept:
+                    concept = suggestion
+                    concept_answers = self._concept_answers(concept, question_types, aspects, ref_type)
+            if not concept_answers:
+                continue
             
             # Start with greeting for the first question
-            if is_first_question:
-                concept_answers.append(f"👋 Of course, here's the information about '{concept}':")
-                is_first_question = False
+            if not answered:
+                concept_answers[:0] = [f"👋 Of course, here's the information about '{concept}':", '']
             
-            # Handle each requested information type
-            for q_type in question_types:
-                method = getattr(self, f'_handle_{q_type}_question', self._handle_definition_question)
-                if q_type == 'references' and ref_type:
-                    answer = method(concept, text, ref_type)
-                else:
-                    answer = method(concept, text)
-                if answer:
-                    # Add newline before each type except the first one
-                    if concept_answers and not answer.startswith('\n'):
-                        concept_answers.append('')  # Add empty line between different types
-                    concept_answers.append(answer)
-            
-            if concept_answers:
-                all_answers.append('\n'.join(concept_answers))
+            # Blocks are separated by a blank line
+            yield ("\n\n" if answered else "") + '\n'.join(concept_answers)
+            answered = True
         
-        if not all_answers:
-            return "👋 I'm sorry, I couldn't find the requested information in my knowledge base. Could you please rephrase your question or ask about a different concept?"
+        if not answered:
+            yield "👋 I'm sorry, I couldn't find the requested information in my knowledge base. Could you please rephrase your question or ask about a different concept?"
+            return
         
-        # Format the final answer with proper spacing and structure
-        final_answer = "\n\n".join(all_answers)
-        if final_answer:
-            final_answer += "\nWould you like to know anything else? 😊"
+        yield "\nWould you like to know anything else? 😊"
+    
+    def _concept_answers(self, concept, question_types, aspects, ref_type, records=None):
+        """
+        Answer lines for one concept, empty if the ontology has nothing on it.
+
+        `records` maps concepts to the aspects already fetched for them; the
+        aspects fetched here are added to it.
+        """
+        concept_answers = []
+        if self.fragments is not None and concept in self.fragments:
+            answers = [self.fragments.block(concept, q_type, ref_type) for q_type in question_types]
+        else:
+            record = {} if records is None else records.setdefault(concept, {})
+            missing = [aspect for aspect in aspects if aspect not in record]
+            if missing:
+                # Fetch everything the handlers still need for this concept in one lookup
+                record.update(self.parser.lookup([concept], missing)[concept])
+            answers = [self._render(concept, q_type, record, ref_type) for q_type in question_types]
         
-        return final_answer
+        # One block per requested information type
+        for answer in answers:
+            if answer:
+                # Add newline before each type except the first one
+                if concept_answers and not answer.startswith('\n'):
+                    concept_answers.append('')  # Add empty line between different types
+                concept_answers.append(answer)
+        return concept_answers
+
+    def _suggestion(self, concept):
+        """The concept name spelled most like the concept, None if there is none close"""
+        fragments = self.fragments
+        if fragments is not None and concept in fragments:
+            # Known labels are few, so remember what they resolve to
+            if concept not in fragments.suggestions:
+                suggestions = self.parser.suggest_concepts(concept, limit=1)
+                fragments.suggestions[concept] = suggestions[0][0] if suggestions else None
+            return fragments.suggestions[concept]
+        suggestions = self.parser.suggest_concepts(concept, limit=1)
+        return suggestions[0][0] if suggestions else None
+
+    def _render(self, concept, q_type, record, ref_type=None):
+        """The block one question type's handler writes for a concept"""
+        method = getattr(self, f'_handle_{q_type}_question', self._handle_definition_question)
+        if q_type == 'references' and ref_type:
+            return method(concept, record, ref_type)
+        return method(concept, record)
     
-    def _handle_definition_question(self, concept, text):
+    def _handle_definition_question(self, concept, record):
         """Handle definition questions"""
-        definitions = self.parser.get_concept_definition(concept)
-        comments = self.parser.get_comments(concept)  # Get comments using rdfs:comment
+        definitions = record['definition']
+        comments = record['comments']  # Comments from rdfs:comment
         
         if not definitions and not comments:
             return None
@@ -74,8 +228,8 @@ class AnswerGenerator:
                 
         return "\n".join(answer)
         
-    def _handle_category_question(self, concept, text):
-        superclasses = self.parser.get_superclasses(concept)
+    def _handle_category_question(self, concept, record):
+        superclasses = record['superclasses']
         if not superclasses:
             return None
             
@@ -87,9 +241,9 @@ class AnswerGenerator:
                 added.add(label)
         return "\n".join(answer)
     
-    def _handle_acronym_question(self, concept, text):
+    def _handle_acronym_question(self, concept, record):
         """Handle acronym questions"""
-        acronyms = self.parser.get_acronyms(concept)
+        acronyms = record['acronyms']
         if not acronyms:
             return None
             
@@ -98,24 +252,16 @@ class AnswerGenerator:
             answer.append(f"{acronym}")
         return "\n".join(answer)
         
-    def _handle_references_question(self, concept, text, ref_type=None):
+    def _handle_references_question(self, concept, record, ref_type=None):
         """Handle questions about references and links"""
-        references = self.parser.get_references(concept)
+        references = record['references']
         if not references:
             return None
             
         # Filter references by type if specified
         if ref_type:
-            type_map = {
-                'pdf': ['pdf', 'document', 'qb_pdf_link'],
-                'doi': ['doi'],
-                'url': ['url', 'link'],
-                'wiki': ['wikipedia', 'wiki'],
-                'paper': ['paper', 'article']
-            }
-            
             filtered_refs = []
-            keywords = type_map.get(ref_type, [])
+            keywords = REFERENCE_TYPES.get(ref_type, [])
             for ref, ref_type_str in references:
                 ref_type_lower = ref_type_str.lower()
                 if any(keyword in ref_type_lower or keyword in ref.lower() for keyword in keywords):
@@ -142,17 +288,18 @@ class AnswerGenerator:
             # Clean up reference type name
             clean_type = ref_type_str.split('#')[-1].replace('_', ' ').title()
             for ref in refs:
+                # Plain URLs: the renderer turns them into links
                 if 'wikipedia' in ref_type_str.lower():
-                    answer.append(f"• Wikipedia Entry: <a href='{ref}' target='_blank'>{ref}</a>")
+                    answer.append(f"• Wikipedia Entry: {ref}")
                 elif 'qb_pdf_link' in ref_type_str.lower():
-                    answer.append(f"• Documentation: <a href='{ref}' target='_blank'>{ref}</a>")
+                    answer.append(f"• Documentation: {ref}")
                 else:
-                    answer.append(f"• {clean_type}: <a href='{ref}' target='_blank'>{ref}</a>")
+                    answer.append(f"• {clean_type}: {ref}")
         
         return "\n".join(answer)
     
-    def _handle_alternative_names_question(self, concept, text):
-        alt_names = self.parser.get_alternative_names(concept)
+    def _handle_alternative_names_question(self, concept, record):
+        alt_names = record['alternative_names']
         if not alt_names:
             return None
             
@@ -164,8 +311,8 @@ class AnswerGenerator:
                 added.add(name)
         return "\n".join(answer)
     
-    def _handle_subclass_question(self, concept, text):
-        subclasses = self.parser.get_subclasses(concept)
+    def _handle_subclass_question(self, concept, record):
+        subclasses = record['subclasses']
         if not subclasses:
             return None
             
@@ -177,25 +324,35 @@ class AnswerGenerator:
                 added.add(label)
         return "\n".join(answer)
     
-    def _handle_superclass_question(self, concept, text):
-        return self._handle_category_question(concept, text)
+    def _handle_superclass_question(self, concept, record):
+        return self._handle_category_question(concept, record)
     
-    def _handle_related_question(self, concept, text):
-        related = self.parser.get_related_concepts(concept)
+    def _handle_related_question(self, concept, record):
+        related = record['related']
         if not related:
             return None
             
         answer = [f"🔗 Concepts related to '{concept}':"]
         added = set()  # To prevent duplicate relations
         for _, label, rel_type in related:
-            rel_type = rel_type.split('#')[-1]
+            rel_type = self.parser.relation_name(rel_type)
             if (label, rel_type) not in added:
                 answer.append(f"• {label} ({rel_type})")
                 added.add((label, rel_type))
         return "\n".join(answer)
     
-    def _handle_comments_question(self, concept, text):
-        comments = self.parser.get_comments(concept)
+    def _relation_path_answer(self, concept, other):
+        """The shortest chain of relations between two concepts, None if there is none"""
+        path = self.parser.find_relation_path(concept, other)
+        if not path:
+            return None
+        answer = [f"🧭 Connection:"]
+        for subject, relation, obj in path:
+            answer.append(f"• {subject} → {relation} → {obj}")
+        return "\n".join(answer)
+    
+    def _handle_comments_question(self, concept, record):
+        comments = record['comments']
         if not comments:
             return None
             
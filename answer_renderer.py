@@ -0,0 +1,76 @@
+import html
+import re
+
+CLOSING_PHRASE = "Would you like to know anything else? 😊"
+
+# The answer is HTML-escaped first, then one pass over the escaped text
+# recognises anchors written in the ontology's text, bare URLs and the
+# closing phrase. Matched hrefs and labels are therefore already escaped
+# when they are put back into an anchor. URLs keep their escaped '&' and
+# apostrophes ("Shor's_algorithm"); an href runs to the last quote like its
+# opening one before the end of the tag, so an apostrophe inside
+# href='...' does not cut it short. Every alternative starts with a literal
+# so the regex engine can skip ahead to candidate positions.
+_QUOTE = r"(?:&#x27;|&quot;)"
+TOKEN_PATTERN = re.compile(
+    r"&lt;a\s+href=(?P<quote>&#x27;|&quot;)"
+    + r"(?P<href>(?:[^&\s]|&(?:amp|#x27|quot);)*)(?P=quote)"
+    + r"(?:\s+[\w-]+=" + _QUOTE + r"[^&]*" + _QUOTE + r")*\s*&gt;"
+    + r"(?P<label>[^&]*(?:&(?!lt;/a&gt;)[^&]*)*)&lt;/a&gt;"
+    r"|https?://(?:[^\s&]|&amp;|&#x27;)+"
+    r"|\n" + re.escape(CLOSING_PHRASE)
+    + r"|" + re.escape(CLOSING_PHRASE)
+)
+
+
+def _anchor(href, label):
+    return f'<a href="{href}" target="_blank" rel="noopener">{label}</a>'
+
+
+def _split_url(url):
+    """Separate trailing punctuation that ends a sentence or a quote rather than the URL"""
+    end = len(url)
+    while end:
+        if url.endswith('&#x27;', 0, end):
+            end -= len('&#x27;')
+        elif url[end - 1] in '.,:!?' or (url[end - 1] == ')' and url.count('(', 0, end) < url.count(')', 0, end)):
+            end -= 1
+        else:
+            break
+    return url[:end], url[end:]
+
+
+def _render(text, closing):
+    seen_closing = []
+
+    def replace(match):
+        token = match.group()
+        if token[0] == '&':
+            return _anchor(match.group('href'), match.group('label'))
+        if token[0] == 'h':
+            url, trailing = _split_url(token)
+            return _anchor(url, url) + trailing
+        if closing:
+            seen_closing.append(True)
+            return ''
+        return token
+
+    rendered = TOKEN_PATTERN.sub(replace, html.escape(text))
+    if seen_closing:
+        rendered += "\n" + CLOSING_PHRASE
+    return rendered
+
+
+def render_fragment(text):
+    """Escape a piece of answer text and make its links clickable"""
+    return _render(text, closing=False)
+
+
+def render_answer(answer):
+    """
+    Render a generated answer into the HTML shown in the chat.
+
+    Plain text is escaped, URLs and existing anchors become one canonical
+    link each, and the closing phrase is kept once, at the end.
+    """
+    return _render(answer, closing=True)
@@ -1,72 +1,419 @@
-from flask import Flask, render_template, request, redirect, url_for, session
-from ontology_parser import OntologyParser
-from question_processor import QuestionProcessor
-from answer_generator import AnswerGenerator
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response, stream_with_context
+from ontology_registry import OntologyRegistry
+from answer_cache import AnswerCache, answer_key
+from answer_renderer import render_answer, render_fragment
+from chat_history import create_history_store
+from conversation_context import ConceptContext, ConceptContextCache
+from metrics import REGISTRY, REQUEST_SECONDS, QUERIES_PER_REQUEST, ERRORS, stage, start_trace, current_trace, end_trace
+import gc
+import json
+import logging
 import os
+import time
+import uuid
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24)  # для работы с сессиями
+# для работы с сессиями; set SECRET_KEY so sessions survive restarts and are
+# shared between workers
+app.secret_key = os.environ.get('SECRET_KEY') or os.urandom(24)
+
+# Messages shown per page of chat history
+HISTORY_PAGE_SIZE = 50
+
+# Bounds on the relation graph queries a request can ask for
+MAX_HOPS = 6
+MAX_NEIGHBORS = 500
+MAX_SEARCH_RESULTS = 100
+
+# Requests slower than SLOW_REQUEST_MS are logged as JSON with their question
+# and per-stage breakdown, to SLOW_REQUEST_LOG if set and stderr otherwise
+SLOW_REQUEST_MS = float(os.environ['SLOW_REQUEST_MS']) if os.environ.get('SLOW_REQUEST_MS') else None
+slow_request_log = logging.getLogger('cryptology.slow_requests')
+if os.environ.get('SLOW_REQUEST_LOG'):
+    slow_request_log.addHandler(logging.FileHandler(os.environ['SLOW_REQUEST_LOG']))
+
+# Ontologies are read from the catalog; ONTOLOGY picks the one served (an
+# ontology IRI from the catalog, the first entry by default)
+ONTOLOGY_CATALOG = os.environ.get('ONTOLOGY_CATALOG', 'catalog-v001.xml')
+# Seconds between checks for changed ontology files; 0 disables hot reload
+ONTOLOGY_POLL_SECONDS = float(os.environ.get('ONTOLOGY_POLL_SECONDS', 2))
+# 'rdflib' keeps the whole graph; 'compact' keeps only what answers read
+ONTOLOGY_BACKEND = os.environ.get('ONTOLOGY_BACKEND', 'rdflib')
 
 # Initialize components
 def init_components():
-    ontology_parser = OntologyParser("crypto_2_1_1.rdf")
-    question_processor = QuestionProcessor(ontology_parser)
-    answer_generator = AnswerGenerator(ontology_parser)
-    return ontology_parser, question_processor, answer_generator
+    if os.path.exists(ONTOLOGY_CATALOG):
+        registry = OntologyRegistry.from_catalog(ONTOLOGY_CATALOG, default=os.environ.get('ONTOLOGY'),
+                                                 poll_interval=ONTOLOGY_POLL_SECONDS, backend=ONTOLOGY_BACKEND)
+    else:
+        registry = OntologyRegistry({'crypto': 'crypto_2_1_1.rdf'}, poll_interval=ONTOLOGY_POLL_SECONDS,
+                                    backend=ONTOLOGY_BACKEND)
+    ontology = registry.get()
+    stats = ontology.parser.load_stats
+    if stats['source'] == 'snapshot':
+        print(f"Ontology loaded from snapshot in {stats['load_seconds'] * 1000:.1f} ms "
+              f"(RDF parse took {stats['parse_seconds'] * 1000:.1f} ms)")
+    else:
+        print(f"Ontology parsed from RDF in {stats['parse_seconds'] * 1000:.1f} ms")
+    print(f"Concept matcher built in {ontology.processor.timings['concept_matcher'] * 1000:.1f} ms "
+          f"(spaCy loads on first use)")
+    registry.start()
+    return registry
+
+# How this process serves requests, reported by /healthz and /readyz;
+# server.py fills in the worker details and sets `draining` when a worker
+# stops taking requests
+server_state = {'server': 'single process', 'started_at': time.time(), 'draining': False}
 
 # Load components
 try:
-    ontology_parser, question_processor, answer_generator = init_components()
+    ontologies = init_components()
 except Exception as e:
     print(f"Error initializing components: {str(e)}")
     raise e
 
+answer_cache = AnswerCache(maxsize=1024, ttl=3600)
+# 'memory' (per process) or 'sqlite:///path/to/history.db' (shared by workers)
+chat_history = create_history_store(os.environ.get('CHAT_HISTORY_STORE', 'memory'))
+# Concepts each conversation last asked about, for follow-up questions
+concept_contexts = ConceptContextCache()
+
+FOLLOW_UPS = REGISTRY.counter(
+    'cryptology_follow_ups_total', 'Follow-up questions, by where their concepts came from', ['source'])
+
+def answer_cache_metrics():
+    """Answer cache counters, read when /metrics is scraped"""
+    stats = answer_cache.stats()
+    lines = []
+    for name in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+        metric = f'cryptology_answer_cache_{name}_total'
+        lines += [f'# TYPE {metric} counter', f'{metric} {stats[name]}']
+    lines += ['# TYPE cryptology_answer_cache_entries gauge', f"cryptology_answer_cache_entries {stats['size']}"]
+    return lines
+
+REGISTRY.collectors.append(answer_cache_metrics)
+
+def startup_metrics():
+    """Seconds the current ontology version's question processor took to set up, by phase"""
+    timings = ontologies.get().processor.timings
+    lines = ['# TYPE cryptology_startup_seconds gauge']
+    lines += [f'cryptology_startup_seconds{{phase="{phase}"}} {seconds}' for phase, seconds in timings.items()]
+    return lines
+
+REGISTRY.collectors.append(startup_metrics)
+
+@app.before_request
+def begin_request_trace():
+    start_trace(request.endpoint or 'unmatched')
+
+@app.after_request
+def record_status(response):
+    trace = current_trace()
+    if trace is not None:
+        trace.status = response.status_code
+        if response.is_streamed:
+            # Teardown runs before a streamed body is generated; finish the
+            # trace once the body has been sent instead
+            trace.streamed = True
+            response.call_on_close(lambda: finish_request_trace(trace))
+    return response
+
+@app.teardown_request
+def end_request(exc):
+    trace = current_trace()
+    if trace is None:
+        return
+    if exc is not None:
+        ERRORS.inc(trace.endpoint, type(exc).__name__)
+    if not trace.streamed:
+        finish_request_trace(trace)
+
+def finish_request_trace(trace):
+    """Record a request's metrics and log it if it was slow"""
+    end_trace(trace)
+    REQUEST_SECONDS.observe(trace.elapsed(), trace.endpoint, trace.status or 500)
+    QUERIES_PER_REQUEST.observe(sum(trace.queries.values()), trace.endpoint)
+    if SLOW_REQUEST_MS is not None and trace.elapsed() * 1000 >= SLOW_REQUEST_MS:
+        slow_request_log.warning(json.dumps(trace.summary(), ensure_ascii=False))
+
+def record_error(e):
+    """Count and log an exception that the user is not shown"""
+    trace = current_trace()
+    ERRORS.inc(trace.endpoint if trace else 'unknown', type(e).__name__)
+    app.logger.exception('Could not answer %r', trace.question if trace else None)
+
+def trace_question(user_input):
+    trace = current_trace()
+    if trace is not None:
+        trace.question = user_input
+
+def get_answer(processed_question, ontology):
+    """Rendered answer for a processed question, served from the cache when possible"""
+    answer_cache.set_version(ontology.digest)
+    key = answer_key(processed_question)
+    answer = answer_cache.get(key)
+    if answer is None:
+        with stage('generate_answer'):
+            answer = ontology.generator.generate_answer(processed_question)
+        with stage('render_answer'):
+            answer = render_answer(answer)
+        answer_cache.put(key, answer)
+    return answer
+
+def question_from_key(key):
+    """Rebuild the part of a processed question that answers depend on"""
+    concepts, question_types, ref_type = key
+    return {'concepts': list(concepts), 'question_types': list(question_types), 'ref_type': ref_type}
+
+def follow_up_context(user_input, ontology):
+    """The concepts a follow-up question refers to, None if it is not one"""
+    if not ontology.processor.is_follow_up(user_input):
+        return None
+    cid = conversation_id()
+    context = concept_contexts.get(cid, ontology.digest)
+    if context is not None:
+        FOLLOW_UPS.inc('cache')
+        return context
+    # Answered by another worker, or before a reload: start from the
+    # concepts of the last answer in the history
+    with stage('history'):
+        last = chat_history.messages(cid, max(chat_history.count(cid) - 1, 0), 1)
+    if not last or not last[0].get('answer_key') or not last[0]['answer_key'][0]:
+        FOLLOW_UPS.inc('none')
+        return None
+    FOLLOW_UPS.inc('history')
+    context = ConceptContext(last[0]['answer_key'][0], ontology.digest)
+    concept_contexts.put(cid, context)
+    return context
+
+def process_message(user_input, ontology):
+    """Process a question, resolving follow-ups against the conversation's last concepts"""
+    with stage('process_question'):
+        processed_question = ontology.processor.process_question(
+            user_input, follow_up_context(user_input, ontology))
+        if processed_question['concepts'] and not processed_question.get('follow_up'):
+            # Only the concepts: records are fetched if a follow-up comes
+            concept_contexts.put(conversation_id(), ConceptContext(processed_question['concepts'], ontology.digest))
+    return processed_question
+
+def conversation_id():
+    """The current conversation; the session only holds its ID"""
+    if 'conversation_id' not in session:
+        session['conversation_id'] = uuid.uuid4().hex
+    return session['conversation_id']
+
+def append_turn(cid, user_input, processed_question, answer):
+    """Add a question and its answer to the chat history.
+    
+    The assistant turn stores the rendered answer the user was sent, and
+    its answer key, whose concepts follow-up questions refer to.
+    """
+    with stage('history'):
+        chat_history.append(cid, [
+            {'role': 'user', 'content': user_input},
+            {'role': 'assistant', 'content': answer, 'answer_key': list(answer_key(processed_question))},
+        ])
+
+def chat_messages(history, ontology):
+    """Chat history as it was sent, without going through the answer cache"""
+    messages = []
+    for message in history:
+        if 'content' not in message:
+            # Turns recorded before answers were stored hold only their key
+            message = {'role': message['role'], 'content': render_answer(
+                ontology.generator.generate_answer(question_from_key(message['answer_key'])))}
+        messages.append(message)
+    return messages
+
+def message_input():
+    """The user's message from a form post or a JSON body"""
+    data = request.get_json(silent=True) or request.form
+    user_input = (data.get('user_input') or '').strip()
+    trace_question(user_input)
+    return user_input
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.route('/')
 def home():
-    if 'chat_history' not in session:
-        session['chat_history'] = []
-    return render_template('index.html', chat_history=session['chat_history'])
+    # Page 1 is the most recent HISTORY_PAGE_SIZE messages, page 2 the ones before
+    page = max(request.args.get('page', 1, type=int), 1)
+    cid = conversation_id()
+    with stage('history'):
+        total = chat_history.count(cid)
+        end = max(total - (page - 1) * HISTORY_PAGE_SIZE, 0)
+        start = max(end - HISTORY_PAGE_SIZE, 0)
+        history = chat_history.messages(cid, start, end - start)
+    messages = chat_messages(history, ontologies.get())
+    with stage('render_page'):
+        return render_template('index.html', chat_history=messages,
+                               older_page=page + 1 if start > 0 else None)
 
 @app.route('/send_message', methods=['POST'])
 def send_message():
     user_input = request.form.get('user_input')
+    trace_question(user_input)
     
     if user_input.strip():
         # Process user input
         try:
-            processed_question = question_processor.process_question(user_input)
-            answer = answer_generator.generate_answer(processed_question)
-            
-            # Remove duplicate "Would you like to know anything else?" phrases
-            answer_parts = answer.split("Would you like to know anything else? 😊")
-            answer = "".join(answer_parts[:-1])  # Join all parts except the last one
-            if answer_parts:  # Add the phrase only once at the end
-                answer += "\nWould you like to know anything else? 😊"
-            
-            # Make links clickable in the answer
-            answer = answer.replace("https://", '<a href="https://', -1).replace("</a>", "", -1)
-            answer = answer.replace("http://", '<a href="http://', -1)
-            for url in answer.split():
-                if url.startswith(("http://", "https://")):
-                    if '">' not in url:
-                        answer = answer.replace(url, f'{url}">{url}</a>')
+            # The version current now answers this request, even if a reload
+            # swaps in a new one meanwhile
+            ontology = ontologies.get()
+            processed_question = process_message(user_input, ontology)
+            answer = get_answer(processed_question, ontology)
             
             # Update chat history
-            if 'chat_history' not in session:
-                session['chat_history'] = []
-            
-            session['chat_history'].append({'role': 'user', 'content': user_input})
-            session['chat_history'].append({'role': 'assistant', 'content': answer})
-            session.modified = True
+            append_turn(conversation_id(), user_input, processed_question, answer)
             
         except Exception as e:
-            pass  # Hide errors
+            record_error(e)  # counted and logged, but hidden from the user
 
     return redirect(url_for('home'))
 
+@app.route('/api/messages', methods=['POST'])
+def api_message():
+    """Answer one message and return only the new turn as JSON"""
+    user_input = message_input()
+    if not user_input:
+        return jsonify({'error': 'Empty message'}), 400
+    
+    ontology = ontologies.get()
+    processed_question = process_message(user_input, ontology)
+    answer = get_answer(processed_question, ontology)
+    append_turn(conversation_id(), user_input, processed_question, answer)
+    return jsonify({'turn': [
+        {'role': 'user', 'content': user_input},
+        {'role': 'assistant', 'content': answer},
+    ]})
+
+@app.route('/api/messages/stream', methods=['POST'])
+def stream_message():
+    """Answer one message as Server-Sent Events, one event per concept block.
+    
+    Events: `block` carries each rendered piece as it is generated, `done`
+    carries the complete rendered answer, `error` reports a failure.
+    """
+    user_input = message_input()
+    if not user_input:
+        return jsonify({'error': 'Empty message'}), 400
+    
+    ontology = ontologies.get()
+    processed_question = process_message(user_input, ontology)
+    # Known now: the session cookie goes out with the headers, before the body
+    cid = conversation_id()
+    
+    def events():
+        try:
+            answer_cache.set_version(ontology.digest)
+            key = answer_key(processed_question)
+            answer = answer_cache.get(key)
+            if answer is None:
+                pieces = []
+                # Includes the time the client takes to read each block
+                with stage('stream_answer'):
+                    for piece in ontology.generator.stream_answer(processed_question):
+                        pieces.append(piece)
+                        yield sse_event('block', {'content': render_fragment(piece)})
+                with stage('render_answer'):
+                    answer = render_answer("".join(pieces))
+                answer_cache.put(key, answer)
+            else:
+                yield sse_event('block', {'content': answer})
+            append_turn(cid, user_input, processed_question, answer)
+            yield sse_event('done', {'role': 'assistant', 'content': answer})
+        except Exception as e:
+            record_error(e)
+            yield sse_event('error', {'error': 'Could not generate an answer'})
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/ontologies')
+def list_ontologies():
+    """The ontologies in the catalog and the loaded version of each"""
+    loaded = {version.name: version.describe() for version in ontologies.loaded()}
+    return jsonify({
+        'default': ontologies.default,
+        'ontologies': [loaded.get(name, {'name': name, 'rdf_file': ontologies.sources[name]})
+                       for name in ontologies.names()],
+    })
+
+def concept_argument(ontology, name):
+    """A concept named in a query argument, by label, acronym or alternative name"""
+    text = (request.args.get(name) or '').strip().lower()
+    return (ontology.processor.matcher.match(text) or [text])[0] if text else None
+
+@app.route('/api/concepts/neighborhood')
+def concept_neighborhood():
+    """Concepts within `hops` relations of `concept`, nearest first"""
+    ontology = ontologies.get()
+    concept = concept_argument(ontology, 'concept')
+    if not concept:
+        return jsonify({'error': 'Missing concept'}), 400
+    hops = min(max(request.args.get('hops', 2, type=int), 1), MAX_HOPS)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_NEIGHBORS)
+    neighbors = ontology.parser.get_neighborhood(concept, hops, limit)
+    return jsonify({'concept': concept, 'neighbors': [
+        {'iri': iri, 'label': label, 'distance': distance} for iri, label, distance in neighbors]})
+
+@app.route('/api/concepts/path')
+def concept_path():
+    """The shortest chain of relations from `source` to `target`"""
+    ontology = ontologies.get()
+    source, target = concept_argument(ontology, 'source'), concept_argument(ontology, 'target')
+    if not source or not target:
+        return jsonify({'error': 'Missing source or target'}), 400
+    path = ontology.parser.find_relation_path(source, target, MAX_HOPS)
+    return jsonify({'source': source, 'target': target, 'path': None if path is None else [
+        {'subject': subject, 'relation': relation, 'object': obj} for subject, relation, obj in path]})
+
+@app.route('/search')
+def search():
+    """Concepts whose names, definitions and comments best match `q`"""
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({'error': 'Missing q'}), 400
+    limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_SEARCH_RESULTS)
+    results = ontologies.get().parser.search(text, limit)
+    return jsonify({'query': text, 'results': [
+        {'iri': iri, 'label': label, 'score': round(score, 4), 'coverage': round(coverage, 4)}
+        for iri, label, score, coverage in results]})
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and answering requests"""
+    return jsonify({'status': 'ok', 'pid': os.getpid(),
+                    'uptime_seconds': round(time.time() - server_state['started_at'], 1)})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: the default ontology is loaded and the process is not shutting down"""
+    versions = {version.name: version for version in ontologies.loaded()}
+    ready = ontologies.default in versions and not server_state['draining']
+    return jsonify({
+        'ready': ready,
+        'pid': os.getpid(),
+        'server': server_state,
+        'ontologies': {name: {
+            'digest': version.digest,
+            'loaded_at': version.loaded_at,
+            'source': version.parser.load_stats['source'],
+            'nlp_loaded': version.processor.nlp_loaded,
+        } for name, version in versions.items()},
+        'gc_frozen_objects': gc.get_freeze_count(),
+    }), 200 if ready else 503
+
+@app.route('/metrics')
+def metrics():
+    """Counters and histograms of this process in the Prometheus text format"""
+    return Response(REGISTRY.expose(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/clear_chat', methods=['POST'])
 def clear_chat():
-    session['chat_history'] = []
+    chat_history.clear(conversation_id())
+    concept_contexts.clear(conversation_id())
     return redirect(url_for('home'))
 
 if __name__ == '__main__':
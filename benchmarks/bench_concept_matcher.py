@@ -0,0 +1,81 @@
+"""Compare the old substring scan with the Aho-Corasick concept matcher.
+
+Run from the repository root:
+    python benchmarks/bench_concept_matcher.py [--questions 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ontology_parser import OntologyParser
+from concept_matcher import ConceptMatcher
+
+TEMPLATES = [
+    "what is {}",
+    "what is {} and how does it relate to {}?",
+    "can you tell me about {}",
+    "give me the wikipedia link for {}",
+    "what is the acronym of {}",
+    "what are the other names for {}",
+    "explain the difference between {} and {}",
+    "where can i find references about {}?",
+    "how do people break ciphers nowadays",
+    "tell me something interesting",
+]
+
+
+def make_questions(labels, count, seed=0):
+    rng = random.Random(seed)
+    labels = sorted(labels)
+    questions = []
+    for _ in range(count):
+        template = rng.choice(TEMPLATES)
+        questions.append(template.format(*(rng.choice(labels) for _ in range(template.count("{}")))))
+    return questions
+
+
+def old_match(all_concepts, text):
+    text_lower = text.lower()
+    matched = [concept for concept in all_concepts if concept in text_lower]
+    matched.sort(key=len, reverse=True)
+    return matched
+
+
+def timed(func, questions):
+    start = time.perf_counter()
+    for question in questions:
+        func(question)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=5000)
+    parser.add_argument("--rdf", default="crypto_2_1_1.rdf")
+    args = parser.parse_args()
+
+    ontology = OntologyParser(args.rdf)
+    all_concepts = set(ontology.get_all_concepts())
+
+    start = time.perf_counter()
+    matcher = ConceptMatcher(ontology.get_concept_names())
+    build = time.perf_counter() - start
+
+    questions = make_questions(all_concepts, args.questions)
+    old = timed(lambda q: old_match(all_concepts, q), questions)
+    new = timed(matcher.match, questions)
+
+    print(f"questions:        {len(questions)}")
+    print(f"patterns:         {len(matcher.patterns)} (labels: {len(all_concepts)})")
+    print(f"automaton build:  {build * 1000:.2f} ms")
+    print(f"substring scan:   {old * 1e6 / len(questions):.1f} us/question")
+    print(f"aho-corasick:     {new * 1e6 / len(questions):.1f} us/question")
+    print(f"speedup:          {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
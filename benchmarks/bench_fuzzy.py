@@ -0,0 +1,120 @@
+"""Recall and latency of typo-tolerant concept lookup on misspelled queries.
+
+Surface forms (labels, acronyms and alternative names) long enough to be
+matched fuzzily get one or two random typos: a deleted, inserted,
+substituted or swapped character. FuzzyIndex.search is compared with a
+brute-force difflib scan over the same folded forms, and FuzzyIndex.match
+with the exact concept matcher on the typos embedded in a question.
+
+Run from the repository root:
+    python benchmarks/bench_fuzzy.py [--queries 1000]
+"""
+import argparse
+import difflib
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ontology_parser import OntologyParser
+from concept_matcher import ConceptMatcher
+from fuzzy_index import FuzzyIndex, fold
+
+
+def misspell(form, typos, rng):
+    chars = list(form)
+    for _ in range(typos):
+        letters = [i for i, char in enumerate(chars) if char.isalnum()]
+        i = rng.choice(letters)
+        edit = rng.choice(['delete', 'insert', 'substitute', 'swap'])
+        if edit == 'delete':
+            del chars[i]
+        elif edit == 'insert':
+            chars.insert(i, rng.choice(string.ascii_lowercase))
+        elif edit == 'substitute':
+            chars[i] = rng.choice(string.ascii_lowercase)
+        elif i + 1 < len(chars) and chars[i + 1].isalnum():
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return ''.join(chars)
+
+
+def make_queries(names, min_length, typos, count, seed=0):
+    """(misspelled form, expected label) pairs; typos that spell another
+    surface form are skipped"""
+    rng = random.Random(seed)
+    known = {fold(form) for form, _ in names}
+    names = sorted((form, label) for form, label in names if len(fold(form)) >= min_length)
+    queries = []
+    while len(queries) < count:
+        form, label = rng.choice(names)
+        typo = misspell(form, typos, rng)
+        if fold(typo) not in known:
+            queries.append((typo, label))
+    return queries
+
+
+def percentile(samples, fraction):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run(name, lookup, queries):
+    """Time lookup on every query; lookup returns labels, best first"""
+    latencies = []
+    top1 = top5 = 0
+    for text, label in queries:
+        start = time.perf_counter()
+        labels = lookup(text)
+        latencies.append(time.perf_counter() - start)
+        top1 += bool(labels) and labels[0] == label
+        top5 += label in labels[:5]
+    print(f"{name:<28} recall@1 {top1 / len(queries):6.1%}  recall@5 {top5 / len(queries):6.1%}  "
+          f"p50 {statistics.median(latencies) * 1e6:7.1f} us  "
+          f"p95 {percentile(latencies, 0.95) * 1e6:7.1f} us  "
+          f"max {max(latencies) * 1e6:7.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=1000, help="queries per number of typos")
+    parser.add_argument("--rdf", default="crypto_2_1_1.rdf")
+    args = parser.parse_args()
+
+    ontology = OntologyParser(args.rdf)
+    names = ontology.get_concept_names()
+
+    start = time.perf_counter()
+    fuzzy = FuzzyIndex(names)
+    build = time.perf_counter() - start
+    matcher = ConceptMatcher(names)
+
+    # Brute force reference: difflib over every folded form
+    forms = {}
+    for key, label in fuzzy.entries:
+        forms.setdefault(key, label)
+
+    def brute_force(text):
+        labels = []
+        for key in difflib.get_close_matches(fold(text), forms, n=10, cutoff=fuzzy.threshold):
+            if forms[key] not in labels:
+                labels.append(forms[key])
+        return labels
+
+    print(f"surface forms:   {len(fuzzy.entries)}")
+    print(f"index build:     {build * 1000:.2f} ms")
+    for typos in (1, 2):
+        queries = make_queries(names, fuzzy.min_length, typos, args.queries)
+        questions = [(f"what is {text} and where can i read about it?", label) for text, label in queries]
+        print()
+        print(f"{len(queries)} queries with {typos} typo{'s' if typos > 1 else ''}")
+        run("difflib scan", brute_force, queries)
+        run("FuzzyIndex.search", lambda text: [label for label, _ in fuzzy.search(text)], queries)
+        run("exact matcher, question", matcher.match, questions)
+        run("FuzzyIndex.match, question", fuzzy.match, questions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Compare per-(concept, aspect) accessor calls with one batched lookup.
+
+Run from the repository root:
+    python benchmarks/bench_lookup.py [--questions 2000] [--sparql]
+
+--sparql also times the per-pair SPARQL path on a small sample; each of
+its accessor calls is a full scan over every rdfs:label triple.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ontology_parser import OntologyParser, ASPECTS
+from answer_generator import QUESTION_ASPECTS
+
+# Realistic multi-part questions: several concepts, several kinds of information
+QUESTION_TYPES = [
+    ['definition'],
+    ['definition', 'references'],
+    ['definition', 'acronym', 'alternative_names'],
+    ['definition', 'acronym', 'references', 'alternative_names'],
+    ['related', 'category', 'definition', 'references'],
+]
+
+
+def make_questions(labels, count, seed=0):
+    rng = random.Random(seed)
+    labels = sorted(labels)
+    return [(rng.sample(labels, rng.choice([1, 2, 3])), rng.choice(QUESTION_TYPES))
+            for _ in range(count)]
+
+
+def aspects_for(question_types):
+    return sorted({a for q_type in question_types for a in QUESTION_ASPECTS[q_type]})
+
+
+def per_pair(parser, concepts, question_types):
+    """What generate_answer did before lookup: one accessor call per pair"""
+    for concept in concepts:
+        for q_type in question_types:
+            for aspect in QUESTION_ASPECTS[q_type]:
+                getattr(parser, ASPECTS[aspect])(concept)
+
+
+def batched(parser, concepts, question_types):
+    parser.lookup(concepts, aspects_for(question_types))
+
+
+class CountingIndex:
+    """Wraps a ConceptIndex and counts label resolutions"""
+
+    def __init__(self, index):
+        self._index = index
+        self.resolutions = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._index, name)
+        if name in ('exact', 'substring'):
+            def counted(*args):
+                self.resolutions += 1
+                return attr(*args)
+            return counted
+        return attr
+
+
+def run(parser, func, questions):
+    counter = CountingIndex(parser.index)
+    parser.index = counter
+    try:
+        start = time.perf_counter()
+        for concepts, question_types in questions:
+            func(parser, concepts, question_types)
+        elapsed = time.perf_counter() - start
+    finally:
+        parser.index = counter._index
+    return elapsed, counter.resolutions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--rdf", default="crypto_2_1_1.rdf")
+    parser.add_argument("--sparql", action="store_true")
+    args = parser.parse_args()
+
+    ontology = OntologyParser(args.rdf)
+    questions = make_questions(ontology.get_all_concepts(), args.questions)
+
+    print(f"questions: {len(questions)}")
+    for name, func in [("per-pair accessors", per_pair), ("batched lookup", batched)]:
+        elapsed, resolutions = run(ontology, func, questions)
+        print(f"{name:20} {elapsed * 1e6 / len(questions):8.1f} us/question  "
+              f"{resolutions / len(questions):5.2f} label resolutions/question")
+
+    if args.sparql:
+        sample = questions[:5]
+        ontology.use_sparql = True
+        calls = sum(len(c) * len(aspects_for(t)) for c, t in sample)
+        start = time.perf_counter()
+        for concepts, question_types in sample:
+            per_pair(ontology, concepts, question_types)
+        elapsed = time.perf_counter() - start
+        print(f"{'per-pair SPARQL':20} {elapsed * 1e3 / len(sample):8.1f} ms/question  "
+              f"{calls / len(sample):5.2f} graph scans/question")
+
+
+if __name__ == "__main__":
+    main()
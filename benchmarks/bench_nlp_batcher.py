@@ -0,0 +1,108 @@
+"""Throughput of spaCy parsing at 1, 8 and 64 concurrent clients.
+
+Each client is a thread parsing its own share of distinct questions, as a
+Flask worker thread would. Three ways of parsing are compared:
+
+    direct    every client calls nlp(text) itself
+    batched   clients go through NlpBatcher, which parses what they send
+              within the same window together with nlp.pipe
+    cached    the same questions again through the batcher, answered from
+              its Doc cache
+
+Run from the repository root:
+    python benchmarks/bench_nlp_batcher.py [--clients 1,8,64] [--questions 1024]
+
+--model blank uses an empty English pipeline (tokenizer only), for when
+en_core_web_sm is not installed; it measures the batching overhead rather
+than what batching saves.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import spacy
+
+from ontology_parser import OntologyParser
+from question_processor import SPACY_MODEL
+from nlp_batcher import NlpBatcher
+from suite import make_corpus
+
+
+def percentile(samples, fraction):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run_clients(parse, questions, clients):
+    """Split the questions over client threads; returns (seconds, latencies)"""
+    shares = [questions[i::clients] for i in range(clients)]
+    latencies = []
+    start_line = threading.Barrier(clients + 1)
+
+    def client(share):
+        start_line.wait()
+        for question in share:
+            start = time.perf_counter()
+            parse(question)
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(share,)) for share in shares]
+    for thread in threads:
+        thread.start()
+    start_line.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies
+
+
+def report(mode, clients, elapsed, latencies, extra=""):
+    print(f"{mode:<8} {clients:>7}  {len(latencies) / elapsed:>9.0f} q/s  "
+          f"p50 {statistics.median(latencies) * 1000:7.2f} ms  "
+          f"p95 {percentile(latencies, 0.95) * 1000:7.2f} ms  {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", default="1,8,64", help="comma-separated numbers of concurrent clients")
+    parser.add_argument("--questions", type=int, default=1024, help="distinct questions per run")
+    parser.add_argument("--model", default=SPACY_MODEL, help="spaCy model, or 'blank'")
+    parser.add_argument("--window", type=float, default=0.001, help="batching window in seconds")
+    parser.add_argument("--rdf", default="crypto_2_1_1.rdf")
+    args = parser.parse_args()
+
+    if args.model == "blank":
+        nlp = spacy.blank("en")
+    else:
+        nlp = spacy.load(args.model, exclude=["lemmatizer", "ner"])
+    labels = OntologyParser(args.rdf).get_all_concepts()
+    corpus = list(dict.fromkeys(make_corpus(labels, args.questions * 2)["questions"]))
+    nlp("warm up")
+
+    print(f"model: {args.model}, pipeline: {nlp.pipe_names}")
+    print(f"{'mode':<8} {'clients':>7}  {'throughput':>13}")
+    for clients in [int(c) for c in args.clients.split(",")]:
+        # Fresh questions for every run, so neither the batcher's cache nor
+        # spaCy's vocabulary has seen them
+        questions = [f"{question} ({clients} clients)" for question in corpus[:args.questions]]
+
+        elapsed, latencies = run_clients(nlp, questions, clients)
+        report("direct", clients, elapsed, latencies)
+
+        batcher = NlpBatcher(nlp, window=args.window)
+        batched = [f"{question} batched" for question in questions]
+        elapsed, latencies = run_clients(batcher.parse, batched, clients)
+        stats = batcher.stats()
+        report("batched", clients, elapsed, latencies,
+               f"{stats['parsed'] / stats['batches']:.1f} questions per batch")
+        elapsed, latencies = run_clients(batcher.parse, batched, clients)
+        report("cached", clients, elapsed, latencies)
+        batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Per-worker memory and startup time: one import per worker vs server.py.
+
+Three ways of running --workers workers are compared:
+
+    imports     every worker is its own process that imports app.py and
+                loads everything itself (what a server without preloading
+                does), started all at once
+    prefork     server.py: one master loads everything, freezes it with
+                gc.freeze() and forks the workers
+    no-freeze   server.py --no-freeze: the same, without gc.freeze()
+
+Startup is the time from launch until every worker is serving. Memory is
+read from /proc/<pid>/smaps_rollup after --requests questions were
+answered per worker: RSS counts shared pages in full in every process,
+PSS divides them between the processes sharing them, and private pages
+are those a worker does not share (the pages it copied on write).
+
+Run from the repository root:
+    python benchmarks/bench_prefork.py [--workers 4] [--requests 200]
+"""
+import argparse
+import http.client
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ontology_parser import OntologyParser
+from suite import make_corpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LISTENING = re.compile(r"Listening on [^ ]+:(\d+)")
+READY = re.compile(r"workers of generation 1 ready")
+
+
+def smaps(pid):
+    """RSS, PSS and private memory of a process, in MB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "private": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def children(pid):
+    pids = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            pids.extend(int(child) for child in f.read().split())
+    return pids
+
+
+def start(env, workers, extra=()):
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"), "--bind", "127.0.0.1:0",
+                             "--workers", str(workers), *extra],
+                            cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+
+def wait_ready(process, forking):
+    """Port of a started server.py, once all its workers are serving"""
+    port = None
+    for line in process.stdout:
+        match = LISTENING.search(line)
+        if match:
+            port = int(match.group(1))
+        if port and (not forking or READY.search(line)):
+            break
+    else:
+        raise RuntimeError(f"server.py exited with {process.wait()}")
+    # Keep draining the log so the server never blocks on a full pipe
+    threading.Thread(target=process.stdout.read, daemon=True).start()
+    return port
+
+
+def ask(port, questions):
+    for question in questions:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        connection.request("POST", "/api/messages", json.dumps({"user_input": question}),
+                           {"Content-Type": "application/json"})
+        connection.getresponse().read()
+        connection.close()
+
+
+def run(mode, env, workers, questions):
+    began = time.perf_counter()
+    if mode == "imports":
+        # All at once, as a process manager would start them
+        processes = [start(env, 0) for _ in range(workers)]
+        ports = [wait_ready(process, False) for process in processes]
+        startup = time.perf_counter() - began
+        for port in ports:
+            ask(port, questions)
+        pids = [process.pid for process in processes]
+        master = None
+    else:
+        processes = [start(env, workers, ["--no-freeze"] if mode == "no-freeze" else [])]
+        port = wait_ready(processes[0], True)
+        startup = time.perf_counter() - began
+        ask(port, questions * workers)
+        pids = children(processes[0].pid)
+        master = processes[0].pid
+    memory = [smaps(pid) for pid in pids]
+    total_pss = sum(m["pss"] for m in memory) + (smaps(master)["pss"] if master else 0)
+    for process in processes:
+        process.terminate()
+        process.wait()
+    return {
+        "mode": mode,
+        "startup_s": startup,
+        "rss_mb": sum(m["rss"] for m in memory) / len(memory),
+        "pss_mb": sum(m["pss"] for m in memory) / len(memory),
+        "private_mb": sum(m["private"] for m in memory) / len(memory),
+        "total_pss_mb": total_pss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200, help="questions answered per worker before measuring")
+    parser.add_argument("--modes", default="imports,prefork,no-freeze")
+    parser.add_argument("--rdf", default="crypto_2_1_1.rdf")
+    args = parser.parse_args()
+
+    questions = make_corpus(OntologyParser(os.path.join(ROOT, args.rdf)).get_all_concepts(),
+                            args.requests)["questions"]
+    print(f"{args.workers} workers, {args.requests} questions each")
+    print(f"{'mode':<10} {'startup s':>10} {'RSS/worker':>11} {'PSS/worker':>11} {'private/worker':>15} "
+          f"{'total PSS':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes.split(","):
+            env = dict(os.environ, SECRET_KEY="bench", ONTOLOGY_POLL_SECONDS="0",
+                       CHAT_HISTORY_STORE=f"sqlite:///{tmp}/{mode}.db")
+            result = run(mode, env, args.workers, questions)
+            print(f"{result['mode']:<10} {result['startup_s']:>10.2f} {result['rss_mb']:>8.1f} MB "
+                  f"{result['pss_mb']:>8.1f} MB {result['private_mb']:>12.1f} MB {result['total_pss_mb']:>7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
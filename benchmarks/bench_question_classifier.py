@@ -0,0 +1,79 @@
+"""Time the question classifier against the keyword scans it replaced.
+
+Run from the repository root:
+    python benchmarks/bench_question_classifier.py [--questions 20000]
+
+Questions are drawn from the cases of tests/test_question_classifier.py,
+which checks what the classifier finds in them.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_classifier import QuestionClassifier
+from tests.test_question_classifier import CASES
+
+
+def old_classify(question_lower):
+    """The keyword scans process_question ran before the classifier"""
+    question_types = set()
+    ref_type = None
+    if any(pattern in question_lower for pattern in [
+        'what is', 'what are', 'define', 'definition', 'meaning', 'explain',
+        'tell me about', 'describe', 'mean', 'could you explain',
+        'help me understand', 'want to know about', "what's", 'whats',
+        'can you tell me about', 'give me information about'
+    ]):
+        question_types.add('definition')
+    if any(word in question_lower for word in ['acronym', 'abbreviation']):
+        question_types.add('acronym')
+    ref_type_keywords = {
+        'pdf': ['pdf', 'document', 'qb pdf', 'qb_pdf_link'],
+        'doi': ['doi'],
+        'url': ['url', 'link', 'website'],
+        'wiki': ['wiki', 'wikipedia', 'link', 'links'],
+        'paper': ['paper', 'article', 'publication']
+    }
+    for type_key, keywords in ref_type_keywords.items():
+        if any(keyword in question_lower for keyword in keywords):
+            question_types.add('references')
+            ref_type = type_key
+            break
+    if not ref_type and any(word in question_lower for word in ['reference', 'where can i find']):
+        question_types.add('references')
+    if any(phrase in question_lower for phrase in ['also known as', 'alternative names', 'other names']):
+        question_types.add('alternative_names')
+    if not question_types:
+        question_types.add('definition')
+    return list(question_types), ref_type
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=20000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    classifier = QuestionClassifier()
+    build = time.perf_counter() - start
+
+    rng = random.Random(0)
+    questions = [rng.choice(CASES)[0] for _ in range(args.questions)]
+    timings = {}
+    for name, func in [("keyword scans", old_classify), ("classifier", classifier.classify)]:
+        start = time.perf_counter()
+        for question in questions:
+            func(question)
+        timings[name] = time.perf_counter() - start
+
+    print(f"build:      {build * 1000:.2f} ms")
+    for name, elapsed in timings.items():
+        print(f"{name + ':':12}{elapsed * 1e6 / len(questions):.2f} us/question")
+
+
+if __name__ == "__main__":
+    main()
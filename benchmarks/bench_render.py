@@ -0,0 +1,79 @@
+"""Compare the old chained-replace link rewriting with the single-pass renderer.
+
+Run from the repository root:
+    python benchmarks/bench_render.py [--links 10 100 500]
+
+Besides time, each row reports how many of the answer's links come out as
+well-formed anchors: the old rewriting is cheap mostly because its per-URL
+loop never fires, leaving nested, unterminated <a> tags behind.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_renderer import render_answer
+
+
+def old_render(answer):
+    """The post-processing send_message used to run"""
+    answer_parts = answer.split("Would you like to know anything else? 😊")
+    answer = "".join(answer_parts[:-1])
+    if answer_parts:
+        answer += "\nWould you like to know anything else? 😊"
+    answer = answer.replace("https://", '<a href="https://', -1).replace("</a>", "", -1)
+    answer = answer.replace("http://", '<a href="http://', -1)
+    for url in answer.split():
+        if url.startswith(("http://", "https://")):
+            if '">' not in url:
+                answer = answer.replace(url, f'{url}">{url}</a>')
+    return answer
+
+
+def make_answer(links):
+    """An answer shaped like _handle_references_question output, plus bare URLs"""
+    lines = ["👋 Of course, here's the information about 'quantum key distribution':", "", "🔗 References:"]
+    for i in range(links):
+        url = f"https://en.wikipedia.org/wiki/Reference_{i}"
+        if i % 2:
+            lines.append(f"• Wikipedia Entry: <a href='{url}' target='_blank'>{url}</a>")
+        else:
+            lines.append(f"• See also {url} for details.")
+    lines.append("Would you like to know anything else? 😊")
+    return "\n".join(lines)
+
+
+WELL_FORMED_ANCHOR = re.compile(r'<a href="https?://[^"<>]*"[^<>]*>https?://[^<>]*</a>')
+
+
+def well_formed(html):
+    return len(WELL_FORMED_ANCHOR.findall(html))
+
+
+def timed(func, answer, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(answer)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'links':>6} {'chars':>8} {'old (ms)':>10} {'new (ms)':>10} {'old ok':>8} {'new ok':>8}")
+    for links in args.links:
+        answer = make_answer(links)
+        old = timed(old_render, answer, args.repeat)
+        new = timed(render_answer, answer, args.repeat)
+        print(f"{links:6d} {len(answer):8d} {old * 1000:10.3f} {new * 1000:10.3f} "
+              f"{well_formed(old_render(answer)):8d} {well_formed(render_answer(answer)):8d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Memory and latency of the rdflib and compact OntologyParser backends.
+
+The ontology is enlarged like in suite.py (100x by default). Each backend
+is measured in its own process: snapshot size, time to load the snapshot,
+memory held by the parser and by its triples alone (tracemalloc), peak
+RSS, and the latency of every accessor over a seeded set of labels.
+
+Run from the repository root:
+    python benchmarks/bench_triple_store.py [--scale 100] [--labels 200]
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rdflib import Graph
+
+from ontology_parser import OntologyParser
+from ontology_snapshot import snapshot_path
+from suite import ACCESSORS, enlarge, make_corpus
+
+
+def percentile(samples, fraction):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def measure(rdf_file, backend, labels, repeat=3):
+    """Run in a fresh process, after the snapshot was written"""
+    gc.collect()
+    start = time.perf_counter()
+    parser = OntologyParser(rdf_file, backend=backend)
+    load = time.perf_counter() - start
+    assert parser.load_stats['source'] == 'snapshot'
+    del parser
+    gc.collect()
+
+    tracemalloc.start()
+    parser = OntologyParser(rdf_file, backend=backend)
+    gc.collect()
+    total = tracemalloc.get_traced_memory()[0]
+    triples = len(parser.g)
+    graph = parser.g
+    parser.g = None
+    if getattr(parser.index, 'store', None) is graph:
+        parser.index.store = None
+    del graph
+    gc.collect()
+    without_triples = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del parser
+    gc.collect()
+
+    parser = OntologyParser(rdf_file, backend=backend)
+    latencies = {}
+    for name in ACCESSORS:
+        accessor = getattr(parser, name)
+        samples = []
+        for _ in range(repeat):
+            for label in labels:
+                start = time.perf_counter()
+                accessor(label)
+                samples.append(time.perf_counter() - start)
+        latencies[name] = (statistics.median(samples) * 1e6, percentile(samples, 0.95) * 1e6)
+    return {
+        'backend': backend,
+        'triples': triples,
+        'snapshot_mb': os.path.getsize(snapshot_path(rdf_file, backend)) / 2**20,
+        'load_s': load,
+        'parser_mb': total / 2**20,
+        'triples_mb': (total - without_triples) / 2**20,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'latency_us': latencies,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=100)
+    parser.add_argument("--labels", type=int, default=200, help="labels each accessor is called with")
+    parser.add_argument("--rdf", default="crypto_2_1_1.rdf")
+    parser.add_argument("--child", nargs=2, metavar=("RDF", "BACKEND"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    labels = make_corpus(OntologyParser(args.rdf).get_all_concepts(), args.labels)["labels"]
+    if args.child:
+        print(json.dumps(measure(args.child[0], args.child[1], labels)))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="cryptology-bench-") as directory:
+        rdf_file = args.rdf
+        if args.scale > 1:
+            base = Graph()
+            base.parse(args.rdf)
+            rdf_file = os.path.join(directory, f"crypto_x{args.scale}.rdf")
+            enlarge(base, args.scale).serialize(rdf_file, format="xml")
+            del base
+        results = []
+        for backend in ("rdflib", "compact"):
+            OntologyParser(rdf_file, backend=backend)  # writes the snapshot
+            child = subprocess.run(
+                [sys.executable, __file__, "--labels", str(args.labels), "--rdf", args.rdf,
+                 "--child", rdf_file, backend],
+                capture_output=True, text=True, check=True)
+            results.append(json.loads(child.stdout))
+
+    print(f"ontology enlarged {args.scale}x")
+    print(f"{'':<24}" + "".join(f"{r['backend']:>14}" for r in results))
+    rows = [
+        ("triples kept", "triples", "{:>14,}"),
+        ("snapshot (MB)", "snapshot_mb", "{:>14.1f}"),
+        ("load snapshot (s)", "load_s", "{:>14.2f}"),
+        ("parser memory (MB)", "parser_mb", "{:>14.1f}"),
+        ("  of which triples (MB)", "triples_mb", "{:>14.1f}"),
+        ("peak RSS (MB)", "max_rss_mb", "{:>14.1f}"),
+    ]
+    for title, key, fmt in rows:
+        print(f"{title:<24}" + "".join(fmt.format(r[key]) for r in results))
+    print()
+    print(f"{'accessor p50 / p95 (us)':<28}" + "".join(f"{r['backend']:>18}" for r in results))
+    for name in ACCESSORS:
+        cells = "".join(f"{'%.1f / %.1f' % tuple(r['latency_us'][name]):>18}" for r in results)
+        print(f"{name:<28}{cells}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""Load and soak test of the chat app under a local WSGI server.
+
+app.py is started in a child process under werkzeug's WSGI server, either
+multi-threaded (one process, a thread per request) or multi-process (one
+forked child per request, at most --processes at a time), or under
+server.py with --processes preforked workers. Client threads
+then replay chat sessions against it for --duration seconds. Each session
+loads the chat page, asks about one to three concepts (sometimes
+misspelled, sometimes naming none), follows up on them ("what are its
+references?") and moves on to other concepts. Each message goes through
+one of the three endpoints: a form post to /send_message followed by the
+redirect back to the chat page, as a browser does, POST /api/messages, or
+the /api/messages/stream event stream.
+
+Reported overall and per endpoint:
+- throughput and p50/p95/p99 latency;
+- HTTP errors, failed connections and `error` events in streams;
+- the errors the app only logs. POST /send_message redirects as if every
+  message was answered, so these are counted from the server's log and,
+  for a single process, from /metrics;
+- the server's RSS, summed over its workers, sampled every --sample
+  seconds. For a soak, growth over the second half of the run is reported
+  separately from warm-up; children forked for one request only count
+  towards the peak;
+- the largest session cookie sent back.
+
+Processes do not share chat history, so with several of them history is
+kept in SQLite. Children forked per request do not share caches either:
+every request pays for what the other servers would have cached.
+
+Run from the repository root:
+    python benchmarks/load_test.py [--server threads|processes|prefork] [--clients 8] [--duration 60]
+    python benchmarks/load_test.py --duration 3600 --sample 60 -o soak.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from suite import NO_CONCEPT_QUESTIONS, TEMPLATES, misspell
+
+FOLLOW_UPS = [
+    "what are its references?",
+    "and the acronym?",
+    "what are its other names?",
+    "what is it related to?",
+    "give me the wikipedia link for it",
+    "what are the types of it?",
+    "tell me more about it",
+]
+
+# Share of messages sent to each endpoint
+ENDPOINT_WEIGHTS = {
+    "POST /send_message": 4,
+    "POST /api/messages": 4,
+    "POST /api/messages/stream": 2,
+}
+
+# Logged by app.record_error for every exception the user is not shown
+LOGGED_ERROR = "Could not answer"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LISTENING = re.compile(r"Listening on [^ ]+:(\d+)")
+# Logged by server.py once every worker serves
+WORKERS_READY = re.compile(r"workers of generation 1 ready")
+
+
+def percentile(samples, fraction):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+# Server
+
+def serve(args):
+    """Run in the server process: serve app.py until terminated"""
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    from app import app
+    server = make_server("127.0.0.1", 0, app, threaded=args.server == "threads",
+                         processes=args.processes if args.server == "processes" else 1)
+    print(f"Listening on 127.0.0.1:{server.port}", flush=True)
+    server.serve_forever()
+
+
+class Server:
+    """app.py in a child process, with its output read in the background"""
+
+    def __init__(self, args, history):
+        env = dict(os.environ, SECRET_KEY="load-test", CHAT_HISTORY_STORE=history)
+        if args.server == "prefork":
+            command = [sys.executable, os.path.join(ROOT, "server.py"), "--bind", "127.0.0.1:0",
+                       "--workers", str(args.processes)]
+        else:
+            command = [sys.executable, os.path.abspath(__file__), "--serve", "--server", args.server,
+                       "--processes", str(args.processes)]
+        # Children forked per request come and go; preforked workers stay
+        self.per_request = args.server == "processes"
+        self.process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        text=True, bufsize=1, start_new_session=True)
+        self.logged_errors = 0
+        self.tail = []
+        self.port = None
+        ready = threading.Event()
+
+        def read():
+            port = None
+            for line in self.process.stdout:
+                match = LISTENING.search(line)
+                port = int(match.group(1)) if match else port
+                if port and self.port is None and (args.server != "prefork" or WORKERS_READY.search(line)):
+                    self.port = port
+                    ready.set()
+                if LOGGED_ERROR in line:
+                    self.logged_errors += 1
+                self.tail = (self.tail + [line.rstrip()])[-20:]
+            ready.set()
+
+        threading.Thread(target=read, daemon=True).start()
+        ready.wait()
+        if self.port is None:
+            raise RuntimeError("server did not start:\n" + "\n".join(self.tail))
+
+    def pids(self):
+        """The server process and all its descendants"""
+        pids, i = [self.process.pid], 0
+        while i < len(pids):
+            for task in os.listdir(f"/proc/{pids[i]}/task") if os.path.exists(f"/proc/{pids[i]}") else []:
+                try:
+                    with open(f"/proc/{pids[i]}/task/{task}/children") as f:
+                        pids.extend(int(pid) for pid in f.read().split())
+                except OSError:
+                    pass
+            i += 1
+        return pids
+
+    def rss_mb(self):
+        """Resident memory of the server process, and summed with its children's
+        (pages shared copy-on-write are counted in every process)"""
+        sizes = []
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    sizes.append(next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) / 1024)
+            except (OSError, StopIteration):
+                pass
+        return (sizes[0] if sizes else 0.0), sum(sizes)
+
+    def sample(self, seconds, requests):
+        server, total = self.rss_mb()
+        return {"seconds": round(seconds, 1), "requests": requests,
+                "rss_mb": round(server if self.per_request else total, 1), "total_rss_mb": round(total, 1)}
+
+    def stop(self):
+        """Terminate the server and any child still serving a request"""
+        os.killpg(self.process.pid, signal.SIGTERM)
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.process.pid, signal.SIGKILL)
+
+
+# Clients
+
+def make_session(rng, labels):
+    """A session's messages: questions about concepts and follow-ups on them"""
+    messages = []
+    asked = False
+    for _ in range(rng.randint(2, 8)):
+        roll = rng.random()
+        if asked and roll < 0.4:
+            messages.append(rng.choice(FOLLOW_UPS))
+            continue
+        if roll > 0.95:
+            messages.append(rng.choice(NO_CONCEPT_QUESTIONS))
+            asked = False
+            continue
+        template = rng.choice(TEMPLATES)
+        concepts = rng.sample(labels, template.count("{}"))
+        if roll > 0.85:
+            concepts[0] = misspell(concepts[0], rng)
+        messages.append(template.format(*concepts))
+        asked = True
+    return messages
+
+
+class Client:
+    """One simulated user: a cookie and a connection per request"""
+
+    def __init__(self, port, results):
+        self.port = port
+        self.results = results
+        self.cookie = None
+        self.max_cookie = 0
+
+    def request(self, method, path, body=None, content_type=None):
+        headers = {}
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        if content_type:
+            headers["Content-Type"] = content_type
+        start = time.perf_counter()
+        status, error = None, None
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=120)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+            status = response.status
+            cookie = response.getheader("Set-Cookie")
+            if cookie:
+                self.cookie = cookie.split(";", 1)[0]
+                self.max_cookie = max(self.max_cookie, len(self.cookie))
+            if status >= 400:
+                error = f"HTTP {status}"
+            elif b"event: error" in data:
+                error = "stream error event"
+        except (OSError, http.client.HTTPException) as e:
+            error = type(e).__name__
+        finally:
+            connection.close()
+        self.results.append((time.perf_counter(), f"{method} {path}", time.perf_counter() - start, error))
+        return status
+
+    def send(self, endpoint, message):
+        if endpoint == "POST /send_message":
+            body = urllib.parse.urlencode({"user_input": message})
+            if self.request("POST", "/send_message", body, "application/x-www-form-urlencoded") == 302:
+                self.request("GET", "/")
+        else:
+            self.request("POST", endpoint.split()[1], json.dumps({"user_input": message}), "application/json")
+
+
+def run_client(port, labels, seed, deadline, think, results, cookies):
+    rng = random.Random(seed)
+    endpoints, weights = list(ENDPOINT_WEIGHTS), list(ENDPOINT_WEIGHTS.values())
+    while time.perf_counter() < deadline:
+        client = Client(port, results)
+        client.request("GET", "/")
+        for message in make_session(rng, labels):
+            if time.perf_counter() >= deadline:
+                break
+            client.send(rng.choices(endpoints, weights)[0], message)
+            if think:
+                time.sleep(rng.uniform(0, 2 * think))
+        cookies.append(client.max_cookie)
+
+
+# Reporting
+
+def logged_errors_by_endpoint(port):
+    """cryptology_errors_total from /metrics, by endpoint"""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    connection.request("GET", "/metrics")
+    text = connection.getresponse().read().decode()
+    connection.close()
+    errors = {}
+    for endpoint, exception, value in re.findall(
+            r'^cryptology_errors_total\{endpoint="([^"]*)",exception="([^"]*)"\} (\S+)$', text, re.M):
+        errors[f"{endpoint} {exception}"] = int(float(value))
+    return errors
+
+
+def summarize(results, elapsed):
+    by_endpoint = {}
+    for _, endpoint, seconds, error in results:
+        by_endpoint.setdefault(endpoint, []).append((seconds, error))
+    summary = {}
+    for endpoint, samples in sorted(by_endpoint.items()) + [("all", [(s, e) for _, _, s, e in results])]:
+        latencies = [seconds for seconds, _ in samples]
+        errors = {}
+        for _, error in samples:
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+        summary[endpoint] = {
+            "requests": len(samples),
+            "per_second": round(len(samples) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "error_rate": round(sum(errors.values()) / len(samples), 4),
+            "errors": errors,
+        }
+    return summary
+
+
+def rss_growth(samples):
+    """Server RSS from start to end, and its growth over the second half of
+    the run in MB per hour"""
+    growth = {"start_mb": samples[0]["rss_mb"], "end_mb": samples[-1]["rss_mb"],
+              "max_total_mb": max(sample["total_rss_mb"] for sample in samples)}
+    second_half = [sample for sample in samples if sample["seconds"] >= samples[-1]["seconds"] / 2]
+    if len(second_half) >= 2 and second_half[-1]["seconds"] > second_half[0]["seconds"]:
+        hours = (second_half[-1]["seconds"] - second_half[0]["seconds"]) / 3600
+        growth["second_half_mb_per_hour"] = round((second_half[-1]["rss_mb"] - second_half[0]["rss_mb"]) / hours, 1)
+    return growth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=["threads", "processes", "prefork"], default="threads")
+    parser.add_argument("--processes", type=int, default=4,
+                        help="most children forked at a time, or preforked workers")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of load")
+    parser.add_argument("--think", type=float, default=0, help="mean seconds a user waits between messages")
+    parser.add_argument("--sample", type=float, default=5, help="seconds between progress lines and RSS samples")
+    parser.add_argument("--history", help="CHAT_HISTORY_STORE for the server (SQLite in a temporary "
+                                          "directory with several processes, memory otherwise)")
+    parser.add_argument("--rdf", default="crypto_2_1_1.rdf")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args)
+        return
+
+    from ontology_parser import OntologyParser
+    labels = sorted(label for label in OntologyParser(args.rdf).get_all_concepts() if len(label) > 3)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = args.history or (f"sqlite:///{tmp}/history.db" if args.server != "threads" else "memory")
+        start = time.perf_counter()
+        server = Server(args, history)
+        print(f"server: {args.server}"
+              f"{f' ({args.processes} processes)' if args.server != 'threads' else ''}, "
+              f"history: {history}, ready in {time.perf_counter() - start:.1f} s")
+        results, cookies = [], []
+        samples = [server.sample(0.0, 0)]
+        try:
+            start = time.perf_counter()
+            deadline = start + args.duration
+            clients = [threading.Thread(target=run_client, daemon=True,
+                                        args=(server.port, labels, args.seed + i, deadline, args.think,
+                                              results, cookies))
+                       for i in range(args.clients)]
+            for client in clients:
+                client.start()
+            print(f"{'seconds':>8} {'requests':>9} {'req/s':>7} {'p95 ms':>8} {'errors':>7} "
+                  f"{'logged':>7} {'RSS MB':>8}")
+            while any(client.is_alive() for client in clients):
+                while (time.perf_counter() < start + len(samples) * args.sample
+                       and any(client.is_alive() for client in clients)):
+                    time.sleep(0.1)
+                now = time.perf_counter() - start
+                done = len(results)
+                window = [seconds for _, _, seconds, _ in results[samples[-1]["requests"]:done]]
+                sample = server.sample(now, done)
+                print(f"{now:>8.0f} {done:>9} {len(window) / max(now - samples[-1]['seconds'], 1e-9):>7.1f} "
+                      f"{percentile(window, 0.95) * 1000 if window else 0:>8.1f} "
+                      f"{sum(1 for *_, error in results[:done] if error):>7} {server.logged_errors:>7} "
+                      f"{sample['total_rss_mb']:>8.1f}")
+                samples.append(sample)
+            elapsed = time.perf_counter() - start
+            by_endpoint = logged_errors_by_endpoint(server.port) if args.server == "threads" else None
+        finally:
+            server.stop()
+
+    summary = summarize(results, elapsed)
+    print()
+    print(f"{'endpoint':<28} {'requests':>9} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for endpoint, stats in summary.items():
+        print(f"{endpoint:<28} {stats['requests']:>9} {stats['per_second']:>7.1f} {stats['p50_ms']:>8.1f} "
+              f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['error_rate']:>7.2%}")
+    for endpoint, stats in summary.items():
+        for error, count in stats["errors"].items() if endpoint != "all" else ():
+            print(f"  {endpoint}: {count} x {error}")
+    print(f"errors only logged by the app: {server.logged_errors}"
+          + (f" {by_endpoint}" if by_endpoint else ""))
+    growth = rss_growth(samples)
+    print(f"server RSS: {growth['start_mb']:.1f} MB -> {growth['end_mb']:.1f} MB "
+          f"(peak {growth['max_total_mb']:.1f} MB over all its processes)"
+          + (f", {growth['second_half_mb_per_hour']:+.1f} MB/hour over the second half"
+             if "second_half_mb_per_hour" in growth else ""))
+    print(f"largest session cookie: {max(cookies, default=0)} bytes over {len(cookies)} sessions")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "config": {key: value for key, value in vars(args).items() if key not in ("serve", "output")},
+                "elapsed_seconds": round(elapsed, 1),
+                "endpoints": summary,
+                "logged_errors": server.logged_errors,
+                "logged_errors_by_endpoint": by_endpoint,
+                "rss": growth,
+                "rss_samples": samples,
+                "max_cookie_bytes": max(cookies, default=0),
+                "sessions": len(cookies),
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""Time every stage of the pipeline, on the ontology and on enlarged copies.
+
+Stages: OntologyParser load (RDF and snapshot), each get_* accessor, search,
+extract_concepts (exact hits, misspelled hits and questions without any
+ontology concept), process_question, generate_answer for single- and
+multi-concept questions, and POST /send_message through Flask's test client.
+
+The question corpus is generated with a fixed seed from the labels of
+crypto_2_1_1.rdf. The enlarged ontologies add copies of every labelled
+resource under new IRIs and scrambled labels, so the corpus asks about the
+same concepts while every index grows 10x or 100x.
+
+Results are written as JSON, one record per (scale, stage), so two runs can
+be compared:
+    python benchmarks/suite.py -o before.json
+    python benchmarks/suite.py -o after.json
+    python benchmarks/suite.py --compare before.json after.json
+
+Run from the repository root:
+    python benchmarks/suite.py [--scales 1,10,100] [--questions 200] [-o results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rdflib
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.namespace import RDFS
+
+from ontology_parser import OntologyParser, ACRONYM, ALTERNATIVE_NAME, PROPER_LABEL
+from question_processor import QuestionProcessor
+from answer_generator import AnswerGenerator
+
+RDF_FILE = "crypto_2_1_1.rdf"
+NAME_PREDICATES = {RDFS.label, ACRONYM, ALTERNATIVE_NAME, PROPER_LABEL}
+
+ACCESSORS = [
+    "get_concept_definition",
+    "get_related_concepts",
+    "get_references",
+    "get_acronyms",
+    "get_alternative_names",
+    "get_comments",
+    "get_proper_label",
+    "get_subclasses",
+    "get_superclasses",
+]
+
+TEMPLATES = [
+    "what is {}",
+    "what is the acronym of {}",
+    "what are the other names for {}",
+    "give me the wikipedia link for {}",
+    "what are the types of {}",
+    "which category does {} belong to",
+    "what is {} related to",
+    "what is {} and how does it compare to {}?",
+    "tell me more about {}, {} and {}",
+]
+
+NO_CONCEPT_QUESTIONS = [
+    "how is the weather today",
+    "who won the football match yesterday",
+    "tell me something interesting",
+    "what should i cook for dinner",
+    "can you recommend a good book",
+    "where do penguins live",
+]
+
+
+# Corpus
+
+def misspell(label, rng):
+    """Swap two adjacent letters of the longest word"""
+    word = max(label.split(), key=len)
+    if len(word) < 4:
+        return label
+    i = rng.randrange(1, len(word) - 2)
+    typo = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return label.replace(word, typo, 1)
+
+
+def make_corpus(labels, count, seed=0):
+    rng = random.Random(seed)
+    labels = sorted(label for label in labels if len(label) > 3)
+    questions = []
+    for _ in range(count):
+        template = rng.choice(TEMPLATES)
+        questions.append(template.format(*rng.sample(labels, template.count("{}"))))
+    return {
+        "labels": rng.sample(labels, min(count, len(labels))),
+        "questions": questions,
+        "misspelled": [f"what is {misspell(label, rng)}" for label in rng.sample(labels, min(count, len(labels)))],
+        "no_concept": NO_CONCEPT_QUESTIONS,
+        "single": [[label] for label in rng.sample(labels, min(count, len(labels)))],
+        "multi": [rng.sample(labels, rng.choice([2, 3])) for _ in range(count)],
+    }
+
+
+# Synthetic ontologies
+
+def scramble(text, copy):
+    """A name for the copy that contains none of the original names"""
+    shift = copy % 25 + 1
+    rotated = "".join(
+        chr((ord(char) - 97 + shift) % 26 + 97) if "a" <= char <= "z" else char
+        for char in text.lower()
+    )
+    return f"{rotated} {copy}"
+
+
+def enlarge(graph, factor):
+    """The graph plus factor - 1 copies of every resource it describes"""
+    described = {s for s in graph.subjects() if isinstance(s, URIRef)}
+    enlarged = Graph()
+    for triple in graph:
+        enlarged.add(triple)
+    for copy in range(1, factor):
+        bnodes = {}
+
+        def node(term):
+            if isinstance(term, BNode):
+                return bnodes.setdefault(term, BNode())
+            if isinstance(term, URIRef) and term in described:
+                return URIRef(f"{term}_copy{copy}")
+            return term
+
+        for s, p, o in graph:
+            if p in NAME_PREDICATES and isinstance(o, Literal):
+                o = Literal(scramble(str(o), copy), lang=o.language, datatype=o.datatype)
+            enlarged.add((node(s), p, node(o)))
+    return enlarged
+
+
+# Measurement
+
+def summarize(scale, stage, samples, **extra):
+    samples = sorted(samples)
+    record = {
+        "scale": scale,
+        "stage": stage,
+        "calls": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 4),
+        "max_ms": round(samples[-1] * 1000, 4),
+    }
+    record.update(extra)
+    return record
+
+
+def timed(func, inputs, repeat=1):
+    samples = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            func(item)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_scale(scale, rdf_file, corpus, repeat, http):
+    records = []
+
+    start = time.perf_counter()
+    parser = OntologyParser(rdf_file, use_snapshot=False)
+    records.append(summarize(scale, "load.rdf", [time.perf_counter() - start],
+                             triples=len(parser.g), labels=len(parser.index.labels)))
+    OntologyParser(rdf_file)  # writes the snapshot
+    start = time.perf_counter()
+    parser = OntologyParser(rdf_file)
+    records.append(summarize(scale, "load.snapshot", [time.perf_counter() - start]))
+
+    for name in ACCESSORS:
+        accessor = getattr(parser, name)
+        records.append(summarize(scale, f"accessor.{name}", timed(accessor, corpus["labels"], repeat)))
+    records.append(summarize(scale, "accessor.get_all_concepts",
+                             timed(lambda _: parser.get_all_concepts(), range(repeat))))
+    records.append(summarize(scale, "accessor.get_concept_names",
+                             timed(lambda _: parser.get_concept_names(), range(repeat))))
+    records.append(summarize(scale, "relations.neighborhood",
+                             timed(lambda label: parser.get_neighborhood(label, hops=2, limit=50),
+                                   corpus["labels"], repeat)))
+    pairs = list(zip(corpus["labels"], corpus["labels"][1:] + corpus["labels"][:1]))
+    records.append(summarize(scale, "relations.path",
+                             timed(lambda pair: parser.find_relation_path(*pair), pairs, repeat),
+                             linked=sum(parser.find_relation_path(*pair) is not None for pair in pairs)))
+    records.append(summarize(scale, "search",
+                             timed(lambda text: parser.search(text, 10),
+                                   corpus["questions"] + corpus["no_concept"], repeat),
+                             documents=len(parser.search_index), terms=len(parser.search_index.postings)))
+
+    processor = QuestionProcessor(parser)
+    generator = AnswerGenerator(parser)
+    try:
+        processor.nlp
+        spacy_missing = None
+    except OSError as e:
+        spacy_missing = str(e)
+
+    lowered = [q.lower() for q in corpus["questions"]]
+    records.append(summarize(scale, "extract_concepts.hit", timed(processor.extract_concepts, lowered, repeat)))
+    misspelled = corpus["misspelled"]
+    if spacy_missing:
+        # Typos the fuzzy matcher misses would fall through to spaCy
+        misspelled = [q for q in misspelled if processor.matcher.match(q) or parser.fuzzy.match(q)]
+    records.append(summarize(scale, "extract_concepts.misspelled",
+                             timed(processor.extract_concepts, misspelled, repeat),
+                             resolved=len(misspelled)))
+    if spacy_missing:
+        records.append({"scale": scale, "stage": "extract_concepts.no_concept", "skipped": spacy_missing})
+    else:
+        records.append(summarize(scale, "extract_concepts.no_concept",
+                                 timed(processor.extract_concepts, corpus["no_concept"], repeat)))
+    records.append(summarize(scale, "process_question",
+                             timed(processor.process_question, corpus["questions"], repeat)))
+
+    for stage in ("single", "multi"):
+        processed = [{"concepts": concepts, "question_types": ["definition"], "ref_type": None}
+                     for concepts in corpus[stage]]
+        records.append(summarize(scale, f"generate_answer.{stage}",
+                                 timed(generator.generate_answer, processed, repeat)))
+
+    # The app answers from blocks rendered once per ontology version
+    samples = timed(lambda _: generator.precompute(), [None], repeat)
+    fragments = generator.fragments
+    records.append(summarize(scale, "precompute_answers", samples, concepts=len(fragments)))
+    # A reload where nothing changed: every block is taken over
+    records.append(summarize(scale, "precompute_answers.unchanged",
+                             timed(generator.precompute, [fragments], repeat)))
+    for stage in ("single", "multi"):
+        processed = [{"concepts": concepts, "question_types": ["definition"], "ref_type": None}
+                     for concepts in corpus[stage]]
+        records.append(summarize(scale, f"generate_answer.{stage}.precomputed",
+                                 timed(generator.generate_answer, processed, repeat)))
+
+    if http:
+        records.extend(bench_http(scale, parser, processor, generator, corpus["questions"]))
+    return records
+
+
+def bench_http(scale, parser, processor, generator, questions):
+    """POST /send_message with this scale's ontology swapped into the app"""
+    import app as chat_app
+    from ontology_registry import OntologyVersion
+
+    registry = chat_app.ontologies
+    name = registry.default
+    saved = registry.swap(name, OntologyVersion(name, parser.rdf_file, parser, processor, generator))
+    try:
+        client = chat_app.app.test_client()
+
+        def post(question):
+            response = client.post("/send_message", data={"user_input": question})
+            assert response.status_code == 302, response.status_code
+
+        def post_uncached(question):
+            chat_app.answer_cache.clear()
+            post(question)
+
+        client.get("/")  # starts the session
+        records = [summarize(scale, "http.send_message", timed(post_uncached, questions))]
+        for question in questions:  # fill the answer cache
+            post(question)
+        records.append(summarize(scale, "http.send_message.cached", timed(post, questions)))
+        return records
+    finally:
+        registry.swap(name, saved)
+        chat_app.answer_cache.clear()
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "rdflib": rdflib.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(before_file, after_file):
+    with open(before_file) as f:
+        before = {(r["scale"], r["stage"]): r for r in json.load(f)["results"]}
+    with open(after_file) as f:
+        after = {(r["scale"], r["stage"]): r for r in json.load(f)["results"]}
+    print(f"{'scale':>5}  {'stage':<36} {'before p50':>12} {'after p50':>12} {'ratio':>7}")
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key].get("p50_ms"), after[key].get("p50_ms")
+        if old is None or new is None:
+            continue
+        ratio = new / old if old else float("inf")
+        print(f"{key[0]:>5}  {key[1]:<36} {old:>10.4f}ms {new:>10.4f}ms {ratio:>6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="1,10,100", help="comma-separated ontology sizes")
+    parser.add_argument("--questions", type=int, default=200, help="size of the question corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the corpus per stage")
+    parser.add_argument("--no-http", action="store_true", help="skip the Flask stage")
+    parser.add_argument("-o", "--output", help="JSON file for the results (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--rdf", default=RDF_FILE)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    scales = [int(scale) for scale in args.scales.split(",")]
+    base = Graph()
+    base.parse(args.rdf)
+    base_parser = OntologyParser(args.rdf)
+    corpus = make_corpus(base_parser.get_all_concepts(), args.questions)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="cryptology-bench-") as directory:
+        for scale in scales:
+            if scale == 1:
+                rdf_file = args.rdf
+            else:
+                rdf_file = os.path.join(directory, f"crypto_x{scale}.rdf")
+                enlarge(base, scale).serialize(rdf_file, format="xml")
+            print(f"scale {scale}x ...", file=sys.stderr)
+            results.extend(bench_scale(scale, rdf_file, corpus, args.repeat, not args.no_http))
+
+    document = {
+        "environment": environment(),
+        "settings": {"scales": scales, "questions": args.questions, "repeat": args.repeat, "seed": 0},
+        "results": results,
+    }
+    text = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Answer questions in bulk, e.g. to regression-test answers or to replay
+query logs.
+
+Questions are read from a text file (one question per line) or a JSONL file
+(one object per line with a "question" field and an optional "id"), answered
+by a pool of worker processes and written as JSONL, one result per line:
+
+    python bulk_answer.py questions.jsonl -o answers.jsonl --workers 8
+
+Each worker loads the ontology (from its snapshot) and the question
+processor once, in the pool initializer; spaCy is loaded once per worker the
+first time a question needs it, or up front with --preload-nlp.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+from ontology_parser import OntologyParser, BACKENDS
+from question_processor import QuestionProcessor
+from answer_generator import AnswerGenerator
+from answer_cache import answer_key
+
+RDF_FILE = 'crypto_2_1_1.rdf'
+
+# Set in every worker by init_worker
+_question_processor = None
+_answer_generator = None
+
+
+def init_worker(rdf_file, preload_nlp=False, backend='rdflib'):
+    """Load the ontology and build the pipeline once per worker process"""
+    global _question_processor, _answer_generator
+    ontology_parser = OntologyParser(rdf_file, backend=backend)
+    _question_processor = QuestionProcessor(ontology_parser, preload_nlp=preload_nlp)
+    _answer_generator = AnswerGenerator(ontology_parser)
+    _answer_generator.precompute()
+
+
+def read_questions(lines, field='question'):
+    """
+    Yield (id, question) for every non-empty line.
+
+    Lines starting with "{" are JSON objects holding the question in `field`
+    and optionally an "id"; other lines are questions. The id defaults to
+    the line number. Unreadable lines yield a None question.
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith('{'):
+            yield number, line
+            continue
+        try:
+            record = json.loads(line)
+            question = record[field]
+        except (ValueError, KeyError, TypeError):
+            yield number, None
+            continue
+        yield record.get('id', number), question
+
+
+def answer_question(item):
+    """Answer one (id, question) pair in a worker; errors are reported in the result"""
+    question_id, question = item
+    result = {'id': question_id, 'question': question}
+    if not isinstance(question, str):
+        result['error'] = 'Unreadable input line'
+        return result
+    start = time.perf_counter()
+    try:
+        processed_question = _question_processor.process_question(question)
+        processed = time.perf_counter()
+        answer = _answer_generator.generate_answer(processed_question)
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+        return result
+    done = time.perf_counter()
+    result.update(
+        concepts=processed_question['concepts'],
+        question_types=processed_question['question_types'],
+        ref_type=processed_question['ref_type'],
+        answer_key=list(answer_key(processed_question)),
+        answer=answer,
+        timings={
+            'process_ms': round((processed - start) * 1000, 3),
+            'generate_ms': round((done - processed) * 1000, 3),
+            'total_ms': round((done - start) * 1000, 3),
+        },
+        worker=os.getpid(),
+    )
+    return result
+
+
+def answer_all(questions, workers, rdf_file=RDF_FILE, preload_nlp=False, chunksize=32, ordered=True,
+               backend='rdflib'):
+    """
+    Answer (id, question) pairs, yielding results as they are ready.
+
+    With more than one worker the questions are fanned out over a process
+    pool in chunks of `chunksize`; results keep the input order unless
+    `ordered` is False.
+    """
+    if workers <= 1:
+        init_worker(rdf_file, preload_nlp, backend)
+        for item in questions:
+            yield answer_question(item)
+        return
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(rdf_file, preload_nlp, backend)) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        yield from imap(answer_question, questions, chunksize)
+
+
+def percentile(samples, fraction):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def print_summary(results, errors, timings, elapsed, out=sys.stderr):
+    print(f'questions: {results} ({errors} errors) in {elapsed:.2f} s, '
+          f'{results / elapsed if elapsed else 0:.1f} questions/s', file=out)
+    for stage, samples in timings.items():
+        if samples:
+            print(f'{stage:<12} p50 {statistics.median(samples):8.3f} ms  '
+                  f'p95 {percentile(samples, 0.95):8.3f} ms  max {max(samples):8.3f} ms', file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', help='text or JSONL file of questions, - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='JSONL file for the results, - for stdout')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunksize', type=int, default=32, help='questions sent to a worker at a time')
+    parser.add_argument('--unordered', action='store_true', help='write results as soon as they are ready')
+    parser.add_argument('--field', default='question', help='JSONL field holding the question')
+    parser.add_argument('--preload-nlp', action='store_true', help='load spaCy when each worker starts')
+    parser.add_argument('--rdf', default=RDF_FILE)
+    parser.add_argument('--backend', choices=BACKENDS, default='rdflib',
+                        help='compact keeps only the triples answers read, in a fraction of the memory')
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    sink = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    count = errors = 0
+    timings = {'process_ms': [], 'generate_ms': [], 'total_ms': []}
+    start = time.perf_counter()
+    try:
+        results = answer_all(read_questions(source, args.field), args.workers, args.rdf,
+                             args.preload_nlp, args.chunksize, not args.unordered, args.backend)
+        for result in results:
+            sink.write(json.dumps(result, ensure_ascii=False) + '\n')
+            count += 1
+            if 'error' in result:
+                errors += 1
+            else:
+                for stage, value in result['timings'].items():
+                    timings[stage].append(value)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+        else:
+            sink.flush()
+    print_summary(count, errors, timings, time.perf_counter() - start)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
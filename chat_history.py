@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+# Open SQLite stores, reconnected in forked children (neither the writer
+# thread nor the SQLite connection survive a fork)
+_sqlite_stores = weakref.WeakSet()
+
+
+class MemoryHistoryStore:
+    """In-process chat history, bounded in conversations and messages.
+
+    The least recently used conversation is dropped once there are more than
+    `max_conversations`; each conversation keeps its last `max_messages`.
+    History is per process, so use SQLiteHistoryStore with several workers.
+    """
+
+    def __init__(self, max_conversations=10000, max_messages=500):
+        self.max_conversations = max_conversations
+        self.max_messages = max_messages
+        self._conversations = OrderedDict()  # conversation id -> [message, ...]
+        self._lock = threading.Lock()
+
+    def append(self, conversation_id, messages):
+        with self._lock:
+            history = self._conversations.setdefault(conversation_id, [])
+            self._conversations.move_to_end(conversation_id)
+            history.extend(messages)
+            del history[:-self.max_messages]
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+
+    def count(self, conversation_id):
+        with self._lock:
+            return len(self._conversations.get(conversation_id, []))
+
+    def messages(self, conversation_id, offset=0, limit=None):
+        """Messages in chronological order, starting at `offset`"""
+        with self._lock:
+            history = self._conversations.get(conversation_id, [])
+            end = None if limit is None else offset + limit
+            return [dict(message) for message in history[offset:end]]
+
+    def clear(self, conversation_id):
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+
+    def close(self):
+        pass
+
+
+class SQLiteHistoryStore:
+    """Chat history in SQLite, shared by every worker using the same file.
+
+    The database runs in WAL mode so readers never block the writer. Appends
+    are group-committed: a writer thread collects the rows of concurrent
+    appends for up to `batch_window` seconds and writes them in one
+    transaction. append() returns once its rows are committed, so a redirect
+    served by another worker already sees them.
+    """
+
+    def __init__(self, path, batch_window=0.005, max_batch=256, max_messages=500):
+        self.path = path
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_messages = max_messages
+        self._connect()
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS messages ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' conversation_id TEXT NOT NULL,'
+            ' created REAL NOT NULL,'
+            ' message TEXT NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS messages_conversation ON messages (conversation_id, id)'
+        )
+        self._conn.commit()
+        self._closed = False
+        self._start()
+        _sqlite_stores.add(self)
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+
+    def _start(self):
+        self._db_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._pending = []      # (waiter, conversation id, created, json message)
+        self._writer = threading.Thread(target=self._write_loop, name='chat-history-writer', daemon=True)
+        self._writer.start()
+
+    def _after_fork(self):
+        """A forked child opens its own connection and starts its own writer;
+        rows the parent had not written yet are left to the parent"""
+        if not self._closed:
+            # Never used nor closed here: SQLite connections must not cross a fork
+            self._parent_conn = self._conn
+            self._connect()
+            self._start()
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+            # Let concurrent appends join this batch
+            time.sleep(self.batch_window)
+            with self._cond:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            error = None
+            try:
+                with self._db_lock, self._conn:
+                    self._conn.executemany(
+                        'INSERT INTO messages (conversation_id, created, message) VALUES (?, ?, ?)',
+                        [row[1:] for row in batch],
+                    )
+                    for conversation_id in {row[1] for row in batch}:
+                        self._trim(conversation_id)
+            except Exception as e:  # reported to every waiting append
+                error = e
+            with self._cond:
+                for row in batch:
+                    waiter = row[0]
+                    waiter['remaining'] -= 1
+                    waiter['error'] = waiter['error'] or error
+                self._cond.notify_all()
+
+    def _trim(self, conversation_id):
+        self._conn.execute(
+            'DELETE FROM messages WHERE conversation_id = ? AND id <= ('
+            ' SELECT id FROM messages WHERE conversation_id = ?'
+            ' ORDER BY id DESC LIMIT 1 OFFSET ?)',
+            (conversation_id, conversation_id, self.max_messages),
+        )
+
+    def append(self, conversation_id, messages):
+        now = time.time()
+        waiter = {'remaining': len(messages), 'error': None}
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('History store is closed')
+            for message in messages:
+                self._pending.append((waiter, conversation_id, now, json.dumps(message)))
+            self._cond.notify_all()
+            while waiter['remaining']:
+                self._cond.wait()
+        if waiter['error'] is not None:
+            raise waiter['error']
+
+    def count(self, conversation_id):
+        with self._db_lock:
+            row = self._conn.execute(
+                'SELECT COUNT(*) FROM messages WHERE conversation_id = ?', (conversation_id,)
+            ).fetchone()
+        return row[0]
+
+    def messages(self, conversation_id, offset=0, limit=None):
+        """Messages in chronological order, starting at `offset`"""
+        with self._db_lock:
+            rows = self._conn.execute(
+                'SELECT message FROM messages WHERE conversation_id = ?'
+                ' ORDER BY id LIMIT ? OFFSET ?',
+                (conversation_id, -1 if limit is None else limit, offset),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def clear(self, conversation_id):
+        with self._db_lock, self._conn:
+            self._conn.execute('DELETE FROM messages WHERE conversation_id = ?', (conversation_id,))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        with self._db_lock:
+            self._conn.close()
+
+
+def _reconnect_after_fork():
+    for store in list(_sqlite_stores):
+        store._after_fork()
+
+
+os.register_at_fork(after_in_child=_reconnect_after_fork)
+
+
+def create_history_store(url):
+    """
+    Create a history store from a URL.
+
+    Args:
+        url (str): 'memory' or 'sqlite:///path/to/history.db'
+
+    Returns:
+        MemoryHistoryStore or SQLiteHistoryStore
+    """
+    if url == 'memory':
+        return MemoryHistoryStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteHistoryStore(url[len('sqlite:///'):])
+    raise ValueError(f"Unknown chat history store: {url}")
@@ -0,0 +1,114 @@
+from collections import deque
+from rdflib import URIRef
+from rdflib.namespace import RDFS
+
+
+class ClassHierarchy:
+    """rdfs:subClassOf hierarchy with a precomputed transitive closure.
+
+    Every class gets an integer id; the ancestors and descendants of each
+    class are kept as bitsets (Python ints), so "is-a" checks are a single
+    bit test and listing k related classes walks k set bits.
+    """
+
+    def __init__(self, graph):
+        self.ids = {}        # class IRI -> id
+        self.iris = []       # id -> class IRI
+        self.parents = []    # id -> [id, ...] direct superclasses
+        self.children = []   # id -> [id, ...] direct subclasses
+
+        for sub, sup in graph.subject_objects(RDFS.subClassOf):
+            # Anonymous superclasses are OWL restrictions, not named classes
+            if not isinstance(sub, URIRef) or not isinstance(sup, URIRef) or sub == sup:
+                continue
+            child, parent = self._id(str(sub)), self._id(str(sup))
+            if parent not in self.parents[child]:
+                self.parents[child].append(parent)
+                self.children[parent].append(child)
+
+        self.ancestors = self._closure(self.parents, self.children)
+        self.descendants = self._closure(self.children, self.parents)
+
+    def _id(self, iri):
+        class_id = self.ids.get(iri)
+        if class_id is None:
+            class_id = self.ids[iri] = len(self.iris)
+            self.iris.append(iri)
+            self.parents.append([])
+            self.children.append([])
+        return class_id
+
+    @staticmethod
+    def _closure(up, down):
+        """Bitset of everything reachable through `up` edges, for every node"""
+        count = len(up)
+        # Kahn's order: a node is processed after everything it points up to
+        pending = [len(edges) for edges in up]
+        queue = deque(i for i in range(count) if not pending[i])
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for lower in down[node]:
+                pending[lower] -= 1
+                if not pending[lower]:
+                    queue.append(lower)
+        # Nodes on or below a subclass cycle never reach zero; iterate them
+        # to a fixpoint
+        cyclic = [i for i in range(count) if pending[i]]
+
+        closure = [0] * count
+        for node in order:
+            for target in up[node]:
+                closure[node] |= closure[target] | (1 << target)
+        changed = bool(cyclic)
+        while changed:
+            changed = False
+            for node in cyclic:
+                reach = closure[node]
+                for target in up[node]:
+                    reach |= closure[target] | (1 << target)
+                reach &= ~(1 << node)
+                if reach != closure[node]:
+                    closure[node] = reach
+                    changed = True
+        return closure
+
+    def __contains__(self, iri):
+        return iri in self.ids
+
+    def is_a(self, sub, sup):
+        """Whether class `sub` is a direct or indirect subclass of `sup`"""
+        if sub not in self.ids or sup not in self.ids:
+            return False
+        return bool(self.ancestors[self.ids[sub]] >> self.ids[sup] & 1)
+
+    def depth(self, iri):
+        """Number of direct and indirect superclasses of a class"""
+        return self.ancestors[self.ids[iri]].bit_count() if iri in self.ids else 0
+
+    def breadth(self, iri):
+        """Number of direct and indirect subclasses of a class"""
+        return self.descendants[self.ids[iri]].bit_count() if iri in self.ids else 0
+
+    def superclasses(self, iris):
+        """All direct and indirect superclasses of the given classes"""
+        return self._members(self.ancestors, iris)
+
+    def subclasses(self, iris):
+        """All direct and indirect subclasses of the given classes"""
+        return self._members(self.descendants, iris)
+
+    def _members(self, closure, iris):
+        # A class is left out of its own closure only: of two classes
+        # asked about together, one can be a subclass of the other
+        bits = 0
+        for iri in iris:
+            if iri in self.ids:
+                bits |= closure[self.ids[iri]]
+        members = []
+        while bits:
+            low = bits & -bits
+            members.append(self.iris[low.bit_length() - 1])
+            bits ^= low
+        return members
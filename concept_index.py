@@ -0,0 +1,94 @@
+from bisect import bisect_left
+from rdflib import BNode, URIRef
+from rdflib.namespace import RDFS
+
+
+def normalize(text):
+    """Normalize a label or query the same way the SPARQL LCASE filters did"""
+    return str(text).lower()
+
+
+class ConceptIndex:
+    """In-memory index of labelled ontology subjects and their annotations.
+
+    Built once from an rdflib graph so that label lookups are dictionary and
+    sorted-array operations instead of full SPARQL scans over every label.
+    Annotation values are copied into per-subject records, unless a
+    TripleStore holding them is given to read them from.
+    """
+
+    def __init__(self, graph, store=None):
+        self.labels = {}    # normalized label -> [subject IRI, ...]
+        self.records = {}   # subject IRI -> {predicate IRI: [value, ...]}, without a store
+        self.names = {}     # subject IRI -> [original label, ...]
+        self.store = store
+        self._order = {}    # subject IRI -> position in the source document
+
+        for s, label in graph.subject_objects(RDFS.label):
+            if isinstance(s, BNode):
+                continue
+            subject = str(s)
+            if subject not in self._order:
+                self._order[subject] = len(self._order)
+            self.names.setdefault(subject, []).append(str(label))
+            subjects = self.labels.setdefault(normalize(label), [])
+            if subject not in subjects:
+                subjects.append(subject)
+
+        for subject in self._order if store is None else ():
+            record = {}
+            for p, o in graph.predicate_objects(URIRef(subject)):
+                if isinstance(o, BNode):
+                    continue
+                record.setdefault(str(p), []).append(str(o))
+            self.records[subject] = record
+
+        self._build_lookup_tables()
+
+    def _build_lookup_tables(self):
+        # Sorted labels answer prefix queries, sorted suffixes answer substring
+        # queries: both become a bisect plus a short forward walk.
+        self._sorted_labels = sorted(self.labels)
+        self._suffixes = sorted(
+            (label[i:], label) for label in self.labels for i in range(len(label))
+        )
+
+    def _ordered(self, labels):
+        subjects = {s for label in labels for s in self.labels[label]}
+        return sorted(subjects, key=self._order.__getitem__)
+
+    def exact(self, concept):
+        """Subjects having a label equal to the concept (case-insensitive)"""
+        return list(self.labels.get(normalize(concept), []))
+
+    def prefix(self, concept):
+        """Subjects having a label that starts with the concept"""
+        query = normalize(concept)
+        matched = []
+        i = bisect_left(self._sorted_labels, query)
+        while i < len(self._sorted_labels) and self._sorted_labels[i].startswith(query):
+            matched.append(self._sorted_labels[i])
+            i += 1
+        return self._ordered(matched)
+
+    def substring(self, concept):
+        """Subjects having a label that contains the concept"""
+        query = normalize(concept)
+        if not query:
+            return self._ordered(self.labels)
+        matched = set()
+        i = bisect_left(self._suffixes, (query,))
+        while i < len(self._suffixes) and self._suffixes[i][0].startswith(query):
+            matched.add(self._suffixes[i][1])
+            i += 1
+        return self._ordered(matched)
+
+    def objects(self, subject, predicate):
+        """Values of a predicate of one labelled subject"""
+        if self.store is not None:
+            return self.store.values(subject, predicate)
+        return self.records[subject].get(str(predicate), [])
+
+    def values(self, subjects, predicate):
+        """All values of a predicate across the given subjects"""
+        return [value for s in subjects for value in self.objects(s, predicate)]
@@ -0,0 +1,98 @@
+from collections import deque
+
+
+class ConceptMatcher:
+    """Aho-Corasick automaton over ontology surface forms.
+
+    Finds every occurrence of every pattern in a single pass over the text,
+    keeps only matches that fall on word boundaries and resolves overlapping
+    matches longest-first.
+    """
+
+    def __init__(self, names):
+        """
+        Args:
+            names (iterable): (surface form, canonical label) pairs
+        """
+        self.patterns = []              # pattern id -> (surface form, canonical label)
+        self._goto = [{}]               # state -> {char: state}
+        self._fail = [0]
+        self._output = [[]]             # state -> [pattern id, ...]
+
+        seen = set()
+        for form, label in names:
+            form = form.lower().strip()
+            if not form or (form, label) in seen:
+                continue
+            seen.add((form, label))
+            self._add(form, len(self.patterns))
+            self.patterns.append((form, label))
+        self._build_failure_links()
+
+    def _add(self, form, pattern_id):
+        state = 0
+        for char in form:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(pattern_id)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text):
+        """Return every word-bounded match as (start, end, pattern id)"""
+        matches = []
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern_id in self._output[state]:
+                end = i + 1
+                start = end - len(self.patterns[pattern_id][0])
+                if _is_boundary(text, start - 1) and _is_boundary(text, end):
+                    matches.append((start, end, pattern_id))
+        return matches
+
+    def spans(self, text):
+        """
+        Resolve overlapping matches longest-first, leaving only maximal
+        matches that do not overlap.
+
+        Returns:
+            list: (start, end, canonical label, similarity) in order of
+            appearance; the similarity of an exact match is 1.0
+        """
+        text = text.lower()
+        taken = []
+        for start, end, pattern_id in sorted(self.find_all(text), key=lambda m: (m[0] - m[1], m[0])):
+            if any(start < t_end and t_start < end for t_start, t_end, _, _ in taken):
+                continue
+            taken.append((start, end, self.patterns[pattern_id][1], 1.0))
+        return sorted(taken)
+
+    def match(self, text):
+        """Return the canonical labels found in the text, longest match first"""
+        selected = []
+        for _, _, label, _ in sorted(self.spans(text), key=lambda m: (m[0] - m[1], m[0])):
+            if label not in selected:
+                selected.append(label)
+        return selected
+
+def _is_boundary(text, i):
+    return i < 0 or i >= len(text) or not text[i].isalnum()
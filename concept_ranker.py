@@ -0,0 +1,53 @@
+from fuzzy_index import WORD_PATTERN
+
+
+class ConceptRanker:
+    """Orders the concepts matched in a question, most specific first.
+
+    A match scores the number of question words it covers plus the number
+    of superclasses of its class, times its similarity (1.0 unless it was
+    misspelled). Longer labels are more specific than the labels nested in
+    them, and deeper classes than their ancestors: "elliptic curve
+    cryptography" before "cryptography", "AES" before "block cipher". Ties
+    go to the class with fewer subclasses, then to the match asked about
+    first.
+    """
+
+    def __init__(self, ontology_parser):
+        self.parser = ontology_parser
+        self._specificity = {}  # label -> parser.get_specificity(label)
+
+    def specificity(self, label):
+        specificity = self._specificity.get(label)
+        if specificity is None:
+            specificity = self._specificity[label] = self.parser.get_specificity(label)
+        return specificity
+
+    def rank(self, text, spans, limit=None):
+        """
+        Args:
+            text (str): The question the spans were found in
+            spans (list): Non-overlapping (start, end, label, similarity)
+                matches, as returned by ConceptMatcher.spans
+            limit (int): Most labels returned
+
+        Returns:
+            list: Distinct labels, most specific first
+        """
+        scored = []
+        for start, end, label, similarity in spans:
+            words = len(WORD_PATTERN.findall(text[start:end]))
+            superclasses, fewer_subclasses = self.specificity(label)
+            scored.append((-(words + superclasses) * similarity, -fewer_subclasses, start, label))
+        labels = []
+        for *_, label in sorted(scored):
+            if label not in labels:
+                labels.append(label)
+        return labels[:limit]
+
+    def in_mention_order(self, labels, spans):
+        """The labels ordered by where the question first mentions them, unmatched ones last"""
+        first = {}
+        for start, _, label, _ in spans:
+            first[label] = min(start, first.get(label, start))
+        return sorted(labels, key=lambda label: first.get(label, float('inf')))
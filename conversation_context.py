@@ -0,0 +1,53 @@
+import threading
+from collections import OrderedDict
+
+
+class ConceptContext:
+    """The concepts a conversation last asked about, to answer follow-ups.
+
+    Only the concepts are kept when a question is answered. Records are
+    fetched when a follow-up is answered, for the aspects it asks about and
+    only for concepts without precomputed blocks; they are kept here so that
+    the next follow-up does not fetch them again.
+    """
+
+    def __init__(self, concepts, digest):
+        self.concepts = list(dict.fromkeys(c.lower().strip() for c in concepts))  # as answered
+        self.digest = digest        # ontology version the concepts were answered from
+        self.records = {}           # concept -> {aspect: values} fetched so far
+
+
+class ConceptContextCache:
+    """Last ConceptContext of each conversation, least recently used dropped first.
+
+    Contexts are per process; a conversation answered by another worker
+    rebuilds its context from the chat history.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._contexts = OrderedDict()  # conversation id -> ConceptContext
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id, digest):
+        """The conversation's context, None if it has none for this ontology version"""
+        with self._lock:
+            context = self._contexts.get(conversation_id)
+            if context is None or context.digest != digest:
+                return None
+            self._contexts.move_to_end(conversation_id)
+            return context
+
+    def put(self, conversation_id, context):
+        with self._lock:
+            self._contexts[conversation_id] = context
+            self._contexts.move_to_end(conversation_id)
+            while len(self._contexts) > self.maxsize:
+                self._contexts.popitem(last=False)
+
+    def clear(self, conversation_id):
+        with self._lock:
+            self._contexts.pop(conversation_id, None)
+
+    def __len__(self):
+        return len(self._contexts)
@@ -0,0 +1,274 @@
+import re
+from collections import defaultdict
+
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+
+def fold(text):
+    """Lowercase and drop everything but letters and digits, so "SHA-2",
+    "sha 2" and "sha2" compare equal"""
+    return ''.join(WORD_PATTERN.findall(str(text).lower()))
+
+
+def trigrams(key):
+    """Character trigrams of a folded key, padded so short keys and word
+    starts carry weight"""
+    padded = '  ' + key + ' '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def word_edits(length):
+    """Edits tolerated in a single word: none in very short words"""
+    if length < 3:
+        return 0
+    return 1 if length < 8 else 2
+
+
+def deletions(word, depth):
+    """Every string left after deleting up to `depth` characters of the word"""
+    variants = frontier = {word}
+    for _ in range(depth):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants = variants | frontier
+    return variants
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (a transposition counts as one
+    edit), or limit + 1 once it is certain to exceed `limit`.
+
+    Bit-parallel (Myers/Hyyro): each column of the dynamic programming table
+    is kept as vertical deltas in two integers, so a column costs a handful
+    of integer operations instead of a loop over `a`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if not a:
+        return len(b)
+    masks = {}
+    for i, char in enumerate(a):
+        masks[char] = masks.get(char, 0) | 1 << i
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    positive, negative = full, 0
+    score = len(a)
+    diagonal = 0
+    previous_mask = 0
+    for j, char in enumerate(b):
+        mask = masks.get(char, 0)
+        transposed = (((~diagonal) & mask) << 1) & previous_mask
+        diagonal = ((((mask & positive) + positive) ^ positive) | mask | negative | transposed) & full
+        horizontal_positive = negative | ~(diagonal | positive)
+        horizontal_negative = positive & diagonal
+        if horizontal_positive & last:
+            score += 1
+        elif horizontal_negative & last:
+            score -= 1
+        # The rest of b can lower the score by at most one per character
+        if score - (len(b) - j - 1) > limit:
+            return limit + 1
+        horizontal_positive = (horizontal_positive << 1) | 1
+        negative = horizontal_positive & diagonal
+        positive = ((horizontal_negative << 1) | ~(horizontal_positive | diagonal)) & full
+        previous_mask = mask
+    return score if score <= limit else limit + 1
+
+
+class FuzzyIndex:
+    """Typo-tolerant lookup of ontology surface forms.
+
+    search() compares a whole string with every surface form. Forms are
+    folded (lowercase, letters and digits only) and indexed by character
+    trigram; an edit changes at most four trigrams, so the trigrams a query
+    shares with a form bound their edit distance from below. Candidates are
+    verified with a bounded edit distance in order of that bound, and
+    verification stops once no remaining candidate can beat the results
+    found so far. Similarity is 1 - distance / length of the longer form.
+
+    match() finds forms inside a question. Its words, and pairs of adjacent
+    words written together, are corrected against the words and word pairs
+    of the surface forms through a deletion-neighbourhood index. A
+    corrected word anchors each form containing it at one position of the
+    question, and the run of question words the form would cover there is
+    verified like a search() result.
+    """
+
+    def __init__(self, names, threshold=0.8, min_length=4):
+        """
+        Args:
+            names (iterable): (surface form, canonical label) pairs
+            threshold (float): Lowest similarity returned by default
+            min_length (int): Shorter folded queries and forms are never
+                matched fuzzily, since one edit already changes their meaning
+        """
+        self.threshold = threshold
+        self.min_length = min_length
+        self.entries = []               # entry id -> (folded form, canonical label)
+        self._grams = []                # entry id -> frozenset of trigrams
+        self._postings = defaultdict(list)  # trigram -> [entry id, ...]
+        # form word, or two adjacent form words joined ->
+        # [(entry id, index of its first word, words it covers, words in the form), ...]
+        self._anchors = defaultdict(list)
+        self._deletions = defaultdict(set)  # deletion variant -> {anchor, ...}
+        self._corrected = {}                # (question token, depth) -> [anchor, ...]
+
+        seen = set()
+        for form, label in names:
+            key = fold(form)
+            if len(key) < min_length or (key, label) in seen:
+                continue
+            seen.add((key, label))
+            grams = trigrams(key)
+            entry_id = len(self.entries)
+            self.entries.append((key, label))
+            self._grams.append(frozenset(grams))
+            for gram in grams:
+                self._postings[gram].append(entry_id)
+            words = WORD_PATTERN.findall(form.lower())
+            for i in range(len(words)):
+                for covered in (1, 2):
+                    anchor = ''.join(words[i:i + covered])
+                    # Very short words are in too many forms to place one
+                    if i + covered <= len(words) and word_edits(len(anchor)):
+                        self._anchors[anchor].append((entry_id, i, covered, len(words)))
+        for anchor in self._anchors:
+            for variant in deletions(anchor, word_edits(len(anchor))):
+                self._deletions[variant].add(anchor)
+        self._postings = dict(self._postings)
+        self._anchors = dict(self._anchors)
+        self._deletions = {variant: tuple(anchors) for variant, anchors in self._deletions.items()}
+
+    def _shared(self, grams):
+        """entry id -> number of the given trigrams it contains"""
+        shared = defaultdict(int)
+        for gram in grams:
+            for entry_id in self._postings.get(gram, ()):
+                shared[entry_id] += 1
+        return shared
+
+    def _corrections(self, word, depth):
+        """Anchors within the edits tolerated for the shorter of the two"""
+        found = self._corrected.get((word, depth))
+        if found is not None:
+            return found
+        found = []
+        candidates = set()
+        for variant in deletions(word, depth):
+            candidates.update(self._deletions.get(variant, ()))
+        for candidate in candidates:
+            limit = word_edits(min(len(word), len(candidate)))
+            distance = edit_distance(word, candidate, limit)
+            if distance <= limit:
+                found.append(candidate)
+        # Question words repeat across questions; the cache only has to be
+        # bounded, not to keep the most useful entries
+        if len(self._corrected) >= 4096:
+            self._corrected.clear()
+        self._corrected[word, depth] = found
+        return found
+
+    def search(self, text, limit=5, threshold=None):
+        """
+        Rank the canonical labels whose surface forms are close to the text.
+
+        Args:
+            text (str): The possibly misspelled concept
+            limit (int): Maximum number of labels returned
+            threshold (float): Lowest similarity, defaults to the index's
+
+        Returns:
+            list: (label, similarity) tuples, most similar first
+        """
+        threshold = self.threshold if threshold is None else threshold
+        key = fold(text)
+        if len(key) < self.min_length:
+            return []
+        grams = trigrams(key)
+
+        candidates = []  # (best possible similarity, entry id)
+        for entry_id, count in self._shared(grams).items():
+            form = self.entries[entry_id][0]
+            longest = max(len(form), len(key))
+            lower_bound = max(abs(len(form) - len(key)),
+                              -(-(max(len(grams), len(self._grams[entry_id])) - count) // 4))
+            if 1 - lower_bound / longest >= threshold:
+                candidates.append((1 - lower_bound / longest, entry_id))
+        candidates.sort(reverse=True)
+
+        best = {}  # label -> similarity
+        for bound, entry_id in candidates:
+            if len(best) >= limit and bound < sorted(best.values())[-limit]:
+                break
+            form, label = self.entries[entry_id]
+            if best.get(label, 0) >= bound:
+                continue
+            longest = max(len(form), len(key))
+            max_distance = int(longest * (1 - threshold) + 1e-9)
+            distance = edit_distance(key, form, max_distance)
+            if distance <= max_distance:
+                best[label] = max(best.get(label, 0), 1 - distance / longest)
+        ranked = sorted(best.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+    def spans(self, text, threshold=None):
+        """
+        Find concepts spelled approximately in a question.
+
+        Overlapping hits are resolved like exact matches, the hit covering
+        the most matching characters first.
+
+        Returns:
+            list: (start, end, canonical label, similarity) in order of
+            appearance, with character offsets into the lowercased text
+        """
+        threshold = self.threshold if threshold is None else threshold
+        text = text.lower()
+        positions = [m.span() for m in WORD_PATTERN.finditer(text)]
+        words = [text[start:end] for start, end in positions]
+        key = ''.join(words)
+        offsets = [0]
+        for word in words:
+            offsets.append(offsets[-1] + len(word))
+
+        checked = set()
+        hits = []
+        for start in range(len(words)):
+            for covered in (1, 2):
+                if start + covered > len(words):
+                    continue
+                token = key[offsets[start]:offsets[start + covered]]
+                # Pairs of words only tolerate one edit, to keep this cheap
+                depth = word_edits(len(token)) if covered == 1 else min(word_edits(len(token)), 1)
+                for anchor in self._corrections(token, depth):
+                    for entry_id, first, anchor_words, form_words in self._anchors[anchor]:
+                        # Question words the form covers when anchored here
+                        begin = start - first
+                        end = start + covered + form_words - first - anchor_words
+                        if begin < 0 or end > len(words) or (entry_id, begin, end) in checked:
+                            continue
+                        checked.add((entry_id, begin, end))
+                        form, label = self.entries[entry_id]
+                        span = key[offsets[begin]:offsets[end]]
+                        longest = max(len(form), len(span))
+                        limit = int(longest * (1 - threshold) + 1e-9)
+                        if abs(len(form) - len(span)) > limit or len(span) < self.min_length:
+                            continue
+                        distance = edit_distance(span, form, limit)
+                        if distance <= limit:
+                            hits.append((longest - distance, 1 - distance / longest, begin, end, label))
+
+        taken = []
+        for _, similarity, start, end, label in sorted(hits, key=lambda h: (-h[0], -h[1], h[2], h[4])):
+            if any(start < t_end and t_start < end for t_start, t_end, _, _ in taken):
+                continue
+            taken.append((start, end, label, similarity))
+        return sorted((positions[start][0], positions[end - 1][1], label, similarity)
+                      for start, end, label, similarity in taken)
+
+    def match(self, text, threshold=None):
+        """Canonical labels of the concepts spelled approximately in a question, in order of appearance"""
+        labels = []
+        for _, _, label, _ in self.spans(text, threshold):
+            if label not in labels:
+                labels.append(label)
+        return labels
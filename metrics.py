@@ -0,0 +1,232 @@
+import contextvars
+import functools
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Seconds; answers take tens of microseconds, spaCy and SPARQL milliseconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per combination of label values"""
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, label_values)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per combination of label values"""
+
+    def __init__(self, name, help, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}  # label values -> [bucket counts, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0]
+            # First bucket whose upper bound is at least the value
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def count(self, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            return sum(series[0]) if series else 0
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_values, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    le = _labels(self.label_names, label_values, f'le="{_number(bound)}"')
+                    lines.append(f'{self.name}_bucket{le} {cumulative}')
+                labels = _labels(self.label_names, label_values)
+                lines.append(f'{self.name}_sum{labels} {_number(total)}')
+                lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Metrics exposed together in the Prometheus text format.
+
+    Collectors are callables returning extra exposition lines, for values
+    that are kept elsewhere (such as the answer cache's counters) and read
+    only when scraped.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help, label_names=()):
+        metric = Counter(name, help, label_names)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, label_names=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, label_names, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def expose(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.histogram(
+    'cryptology_request_seconds', 'Time to serve a request', ['endpoint', 'status'])
+STAGE_SECONDS = REGISTRY.histogram(
+    'cryptology_stage_seconds', 'Time spent in each stage of answering a message', ['stage'])
+QUERY_SECONDS = REGISTRY.histogram(
+    'cryptology_parser_query_seconds', 'Time spent in each type of ontology query', ['query'])
+QUERIES_PER_REQUEST = REGISTRY.histogram(
+    'cryptology_parser_queries_per_request', 'Ontology queries made by one request', ['endpoint'],
+    buckets=QUERY_COUNT_BUCKETS)
+ERRORS = REGISTRY.counter(
+    'cryptology_errors_total', 'Exceptions raised while serving requests', ['endpoint', 'exception'])
+
+
+class RequestTrace:
+    """Where the time of one request went.
+
+    Stages nest: extract_concepts is part of process_question, and spacy
+    part of extract_concepts. A stage entered twice is summed.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.question = None
+        self.status = None                 # HTTP status, once the response is made
+        self.streamed = False              # body generated after the view returned
+        self.start = time.perf_counter()
+        self.stages = defaultdict(float)   # stage -> seconds
+        self.queries = defaultdict(int)    # query type -> calls
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def summary(self):
+        return {
+            'endpoint': self.endpoint,
+            'question': self.question,
+            'status': self.status,
+            'total_ms': round(self.elapsed() * 1000, 3),
+            'stages_ms': {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()},
+            'queries': dict(self.queries),
+        }
+
+
+_trace = contextvars.ContextVar('request_trace', default=None)
+_in_query = contextvars.ContextVar('in_query', default=False)
+
+
+def start_trace(endpoint):
+    """Start collecting the stages and queries of the current request"""
+    trace = RequestTrace(endpoint)
+    _trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _trace.get()
+
+
+def end_trace(trace):
+    """Stop collecting into the trace, unless a newer one has started"""
+    if _trace.get() is trace:
+        _trace.set(None)
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one stage, in the histogram and in the request's trace"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, name)
+        trace = _trace.get()
+        if trace is not None:
+            trace.stages[name] += elapsed
+
+
+def query(method):
+    """Time and count calls to an ontology query method.
+
+    Queries made inside another query (lookup falling back to the get_*
+    methods with SPARQL) belong to the outer one and are not counted again.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        if _in_query.get():
+            return method(*args, **kwargs)
+        token = _in_query.set(True)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _in_query.reset(token)
+            QUERY_SECONDS.observe(elapsed, name)
+            trace = _trace.get()
+            if trace is not None:
+                trace.queries[name] += 1
+
+    return timed
@@ -0,0 +1,153 @@
+import os
+import queue
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Live batchers, restarted in forked children (threads do not survive a fork)
+_batchers = weakref.WeakSet()
+
+
+def normalize_question(text):
+    """Cache key for a question: lowercase, whitespace collapsed"""
+    return ' '.join(text.lower().split())
+
+
+class NlpBatcher:
+    """Parses texts from concurrent callers together with nlp.pipe.
+
+    A worker thread takes the first waiting text, collects whatever else
+    arrives within `window` seconds (up to `max_batch` texts) and parses
+    the batch in one nlp.pipe call. Texts queued while a batch is being
+    parsed go into the next one, so batches grow with the load while a
+    lone caller only waits for the window.
+
+    Docs are cached per normalized text, and callers asking for a text
+    that is already being parsed share its result. A Doc is shared between
+    callers and must not be modified.
+    """
+
+    def __init__(self, nlp, window=0.001, max_batch=64, cache_size=4096):
+        """
+        Args:
+            nlp: spaCy pipeline
+            window (float): Seconds to wait for more texts after the first
+            max_batch (int): Most texts parsed in one nlp.pipe call
+            cache_size (int): Docs kept, least recently used dropped first
+        """
+        self.nlp = nlp
+        self.window = window
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self._cache = OrderedDict()   # normalized text -> Doc
+        self._pending = {}            # normalized text -> Future, queued or being parsed
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.batches = 0
+        self.parsed = 0
+        self._start()
+        _batchers.add(self)
+
+    def _start(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='nlp-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, text):
+        """
+        Queue a text for parsing.
+
+        Returns:
+            concurrent.futures.Future: resolves to the Doc of the normalized
+            text; wrap it with asyncio.wrap_future to await it
+        """
+        key = normalize_question(text)
+        with self._lock:
+            doc = self._cache.get(key)
+            if doc is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                future = Future()
+                future.set_result(doc)
+                return future
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = Future()
+                self._queue.put(key)
+        return future
+
+    def _after_fork(self):
+        """A forked child keeps the parent's cache but needs its own worker"""
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._start()
+
+    def parse(self, text, timeout=None):
+        """The Doc of a text, parsed in a batch with other callers' texts"""
+        return self.submit(text).result(timeout)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            closing = None in batch
+            batch = [key for key in batch if key is not None]
+            if batch:
+                self._parse(batch)
+            if closing:
+                return
+
+    def _parse(self, batch):
+        try:
+            docs = list(self.nlp.pipe(batch, batch_size=len(batch)))
+        except Exception as e:
+            with self._lock:
+                futures = [self._pending.pop(key) for key in batch]
+            for future in futures:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self.batches += 1
+            self.parsed += len(batch)
+            futures = []
+            for key, doc in zip(batch, docs):
+                futures.append(self._pending.pop(key))
+                self._cache[key] = doc
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        for future, doc in zip(futures, docs):
+            future.set_result(doc)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cached': len(self._cache),
+                'hits': self.hits,
+                'batches': self.batches,
+                'parsed': self.parsed,
+            }
+
+    def close(self):
+        """Stop the worker once the texts already queued are parsed"""
+        self._queue.put(None)
+        self._thread.join()
+
+
+def _restart_after_fork():
+    for batcher in list(_batchers):
+        batcher._after_fork()
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
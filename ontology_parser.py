@@ -1,15 +1,411 @@
-from rdflib import Graph, Namespace, Literal
+from rdflib import Graph, Namespace, Literal, URIRef
 from rdflib.namespace import RDF, RDFS, SKOS, OWL
+from concept_index import ConceptIndex, normalize
+from class_hierarchy import ClassHierarchy
+from relation_graph import RelationGraph
+from fuzzy_index import FuzzyIndex
+from search_index import SearchIndex
+from metrics import query
+from triple_store import TripleStore
+from ontology_snapshot import file_digest, snapshot_path, load_snapshot, write_snapshot
 import os
+import time
+
+CRYPTO = Namespace("http://www.semanticweb.org/quantumblockchains/crypto#")
+OBO = Namespace("http://purl.obolibrary.org/obo/")
+
+DEFINITION = OBO.IAO_0000115
+ALTERNATIVE_NAME = OBO.IAO_0000118
+ACRONYM = CRYPTO.acronym
+PROPER_LABEL = CRYPTO.proper_label
+REFERENCE_PREDICATES = [CRYPTO.doi, CRYPTO.wikipedia_entry, CRYPTO.qb_pdf_link, CRYPTO.wikidata_entry]
+RELATION_PREDICATES = [SKOS.related, OBO.IAO_0000136, OBO.BFO_0000051]
+# Names of relations the ontology uses without labelling them
+RELATION_NAMES = {
+    str(RDFS.subClassOf): 'is a',
+    str(OBO.IAO_0000136): 'is about',
+    str(OBO.BFO_0000051): 'has part',
+    str(OBO.RO_0000056): 'participates in',
+    str(OBO.RO_0000057): 'has participant',
+    str(OBO.RO_0000080): 'quality of',
+    str(OWL.topObjectProperty): 'is related to',
+}
+
+# Aspects served by OntologyParser.lookup -> the accessor returning the same shape
+ASPECTS = {
+    'definition': 'get_concept_definition',
+    'comments': 'get_comments',
+    'acronyms': 'get_acronyms',
+    'alternative_names': 'get_alternative_names',
+    'proper_label': 'get_proper_label',
+    'references': 'get_references',
+    'related': 'get_related_concepts',
+    'subclasses': 'get_subclasses',
+    'superclasses': 'get_superclasses',
+}
+# Predicates the accessors read. The compact backend keeps only these, and
+# the crypto: predicates a reference type can name.
+READ_PREDICATES = [RDFS.label, RDFS.subClassOf, RDFS.comment, DEFINITION, ALTERNATIVE_NAME,
+                   ACRONYM, PROPER_LABEL] + RELATION_PREDICATES + REFERENCE_PREDICATES
+# rdflib keeps the whole graph, so SPARQL works; compact keeps READ_PREDICATES
+# in a TripleStore, which takes a fraction of the memory
+BACKENDS = ('rdflib', 'compact')
+
+# Text a concept is found by in full-text search, besides its labels
+SEARCHED_PREDICATES = [ACRONYM, ALTERNATIVE_NAME, DEFINITION, RDFS.comment]
+
+ANNOTATION_ASPECTS = {
+    'comments': RDFS.comment,
+    'acronyms': ACRONYM,
+    'alternative_names': ALTERNATIVE_NAME,
+    'proper_label': PROPER_LABEL,
+}
 
 class OntologyParser:
-    def __init__(self, rdf_file):
-        self.g = Graph()
-        self.g.parse(rdf_file)
-        self.crypto = Namespace("http://www.semanticweb.org/quantumblockchains/crypto#")
-        self.obo = Namespace("http://purl.obolibrary.org/obo/")
+    def __init__(self, rdf_file, use_sparql=False, use_snapshot=True, backend='rdflib'):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        if use_sparql and backend != 'rdflib':
+            raise ValueError("SPARQL queries need the rdflib backend")
+        self.rdf_file = rdf_file
+        self.backend = backend
+        self.crypto = CRYPTO
+        self.obo = OBO
+        # The SPARQL path is kept so index results can be diffed against it
+        self.use_sparql = use_sparql
+        self.digest = file_digest(rdf_file)
+        self.load_stats = {}
+        
+        start = time.perf_counter()
+        snapshot = load_snapshot(snapshot_path(rdf_file, backend), self.digest) if use_snapshot else None
+        if snapshot:
+            self.g = snapshot['graph']
+            self.index = snapshot['index']
+            self.hierarchy = snapshot['hierarchy']
+            self.fuzzy = snapshot['fuzzy']
+            self.relations = snapshot['relations']
+            self.search_index = snapshot['search']
+            self.load_stats = {
+                'source': 'snapshot',
+                'load_seconds': time.perf_counter() - start,
+                'parse_seconds': snapshot['parse_seconds'],
+            }
+        else:
+            graph = Graph()
+            graph.parse(rdf_file)
+            if backend == 'compact':
+                stored = set(READ_PREDICATES) | {p for p in graph.predicates() if p.startswith(CRYPTO)}
+                self.g = TripleStore.from_graph(graph, stored)
+                self.index = ConceptIndex(graph, store=self.g)
+            else:
+                self.g = graph
+                self.index = ConceptIndex(graph)
+            self.hierarchy = ClassHierarchy(graph)
+            self.relations = RelationGraph(graph, RELATION_PREDICATES)
+            self.fuzzy = FuzzyIndex(self.get_concept_names())
+            self.search_index = SearchIndex(self._search_documents())
+            parse_seconds = time.perf_counter() - start
+            self.load_stats = {
+                'source': 'rdf',
+                'load_seconds': parse_seconds,
+                'parse_seconds': parse_seconds,
+            }
+            if use_snapshot:
+                write_snapshot(snapshot_path(rdf_file, backend), self.digest,
+                               graph=self.g, index=self.index, hierarchy=self.hierarchy,
+                               fuzzy=self.fuzzy, relations=self.relations, search=self.search_index,
+                               parse_seconds=parse_seconds)
+
+    def _search_documents(self):
+        for subject, names in self.index.names.items():
+            yield subject, names + [text for predicate in SEARCHED_PREDICATES
+                                    for text in self.index.objects(subject, predicate)]
+
+    def _annotations(self, concept, predicate):
+        subjects = self.index.substring(concept)
+        return self.index.values(subjects, predicate)
+
+    def _definitions(self, exact, subjects):
+        # First try exact match
+        definitions = self.index.values(exact, DEFINITION)
+        
+        # If no exact match found, try partial match
+        if not definitions:
+            definitions = self.index.values(subjects, DEFINITION)
         
+        return definitions
+
+    def _related(self, subjects):
+        related = []
+        for s in subjects:
+            for predicate, target in self.relations.objects(s, RELATION_PREDICATES):
+                for label in self.index.names.get(target, []):
+                    related.append((target, label, predicate))
+        return related
+
+    def _references(self, subjects, ref_type=None):
+        predicates = list(REFERENCE_PREDICATES)
+        if ref_type and CRYPTO[ref_type] not in predicates:
+            predicates.insert(0, CRYPTO[ref_type])
+        references = []
+        for s in subjects:
+            for predicate in predicates:
+                for ref in self.index.objects(s, predicate):
+                    references.append((ref, str(predicate).split('#')[-1]))
+        return references
+
+    def _classes(self, concept, exact, subjects):
+        """Resolve a class IRI or a concept label to the class IRIs it names"""
+        if concept in self.hierarchy:
+            return [concept]
+        return [s for s in exact or subjects if s in self.hierarchy]
+
+    def _resolve(self, concept):
+        """Subjects labelled exactly as the concept, and those whose label contains it"""
+        return self.index.exact(concept), self.index.substring(concept)
+
+    def _resolve_classes(self, concept):
+        return self._classes(concept, *self._resolve(concept))
+
+    def _class_label(self, iri):
+        names = self.index.names.get(iri)
+        return names[0] if names else iri.split('#')[-1].split('/')[-1]
+
+    def _aspect(self, aspect, concept, exact, subjects):
+        if aspect == 'definition':
+            return self._definitions(exact, subjects)
+        if aspect == 'references':
+            return self._references(subjects)
+        if aspect == 'related':
+            return self._related(subjects)
+        if aspect == 'subclasses':
+            return [(iri, self._class_label(iri))
+                    for iri in self.hierarchy.subclasses(self._classes(concept, exact, subjects))]
+        if aspect == 'superclasses':
+            return [(iri, self._class_label(iri))
+                    for iri in self.hierarchy.superclasses(self._classes(concept, exact, subjects))]
+        return self.index.values(subjects, ANNOTATION_ASPECTS[aspect])
+
+    @query
+    def lookup(self, concepts, aspects):
+        """
+        Fetch several aspects of several concepts in one pass.
+        
+        Each concept's label is resolved once and every requested aspect is
+        read from the same index records, instead of one query per
+        (concept, aspect) pair.
+        
+        Args:
+            concepts (list): Concept labels
+            aspects (list): Names from ASPECTS
+        
+        Returns:
+            dict: concept -> {aspect: values}, each value shaped like the
+            result of the matching get_* accessor
+        """
+        unknown = set(aspects) - set(ASPECTS)
+        if unknown:
+            raise ValueError(f"Unknown aspects: {', '.join(sorted(unknown))}")
+        results = {}
+        for concept in concepts:
+            if self.use_sparql:
+                results[concept] = {aspect: getattr(self, ASPECTS[aspect])(concept) for aspect in aspects}
+                continue
+            exact, subjects = self._resolve(concept)
+            results[concept] = {aspect: self._aspect(aspect, concept, exact, subjects) for aspect in aspects}
+        return results
+        
+    @query
     def get_concept_definition(self, concept):
+        if self.use_sparql:
+            return self._sparql_get_concept_definition(concept)
+        return self._definitions(*self._resolve(concept))
+
+    @query
+    def get_all_concepts(self):
+        """Get all concept labels from the ontology"""
+        if self.use_sparql:
+            return self._sparql_get_all_concepts()
+        return list(self.index.labels)
+
+    @query
+    def get_concept_names(self):
+        """Get (surface form, label) pairs for every label, acronym and alternative name"""
+        names = [(label, label) for label in self.index.labels]
+        for s, labels in self.index.names.items():
+            label = normalize(labels[0])
+            for predicate in (ACRONYM, ALTERNATIVE_NAME):
+                for name in self.index.objects(s, predicate):
+                    names.append((normalize(name), label))
+        return names
+    
+    @query
+    def suggest_concepts(self, text, limit=5):
+        """
+        Find concept labels spelled approximately like the text.
+        
+        Labels, acronyms and alternative names are all compared, so a
+        misspelled acronym suggests the label it stands for.
+        
+        Args:
+            text (str): A possibly misspelled concept
+            limit (int): Maximum number of suggestions
+        
+        Returns:
+            list: (label, similarity) tuples, most similar first
+        """
+        return self.fuzzy.search(text, limit=limit)
+    
+    @query
+    def get_related_concepts(self, concept):
+        if self.use_sparql:
+            return self._sparql_get_related_concepts(concept)
+        return self._related(self.index.substring(concept))
+
+    @query
+    def search(self, text, limit=10):
+        """
+        Full-text search over the labels, acronyms, alternative names,
+        definitions and comments of every concept (BM25).
+
+        Returns:
+            list: (IRI, label, score, coverage) tuples, best first; coverage
+            is the score relative to the best the query could reach, 0 to 1
+        """
+        return [(iri, self._class_label(iri), score, coverage)
+                for iri, score, coverage in self.search_index.search(text, limit)]
+
+    def relation_name(self, predicate):
+        """Readable name of a relation predicate"""
+        predicate = str(predicate)
+        names = self.index.names.get(predicate)
+        if names:
+            return names[0]
+        return RELATION_NAMES.get(predicate) or predicate.split('#')[-1].split('/')[-1].replace('_', ' ')
+
+    def _terms(self, concept):
+        """Terms a concept names: those labelled exactly as it, else those whose label contains it"""
+        if concept in self.relations:
+            return [concept]
+        exact, subjects = self._resolve(concept)
+        return exact or subjects
+
+    @query
+    def get_neighborhood(self, concept, hops=2, limit=50):
+        """
+        Find the terms within a few relations of a concept, following
+        relations and subclass links either way.
+
+        Args:
+            concept (str): The IRI or label to start from
+            hops (int): Most relations between the concept and a term
+            limit (int): Most terms returned
+
+        Returns:
+            list: (IRI, label, distance) tuples, nearest first
+        """
+        return [(iri, self._class_label(iri), distance)
+                for iri, distance in self.relations.neighborhood(self._terms(concept), hops, limit)]
+
+    @query
+    def find_relation_path(self, concept, other, max_hops=6):
+        """
+        Find the shortest chain of relations linking two concepts ("how is
+        X related to Y"), following relations and subclass links either way.
+
+        Returns:
+            list: (subject label, relation name, object label) steps, as the
+            ontology states them, walking from `concept` to `other`; None if
+            they are not linked within `max_hops` relations
+        """
+        path = self.relations.path(self._terms(concept), self._terms(other), max_hops)
+        if path is None:
+            return None
+        return [(self._class_label(s), self.relation_name(p), self._class_label(o)) for s, p, o in path]
+    
+    @query
+    def get_references(self, concept, ref_type=None):
+        if self.use_sparql:
+            return self._sparql_get_references(concept, ref_type)
+        return self._references(self.index.substring(concept), ref_type)
+
+    @query
+    def get_subclasses(self, concept):
+        """
+        Find all direct and indirect subclasses of a given concept.
+        
+        Args:
+            concept (str): The class IRI or label to find subclasses for
+        
+        Returns:
+            list: A list of (subclass IRI, label) tuples
+        """
+        if self.use_sparql:
+            return self._sparql_get_subclasses(concept)
+        return self._aspect('subclasses', concept, *self._resolve(concept))
+
+    @query
+    def get_superclasses(self, concept):
+        """
+        Find all direct and indirect superclasses of a given concept.
+        
+        Args:
+            concept (str): The class IRI or label to find superclasses for
+        
+        Returns:
+            list: A list of (superclass IRI, label) tuples
+        """
+        if self.use_sparql:
+            return self._sparql_get_superclasses(concept)
+        return self._aspect('superclasses', concept, *self._resolve(concept))
+
+    @query
+    def is_subclass_of(self, concept, parent):
+        """Whether any class named by `concept` is a subclass of one named by `parent`"""
+        parents = self._resolve_classes(parent)
+        return any(self.hierarchy.is_a(sub, sup)
+                   for sub in self._resolve_classes(concept) for sup in parents)
+
+    @query
+    def get_specificity(self, concept):
+        """
+        How specific the class labelled exactly as the concept is.
+
+        Returns:
+            tuple: (number of superclasses, -number of subclasses), larger
+            is more specific; (0, 0) if the label names no class
+        """
+        classes = self._classes(concept, self.index.exact(concept), [])
+        return max(((self.hierarchy.depth(iri), -self.hierarchy.breadth(iri)) for iri in classes),
+                   default=(0, 0))
+
+    @query
+    def get_acronyms(self, concept):
+        if self.use_sparql:
+            return self._sparql_get_acronyms(concept)
+        return self._annotations(concept, ACRONYM)
+    
+    @query
+    def get_alternative_names(self, concept):
+        if self.use_sparql:
+            return self._sparql_get_alternative_names(concept)
+        return self._annotations(concept, ALTERNATIVE_NAME)
+    
+    @query
+    def get_comments(self, concept):
+        if self.use_sparql:
+            return self._sparql_get_comments(concept)
+        return self._annotations(concept, RDFS.comment)
+    
+    @query
+    def get_proper_label(self, concept):
+        if self.use_sparql:
+            return self._sparql_get_proper_label(concept)
+        return self._annotations(concept, PROPER_LABEL)
+
+    # SPARQL implementations, used when use_sparql=True
+
+    def _sparql_get_concept_definition(self, concept):
         # First try exact match
         query = """
         SELECT ?definition
@@ -37,7 +433,7 @@ class OntologyParser:
         
         return definitions
 
-    def get_all_concepts(self):
+    def _sparql_get_all_concepts(self):
         """Get all concept labels from the ontology"""
         query = """
         SELECT DISTINCT ?label
@@ -47,13 +443,15 @@ class OntologyParser:
         """
         results = self.g.query(query)
         return [str(row[0]).lower() for row in results]
-    
-    def get_related_concepts(self, concept):
+
+    def _sparql_get_related_concepts(self, concept):
         query = """
         SELECT ?related ?label ?relationType
         WHERE {
             ?s rdfs:label ?mainLabel .
-            ?s ?relationType ?related .
+            { ?s ?relationType ?related . }
+            UNION
+            { ?s rdfs:subClassOf [ owl:onProperty ?relationType ; owl:someValuesFrom ?related ] . }
             ?related rdfs:label ?label .
             FILTER(CONTAINS(LCASE(str(?mainLabel)), LCASE(?concept)))
             FILTER(?relationType IN (
@@ -65,8 +463,8 @@ class OntologyParser:
         """
         results = self.g.query(query, initBindings={'concept': Literal(concept)})
         return [(str(row[0]), str(row[1]), str(row[2])) for row in results]
-    
-    def get_references(self, concept, ref_type=None):
+
+    def _sparql_get_references(self, concept, ref_type=None):
         query = """
         SELECT ?ref ?refType
         WHERE {
@@ -86,52 +484,8 @@ class OntologyParser:
                                 f"FILTER(?refType = <http://www.semanticweb.org/quantumblockchains/crypto#{ref_type}> || ?refType IN (")
         results = self.g.query(query, initBindings={'concept': Literal(concept)})
         return [(str(row[0]), str(row[1]).split('#')[-1]) for row in results]
-    
-    def get_subclasses(self, concept):
-        """
-        Find all direct and indirect subclasses of a given concept.
-        
-        Args:
-            concept (str): The concept to find subclasses for
-        
-        Returns:
-            list: A list of subclass names
-        """
-        query = f"""
-        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-        
-        SELECT ?subclass WHERE {{
-            ?subclass rdfs:subClassOf* <{concept}> .
-            FILTER (?subclass != <{concept}>)
-        }}
-        """
-        results = self.g.query(query)
-        return [str(row[0]).split('/')[-1] for row in results]
 
-    def get_superclasses(self, concept):
-        """
-        Find all direct and indirect superclasses of a given concept.
-        
-        Args:
-            concept (str): The concept to find superclasses for
-        
-        Returns:
-            list: A list of superclass names
-        """
-        query = f"""
-        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-        
-        SELECT ?superclass WHERE {{
-            <{concept}> rdfs:subClassOf* ?superclass .
-            FILTER (?superclass != <{concept}>)
-        }}
-        """
-        results = self.g.query(query)
-        return [str(row[0]).split('/')[-1] for row in results]
-    
-    def get_acronyms(self, concept):
+    def _sparql_get_acronyms(self, concept):
         query = """
         SELECT ?acronym
         WHERE {
@@ -142,8 +496,8 @@ class OntologyParser:
         """
         results = self.g.query(query, initBindings={'concept': Literal(concept)})
         return [str(row[0]) for row in results]
-    
-    def get_alternative_names(self, concept):
+
+    def _sparql_get_alternative_names(self, concept):
         query = """
         SELECT ?altName
         WHERE {
@@ -154,8 +508,8 @@ class OntologyParser:
         """
         results = self.g.query(query, initBindings={'concept': Literal(concept)})
         return [str(row[0]) for row in results]
-    
-    def get_comments(self, concept):
+
+    def _sparql_get_comments(self, concept):
         query = """
         SELECT ?comment
         WHERE {
@@ -166,8 +520,8 @@ class OntologyParser:
         """
         results = self.g.query(query, initBindings={'concept': Literal(concept)})
         return [str(row[0]) for row in results]
-    
-    def get_proper_label(self, concept):
+
+    def _sparql_get_proper_label(self, concept):
         query = """
         SELECT ?properLabel
         WHERE {
@@ -177,4 +531,32 @@ class OntologyParser:
         }
         """
         results = self.g.query(query, initBindings={'concept': Literal(concept)})
-        return [str(row[0]) for row in results]
\ No newline at end of file
+        return [str(row[0]) for row in results]
+
+    def _sparql_get_subclasses(self, concept):
+        query = """
+        SELECT DISTINCT ?subclass
+        WHERE {
+            ?subclass rdfs:subClassOf* ?concept .
+            FILTER (?subclass != ?concept && isIRI(?subclass))
+        }
+        """
+        subclasses = []
+        for iri in self._resolve_classes(concept):
+            results = self.g.query(query, initBindings={'concept': URIRef(iri)})
+            subclasses.extend(str(row[0]) for row in results)
+        return [(iri, self._class_label(iri)) for iri in dict.fromkeys(subclasses)]
+
+    def _sparql_get_superclasses(self, concept):
+        query = """
+        SELECT DISTINCT ?superclass
+        WHERE {
+            ?concept rdfs:subClassOf* ?superclass .
+            FILTER (?superclass != ?concept && isIRI(?superclass))
+        }
+        """
+        superclasses = []
+        for iri in self._resolve_classes(concept):
+            results = self.g.query(query, initBindings={'concept': URIRef(iri)})
+            superclasses.extend(str(row[0]) for row in results)
+        return [(iri, self._class_label(iri)) for iri in dict.fromkeys(superclasses)]
@@ -0,0 +1,253 @@
+import gc
+import logging
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+from ontology_parser import OntologyParser
+from question_processor import QuestionProcessor
+from answer_generator import AnswerGenerator
+from ontology_snapshot import file_digest
+from metrics import REGISTRY
+
+CATALOG_NAMESPACE = '{urn:oasis:names:tc:entity:xmlns:xml:catalog}'
+XML_BASE = '{http://www.w3.org/XML/1998/namespace}base'
+
+log = logging.getLogger('cryptology.ontology')
+
+RELOADS = REGISTRY.counter(
+    'cryptology_ontology_reloads_total', 'Ontology versions built after a file changed', ['ontology', 'result'])
+
+
+def read_catalog(path):
+    """
+    Read the ontology IRI -> file mappings of an OASIS XML catalog, such as
+    the catalog-v001.xml written by Protege.
+
+    Returns:
+        dict: ontology IRI -> path of its file, resolved against the catalog
+        directory and any xml:base
+    """
+    root = ET.parse(path).getroot()
+    sources = {}
+
+    def walk(element, base):
+        base = os.path.join(base, element.get(XML_BASE) or '')
+        for child in element:
+            if child.tag == CATALOG_NAMESPACE + 'uri' and child.get('name') and child.get('uri'):
+                sources[child.get('name')] = os.path.normpath(os.path.join(base, child.get('uri')))
+            elif child.tag == CATALOG_NAMESPACE + 'group':
+                walk(child, base)
+
+    walk(root, os.path.dirname(os.path.abspath(path)))
+    return sources
+
+
+def file_signature(path):
+    """Cheap change detection: (modification time, size), or None if missing"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class OntologyVersion:
+    """One loaded ontology file with the pipeline built on it.
+
+    Versions are never modified: a reload builds a new one and swaps it in,
+    so a request holding a version keeps a consistent parser, processor and
+    generator to the end.
+    """
+
+    def __init__(self, name, rdf_file, parser, processor, generator, signature=None):
+        self.name = name
+        self.rdf_file = rdf_file
+        self.parser = parser
+        self.processor = processor
+        self.generator = generator
+        self.signature = signature
+        self.digest = parser.digest
+        self.loaded_at = time.time()
+
+    @classmethod
+    def build(cls, name, rdf_file, preload_nlp=False, backend='rdflib', previous=None):
+        """
+        Load an ontology file and render the answer blocks of its concepts.
+
+        Args:
+            previous (OntologyVersion): version being replaced; the blocks of
+                concepts whose data did not change are taken from it
+        """
+        signature = file_signature(rdf_file)
+        parser = OntologyParser(rdf_file, backend=backend)
+        generator = AnswerGenerator(parser)
+        generator.precompute(previous.generator.fragments if previous is not None else None)
+        return cls(name, rdf_file, parser, QuestionProcessor(parser, preload_nlp=preload_nlp),
+                   generator, signature)
+
+    def describe(self):
+        fragments = self.generator.fragments
+        return {
+            'name': self.name,
+            'rdf_file': self.rdf_file,
+            'digest': self.digest,
+            'backend': self.parser.backend,
+            'loaded_at': self.loaded_at,
+            'load_stats': self.parser.load_stats,
+            'fragments': None if fragments is None else {
+                'concepts': len(fragments),
+                'rendered': fragments.rendered,
+            },
+        }
+
+
+class OntologyRegistry:
+    """
+    Named ontologies, loaded on first use and reloaded when their file changes.
+
+    A watcher thread polls the files of the loaded ontologies (and the
+    catalog they came from). When one changes, the new version is built in
+    that thread while requests keep using the current one, then swapped in
+    with a single assignment. The registry drops its reference to the old
+    version at the swap, so its graph and indexes are freed as soon as the
+    last request using it finishes.
+    """
+
+    def __init__(self, sources, default=None, catalog=None, poll_interval=2.0, preload_nlp=False,
+                 backend='rdflib'):
+        """
+        Args:
+            sources (dict): ontology name -> RDF file
+            default (str): name served when none is given; the first source
+                by default
+            catalog (str): catalog file the sources were read from, re-read
+                when it changes
+            poll_interval (float): seconds between checks for changed files
+            preload_nlp (bool): load spaCy with the first ontology instead
+                of on the first question that needs it
+            backend (str): OntologyParser backend, 'rdflib' or 'compact'
+        """
+        if not sources:
+            raise ValueError('No ontologies to serve')
+        self.sources = dict(sources)
+        self.default = default or next(iter(self.sources))
+        if self.default not in self.sources:
+            raise KeyError(f'Unknown ontology: {self.default}')
+        self.catalog = catalog
+        self.poll_interval = poll_interval
+        self.preload_nlp = preload_nlp
+        self.backend = backend
+        self._versions = {}                     # name -> OntologyVersion
+        self._failed = {}                       # name -> signature that failed to load
+        self._catalog_signature = file_signature(catalog) if catalog else None
+        self._lock = threading.Lock()           # serializes loads, not reads
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_catalog(cls, path, default=None, **kwargs):
+        return cls(read_catalog(path), default=default, catalog=path, **kwargs)
+
+    def names(self):
+        return list(self.sources)
+
+    def get(self, name=None):
+        """The current version of an ontology, loading it on first use"""
+        name = name or self.default
+        version = self._versions.get(name)
+        if version is None:
+            if name not in self.sources:
+                raise KeyError(f'Unknown ontology: {name}')
+            with self._lock:
+                version = self._versions.get(name)
+                if version is None:
+                    version = OntologyVersion.build(name, self.sources[name], self.preload_nlp, self.backend)
+                    self._versions[name] = version
+        return version
+
+    def loaded(self):
+        return list(self._versions.values())
+
+    def swap(self, name, version):
+        """Make a version current; requests already holding the old one keep it"""
+        with self._lock:
+            old = self._versions.get(name)
+            self._versions[name] = version
+        return old
+
+    def reload(self, name, force=False):
+        """
+        Rebuild an ontology if its file changed since it was loaded.
+
+        Returns:
+            bool: whether a new version was swapped in
+        """
+        current = self._versions.get(name)
+        rdf_file = self.sources[name]
+        signature = file_signature(rdf_file)
+        if signature is None or signature == self._failed.get(name):
+            return False
+        if not force and current is not None and current.rdf_file == rdf_file:
+            if signature == current.signature:
+                return False
+            # Touched or rewritten with the same content
+            if file_digest(rdf_file) == current.digest:
+                current.signature = signature
+                return False
+        try:
+            start = time.perf_counter()
+            version = OntologyVersion.build(name, rdf_file, self.preload_nlp, self.backend, previous=current)
+        except Exception:
+            self._failed[name] = signature
+            RELOADS.inc(name, 'error')
+            log.exception('Could not load %s from %s; still serving the previous version', name, rdf_file)
+            return False
+        self._failed.pop(name, None)
+        old = self.swap(name, version)
+        RELOADS.inc(name, 'ok')
+        fragments = version.generator.fragments
+        log.warning('Reloaded %s from %s in %.2f s (digest %s, answers re-rendered for %d of %d concepts)',
+                    name, rdf_file, time.perf_counter() - start, version.digest[:12],
+                    fragments.rendered, len(fragments))
+        del old
+        # rdflib graphs hold reference cycles; free the old one now rather
+        # than at the next full collection
+        gc.collect()
+        return True
+
+    def check(self):
+        """Re-read the catalog if it changed, then reload changed ontologies"""
+        if self.catalog:
+            signature = file_signature(self.catalog)
+            if signature is not None and signature != self._catalog_signature:
+                try:
+                    self.sources.update(read_catalog(self.catalog))
+                except (OSError, ET.ParseError):
+                    log.exception('Could not read the catalog %s', self.catalog)
+                else:
+                    self._catalog_signature = signature
+        for name in list(self._versions):
+            self.reload(name)
+
+    def start(self):
+        """Watch the loaded ontologies in a daemon thread"""
+        if self._thread is not None or not self.poll_interval:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='ontology-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception:
+                log.exception('Ontology watcher failed; retrying')
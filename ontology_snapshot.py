@@ -0,0 +1,66 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+# Bump when the pickled layout of the graph or any index changes
+SNAPSHOT_VERSION = 6
+
+
+def file_digest(path):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_path(rdf_file, backend='rdflib'):
+    """Snapshot file kept next to the RDF file it was built from, one per backend"""
+    if backend == 'rdflib':
+        return rdf_file + '.snapshot'
+    return f'{rdf_file}.{backend}.snapshot'
+
+
+def load_snapshot(path, digest):
+    """Load a snapshot if it exists and was built from content with this digest.
+
+    Returns:
+        dict: the snapshot payload, or None if it is missing, stale or unreadable
+    """
+    try:
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(payload, dict):
+        return None
+    if payload.get('version') != SNAPSHOT_VERSION or payload.get('digest') != digest:
+        return None
+    return payload
+
+
+def write_snapshot(path, digest, **payload):
+    """Atomically write a snapshot; failures (e.g. read-only disk) are ignored.
+
+    Returns:
+        bool: whether the snapshot was written
+    """
+    payload.update(version=SNAPSHOT_VERSION, digest=digest)
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+        try:
+            os.chmod(tmp_path, 0o644)
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # Workers starting concurrently either see the old file or the
+            # complete new one, never a partial write
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        return False
+    return True
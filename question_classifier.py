@@ -0,0 +1,122 @@
+import re
+
+# Question type -> trigger phrases, matched on word boundaries
+QUESTION_PHRASES = {
+    'definition': [
+        'what is', 'what are', 'define', 'definition', 'definitions', 'meaning', 'meaning of',
+        'mean', 'means', 'explain', 'could you explain', 'tell me about', 'describe',
+        'help me understand', 'want to know about', "what's", 'whats', 'can you tell me about',
+        'give me information about',
+    ],
+    'category': [
+        'which category', 'what type', 'what category', 'what class', 'which class',
+        'which type', 'what kind', 'which kind',
+    ],
+    'references': [
+        'reference', 'references', 'where can i find', 'resources', 'more information',
+        'where to read', 'additional resources', 'documentation', 'further reading', 'source',
+        'sources', 'learn more about', 'materials', 'bibliography',
+    ],
+    'acronym': [
+        'acronym', 'acronyms', 'abbreviation', 'abbreviations', 'what is the acronym',
+        'short form', 'initialism', 'stand for', 'stands for', 'abbreviated as', 'shortened form',
+    ],
+    'alternative_names': [
+        'other names', 'alternative names', 'also known as', 'also called', 'synonym',
+        'synonyms', 'other terms for', 'different names', 'called otherwise',
+    ],
+    'subclass': [
+        'what are the types of', 'what are the kinds of', 'what subclasses', 'subclasses',
+        'subcategories', 'what variants', 'what forms', 'examples of', 'instances of',
+        'specific types',
+    ],
+    'superclass': [
+        'what is the parent', 'superclass', 'superclasses', 'category of', 'type of',
+        'belongs to which', 'part of which', 'classified as', 'grouped under',
+    ],
+    'related': [
+        'what is related to', 'related to', 'connection between', 'relationship',
+        'how is it related', 'associated with', 'linked to', 'connected to', 'similar to',
+    ],
+    'comments': [
+        'what additional information', 'tell me more', 'additional details', 'more about',
+        'elaborate on', 'expand on', 'give details', 'in detail',
+    ],
+}
+
+# Reference type -> trigger phrases, in priority order: when several reference
+# types are mentioned the first one listed here wins
+REF_TYPE_PHRASES = {
+    'pdf': ['pdf', 'pdfs', 'document', 'documents', 'qb pdf', 'qb_pdf_link'],
+    'doi': ['doi', 'dois'],
+    'url': ['url', 'urls', 'link', 'links', 'website', 'websites'],
+    'wiki': ['wiki', 'wikipedia'],
+    'paper': ['paper', 'papers', 'article', 'articles', 'publication', 'publications'],
+}
+
+
+def _trie_pattern(node):
+    """Regex for a character trie, longer continuations tried before a phrase end"""
+    alternatives = [re.escape(char) + _trie_pattern(child)
+                    for char, child in sorted(node.items()) if char]
+    if '' in node:
+        # Empty named group marking which phrase ended here
+        alternatives.append(f'(?P<{node[""]}>)')
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return '(?:' + '|'.join(alternatives) + ')'
+
+
+class QuestionClassifier:
+    """Single-pass classifier for the kinds of information a question asks for.
+
+    All trigger phrases are compiled into one regex shaped like a prefix trie,
+    with an empty named group marking the end of each phrase. Longer phrases
+    win at the same position ("what is the acronym" over "what is"), and one
+    scan of the text yields every question type and the reference type.
+    """
+
+    def __init__(self, question_phrases=QUESTION_PHRASES, ref_type_phrases=REF_TYPE_PHRASES):
+        self.ref_type_priority = list(ref_type_phrases)
+        self._groups = {}  # group name -> (question type, ref type)
+        phrases = {}
+        for q_type, words in question_phrases.items():
+            for phrase in words:
+                phrases.setdefault(phrase, (q_type, None))
+        for ref_type, words in ref_type_phrases.items():
+            for phrase in words:
+                phrases.setdefault(phrase, ('references', ref_type))
+
+        trie = {}
+        for i, (phrase, kinds) in enumerate(phrases.items()):
+            name = f'p{i}'
+            self._groups[name] = kinds
+            node = trie
+            for char in phrase:
+                node = node.setdefault(char, {})
+            node[''] = name
+        self.pattern = re.compile(r'(?<!\w)' + _trie_pattern(trie) + r'(?!\w)')
+
+    def classify(self, text):
+        """
+        Find every question type and the reference type asked for in a question.
+
+        Args:
+            text (str): The question
+
+        Returns:
+            tuple: (list of question types in order of appearance, ref_type or None).
+            Questions that match nothing are treated as definition questions.
+        """
+        question_types = []
+        ref_types = set()
+        for match in self.pattern.finditer(text.lower()):
+            q_type, ref_type = self._groups[match.lastgroup]
+            if q_type not in question_types:
+                question_types.append(q_type)
+            if ref_type:
+                ref_types.add(ref_type)
+        ref_type = next((r for r in self.ref_type_priority if r in ref_types), None)
+        if not question_types:
+            question_types.append('definition')
+        return question_types, ref_type
@@ -1,123 +1,177 @@
 import spacy
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-import re
+import threading
+import time
+from concept_matcher import ConceptMatcher
+from concept_ranker import ConceptRanker
+from question_classifier import QuestionClassifier
+from metrics import stage
+from fuzzy_index import WORD_PATTERN
+from concept_index import normalize
+from nlp_batcher import NlpBatcher
+
+SPACY_MODEL = 'en_core_web_sm'
+
+# Concepts answered per question, however many labels nest inside it
+MAX_CONCEPTS = 3
+
+# Full-text search answers a question naming no concept only with hits
+# scoring at least this share of the best score its words could reach...
+MIN_SEARCH_COVERAGE = 0.3
+# ...and, after the best hit, only those scoring close to it
+SEARCH_SCORE_RATIO = 0.75
+
+# Words that refer back to the concepts of the previous question
+PRONOUNS = {'it', 'its', 'itself', 'they', 'them', 'their', 'theirs', 'this', 'that', 'these', 'those', 'same'}
+# Words a follow-up may contain besides pronouns and question phrases
+FOLLOW_UP_FILLERS = {
+    'and', 'or', 'also', 'then', 'so', 'what', 'which', 'how', 'where', 'about', 'is', 'are', 'was', 'were',
+    's', 'the', 'a', 'an', 'of', 'for', 'on', 'any', 'some', 'all', 'do', 'does', 'has', 'have', 'there',
+    'can', 'could', 'you', 'i', 'me', 'tell', 'give', 'show', 'list', 'more', 'please', 'else', 'one', 'ones',
+}
+
+# Pipelines loaded so far, by excluded components, each behind its batcher:
+# every processor in the process shares one, so reloading the ontology does
+# not reload spaCy or lose parsed questions, and concurrent requests are
+# parsed together
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+# Excluded components -> seconds their pipeline took to load
+pipeline_load_seconds = {}
+
+def load_pipeline(exclude):
+    key = tuple(exclude)
+    with _pipelines_lock:
+        if key not in _pipelines:
+            start = time.perf_counter()
+            _pipelines[key] = NlpBatcher(spacy.load(SPACY_MODEL, exclude=list(exclude)))
+            pipeline_load_seconds[key] = time.perf_counter() - start
+        return _pipelines[key]
 
 class QuestionProcessor:
-    def __init__(self, ontology_parser):
-        nltk.download('punkt')
-        nltk.download('stopwords')
-        nltk.download('averaged_perceptron_tagger')
-        self.nlp = spacy.load('en_core_web_sm')
+    def __init__(self, ontology_parser, enable_ner=True, preload_nlp=False, max_concepts=MAX_CONCEPTS):
+        # Startup phase -> seconds, including the spaCy load once it happens
+        self.timings = {}
+        self.enable_ner = enable_ner
+        self.max_concepts = max_concepts
+        self._batcher = None
+        # noun_chunks and pos_ need tagger, parser and attribute_ruler, and
+        # NER finds the entities of questions naming no known concept; the
+        # lemmatizer is never used. Without NER, doc.ents is always empty
+        self.nlp_exclude = ['lemmatizer'] if enable_ner else ['lemmatizer', 'ner']
         self.ontology_parser = ontology_parser
-        self.all_concepts = set(ontology_parser.get_all_concepts())
-        
-        # Define question patterns
-        self.question_patterns = {
-            'definition': r'what is|what are|define|meaning of|definition of|explain|tell me about|describe|what does .* mean|could you explain|help me understand|i want to know about|what\'s|whats|can you tell me about|give me information about',
-            'category': r'which category|what type|what category|what class|which class|which type|what kind|which kind',
-            'references': r'where can i find|references|links|resources|more information|where to read|additional resources|documentation|further reading|source|sources|learn more about|materials|bibliography',
-            'acronym': r'what is the acronym|abbreviation|short form|initialism|stands for|abbreviated as|shortened form',
-            'alternative_names': r'other names|alternative names|also known as|also called|synonyms|other terms for|different names|called otherwise',
-            'subclass': r'what are the types of|what are the kinds of|what subclasses|subcategories|what variants|what forms|examples of|instances of|specific types',
-            'superclass': r'what is the parent|superclass|category of|type of|belongs to which|part of which|classified as|grouped under',
-            'related': r'what is related to|connection between|relationship|how is it related|associated with|linked to|connected to|similar to',
-            'comments': r'what additional information|tell me more|additional details|more about|elaborate on|expand on|give details|in detail'
-        }
-        
-    def process_question(self, question):
-        """Process the question and extract relevant information"""
-        # Extract key concepts
-        concepts = self.extract_concepts(question.lower())
         
-        # Get all requested information types
-        question_types = set()
+        start = time.perf_counter()
+        self.matcher = ConceptMatcher(ontology_parser.get_concept_names())
+        self.timings['concept_matcher'] = time.perf_counter() - start
+        self.ranker = ConceptRanker(ontology_parser)
+        self.classifier = QuestionClassifier()
+        
+        if preload_nlp:
+            self.nlp  # trigger the lazy load now
+        
+    @property
+    def batcher(self):
+        """Batcher of the spaCy pipeline, loaded on first use with only the components we read"""
+        if self._batcher is None:
+            self._batcher = load_pipeline(self.nlp_exclude)
+            # The pipeline may have been loaded for another processor
+            self.timings['spacy_load'] = pipeline_load_seconds[tuple(self.nlp_exclude)]
+        return self._batcher
+
+    @property
+    def nlp_loaded(self):
+        """Whether the spaCy pipeline is loaded in this process, by this processor or another"""
+        return self._batcher is not None or tuple(self.nlp_exclude) in _pipelines
+
+    @property
+    def nlp(self):
+        """spaCy pipeline"""
+        return self.batcher.nlp
+
+    def parse(self, text):
+        """
+        spaCy Doc of a question. Questions from concurrent requests are
+        parsed together with nlp.pipe, and a question parsed before is not
+        parsed again. The Doc is shared: read it, don't modify it.
+        """
+        return self.batcher.parse(text)
+        
+    def process_question(self, question, context=None):
+        """
+        Process the question and extract relevant information.
+
+        Args:
+            question (str): The user's message
+            context (ConceptContext): The concepts the conversation last asked
+                about; a follow-up such as "and its acronym?" is about them
+        """
         question_lower = question.lower()
-        ref_type = None
         
-        # Check for definition requests
-        if any(pattern in question_lower for pattern in [
-            'what is', 'what are', 'define', 'definition', 'meaning', 'explain', 
-            'tell me about', 'describe', 'mean', 'could you explain', 
-            'help me understand', 'want to know about', "what's", 'whats',
-            'can you tell me about', 'give me information about'
-        ]):
-            question_types.add('definition')
-            
-        # Check for acronym requests
-        if any(word in question_lower for word in ['acronym', 'abbreviation']):
-            question_types.add('acronym')
-            
-        # Check for link/reference requests with specific types
-        ref_type_keywords = {
-            'pdf': ['pdf', 'document', 'qb pdf', 'qb_pdf_link'],
-            'doi': ['doi'],
-            'url': ['url', 'link', 'website'],
-            'wiki': ['wiki', 'wikipedia', 'link', 'links'],
-            'paper': ['paper', 'article', 'publication']
-        }
+        # Get all requested information types in one scan of the text
+        with stage('classify'):
+            question_types, ref_type = self.classifier.classify(question_lower)
         
-        # First check for specific reference types
-        for type_key, keywords in ref_type_keywords.items():
-            if any(keyword in question_lower for keyword in keywords):
-                question_types.add('references')
-                ref_type = type_key
-                break
-        
-        # Then check for general references if no specific type found
-        if not ref_type and any(word in question_lower for word in ['reference', 'where can i find']):
-            question_types.add('references')
-            
-        # Check for alternative names
-        if any(phrase in question_lower for phrase in ['also known as', 'alternative names', 'other names']):
-            question_types.add('alternative_names')
-            
-        # If no specific types found, default to definition
-        if not question_types:
-            question_types.add('definition')
-        
-        return {
-            'concepts': concepts,
-            'question_types': list(question_types),
+        if context is not None and self.is_follow_up(question_lower):
+            # Only says what to tell about the previous concepts: no need
+            # to look for concepts in it
+            processed = {'concepts': list(context.concepts), 'follow_up': True, 'records': context.records}
+        else:
+            # Extract key concepts; "how is X related to Y" is answered
+            # from X to Y
+            with stage('extract_concepts'):
+                processed = {'concepts': self.extract_concepts(
+                    question_lower, in_mention_order='related' in question_types)}
+        
+        processed.update({
+            'question_types': question_types,
             'text': question_lower,
             'ref_type': ref_type
-        }
-    
-    def _determine_question_type(self, question):
-        """Determine the type of question being asked"""
-        question = question.lower().strip()
-        
-        # Check each pattern in order of priority
-        for q_type, pattern in self.question_patterns.items():
-            if re.search(pattern, question, re.IGNORECASE):
-                return q_type
-                
-        # If no specific pattern is matched, check for common question words
-        if any(word in question for word in ['what is', 'define', 'meaning']):
-            return 'definition'
-            
-        # Default to definition if no other type is matched
-        return 'definition'
-        
-    def extract_concepts(self, text):
-        """Extract key concepts from text using NER and POS tagging"""
-        doc = self.nlp(text.lower())
+        })
+        return processed
+
+    def is_follow_up(self, question):
+        """
+        Whether a question only refers back to the previous one: nothing in
+        it but question phrases ("references", "acronym"), pronouns and
+        filler words, and at least a pronoun or a question phrase.
+        """
+        text = question.lower()
+        phrases = bool(self.classifier.pattern.search(text))
+        words = WORD_PATTERN.findall(self.without_question_phrases(text))
+        if not phrases and not any(word in PRONOUNS for word in words):
+            return False
+        return all(word in PRONOUNS or word in FOLLOW_UP_FILLERS for word in words)
+        
+    def extract_concepts(self, text, in_mention_order=False):
+        """
+        Extract key concepts from text using NER and POS tagging.
+
+        The most specific concepts are kept, most specific first, or in the
+        order the text mentions them if `in_mention_order` is set.
+        """
         concepts = []
         
-        # First try to find exact matches with ontology concepts
-        text_lower = text.lower()
-        matched_concepts = [concept for concept in self.all_concepts 
-                          if concept in text_lower]
-        
-        # Sort by length (descending) to prefer longer matches
-        matched_concepts.sort(key=len, reverse=True)
-        
+        # First try to find matches with ontology labels, acronyms and
+        # alternative names, keeping only the longest of overlapping matches
+        spans = self.matcher.spans(text)
+        if not spans:
+            # Then the same names spelled with a few typos ("eliptic curve")
+            with stage('fuzzy_match'):
+                spans = self.ontology_parser.fuzzy.spans(text)
+        matched_concepts = self.ranker.rank(text, spans)
+        if not matched_concepts:
+            # Then the concepts whose definitions and other names share the
+            # most words with the question
+            with stage('search'):
+                matched_concepts = self.search_concepts(text)
+
         if matched_concepts:
-            # If we found exact matches in ontology, use them
+            # If we found matches in ontology, use them
             concepts.extend(matched_concepts)
         else:
-            # If no exact matches, try NLP-based extraction
+            # If no ontology matches, try NLP-based extraction
+            with stage('spacy'):
+                doc = self.parse(text)
             # Get noun phrases (longest matches)
             noun_phrases = set([chunk.text for chunk in doc.noun_chunks])
             concepts.extend(noun_phrases)
@@ -142,13 +196,31 @@ class QuestionProcessor:
                 if len(cleaned) > 1:  # Keep only meaningful concepts
                     cleaned_concepts.append(cleaned)
         
-        # Remove duplicates while preserving order
+        # Remove duplicates while preserving order, and answer only the most
+        # specific concepts
         seen = set()
-        return [x for x in cleaned_concepts if not (x in seen or seen.add(x))]
-        
+        concepts = [x for x in cleaned_concepts if not (x in seen or seen.add(x))][:self.max_concepts]
+        if in_mention_order:
+            concepts = self.ranker.in_mention_order(concepts, spans)
+        return concepts
+        
+    def without_question_phrases(self, text):
+        """The text with what it asks for ("what is", "references") blanked out"""
+        return self.classifier.pattern.sub(' ', text.lower())
+
+    def search_concepts(self, text):
+        """
+        Concepts found by full-text search on what a question says about
+        them, best first; none unless the best hit is a good enough match.
+        """
+        hits = self.ontology_parser.search(self.without_question_phrases(text), limit=self.max_concepts)
+        if not hits or hits[0][3] < MIN_SEARCH_COVERAGE:
+            return []
+        return [normalize(label) for _, label, score, _ in hits if score >= SEARCH_SCORE_RATIO * hits[0][2]]
+
     def get_question_focus(self, question):
         """Extract the main focus/topic of the question"""
-        doc = self.nlp(question.lower())
+        doc = self.parse(question)
         
         # Try to find focus after question words or in the beginning
         focus_words = []
@@ -0,0 +1,180 @@
+from collections import deque
+from rdflib import BNode, URIRef
+from rdflib.namespace import OWL, RDFS
+
+
+class RelationGraph:
+    """Typed adjacency lists of the relations between named ontology terms.
+
+    Edges come from direct triples of the given predicates, from OWL
+    existential restrictions (X rdfs:subClassOf [owl:onProperty P;
+    owl:someValuesFrom Y] gives X -P-> Y, which is how the ontology states
+    most of its relations), and from rdfs:subClassOf between named classes.
+    Every node keeps its outgoing and incoming edges, so the relations of a
+    term are read in O(degree) and walks can follow edges either way.
+    """
+
+    def __init__(self, graph, predicates=()):
+        """
+        Args:
+            graph (rdflib.Graph): The parsed ontology
+            predicates (iterable): Predicates whose direct triples are relations
+        """
+        self.ids = {}           # IRI -> node id
+        self.iris = []          # node id -> IRI
+        self.predicates = []    # predicate id -> predicate IRI
+        self.out = []           # node id -> [(predicate id, target id), ...]
+        self.into = []          # node id -> [(predicate id, source id), ...]
+        self._predicate_ids = {}
+        seen = set()
+
+        def add(s, p, o):
+            edge = (self._node(str(s)), self._predicate(str(p)), self._node(str(o)))
+            if edge[0] != edge[2] and edge not in seen:
+                seen.add(edge)
+                self.out[edge[0]].append((edge[1], edge[2]))
+                self.into[edge[2]].append((edge[1], edge[0]))
+
+        for predicate in predicates:
+            for s, o in graph.subject_objects(predicate):
+                if isinstance(s, URIRef) and isinstance(o, URIRef):
+                    add(s, predicate, o)
+        for s, o in graph.subject_objects(RDFS.subClassOf):
+            if not isinstance(s, URIRef):
+                continue
+            if isinstance(o, URIRef):
+                add(s, RDFS.subClassOf, o)
+            elif isinstance(o, BNode):
+                prop, target = graph.value(o, OWL.onProperty), graph.value(o, OWL.someValuesFrom)
+                if isinstance(prop, URIRef) and isinstance(target, URIRef):
+                    add(s, prop, target)
+
+    def _node(self, iri):
+        node = self.ids.get(iri)
+        if node is None:
+            node = self.ids[iri] = len(self.iris)
+            self.iris.append(iri)
+            self.out.append([])
+            self.into.append([])
+        return node
+
+    def _predicate(self, iri):
+        predicate = self._predicate_ids.get(iri)
+        if predicate is None:
+            predicate = self._predicate_ids[iri] = len(self.predicates)
+            self.predicates.append(iri)
+        return predicate
+
+    def _allowed(self, predicates):
+        """Predicate ids to follow; None for all"""
+        if predicates is None:
+            return None
+        return {self._predicate_ids[str(p)] for p in predicates if str(p) in self._predicate_ids}
+
+    def __contains__(self, iri):
+        return iri in self.ids
+
+    def edge_count(self):
+        return sum(len(edges) for edges in self.out)
+
+    def objects(self, iri, predicates=None):
+        """Outgoing relations of a term, as (predicate IRI, target IRI)"""
+        node = self.ids.get(iri)
+        if node is None:
+            return []
+        allowed = self._allowed(predicates)
+        return [(self.predicates[p], self.iris[target]) for p, target in self.out[node]
+                if allowed is None or p in allowed]
+
+    def _steps(self, node, allowed):
+        """Neighbours of a node either way: (neighbour, predicate id, whether the edge points to it)"""
+        for p, target in self.out[node]:
+            if allowed is None or p in allowed:
+                yield target, p, True
+        for p, source in self.into[node]:
+            if allowed is None or p in allowed:
+                yield source, p, False
+
+    def neighborhood(self, iris, hops=2, limit=100, predicates=None):
+        """
+        Terms within `hops` relations of any of the given terms, following
+        edges either way, breadth first.
+
+        Returns:
+            list: (IRI, distance) of at most `limit` terms, nearest first;
+            the given terms themselves are left out
+        """
+        allowed = self._allowed(predicates)
+        distance = {self.ids[iri]: 0 for iri in iris if iri in self.ids}
+        queue = deque(distance)
+        found = []
+        while queue and len(found) < limit:
+            node = queue.popleft()
+            if distance[node] >= hops:
+                continue
+            for neighbour, _, _ in self._steps(node, allowed):
+                if neighbour in distance:
+                    continue
+                distance[neighbour] = distance[node] + 1
+                found.append((self.iris[neighbour], distance[neighbour]))
+                if len(found) >= limit:
+                    break
+                queue.append(neighbour)
+        return found
+
+    def path(self, sources, targets, max_hops=6, max_visited=100000, predicates=None):
+        """
+        Shortest chain of relations from any source term to any target term,
+        following edges either way. Searches from both ends at once, always
+        widening the smaller frontier, and gives up after `max_visited` terms.
+
+        Returns:
+            list: (subject IRI, predicate IRI, object IRI) edges as stated in
+            the ontology, in walking order from a source; [] if a source is a
+            target; None if no chain of at most `max_hops` edges was found
+        """
+        allowed = self._allowed(predicates)
+        sources = [self.ids[iri] for iri in sources if iri in self.ids]
+        targets = [self.ids[iri] for iri in targets if iri in self.ids]
+        if not sources or not targets:
+            return None
+        if set(sources) & set(targets):
+            return []
+        # node -> (previous node, predicate id, whether the edge points from previous to node)
+        parents = ({node: None for node in sources}, {node: None for node in targets})
+        frontiers = (list(sources), list(targets))
+        depth = 0
+        while frontiers[0] and frontiers[1] and depth < max_hops:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            seen, other = parents[side], parents[1 - side]
+            next_frontier = []
+            for node in frontiers[side]:
+                for neighbour, p, forward in self._steps(node, allowed):
+                    if neighbour in seen:
+                        continue
+                    seen[neighbour] = (node, p, forward)
+                    if neighbour in other:
+                        return self._join(parents, neighbour)
+                    next_frontier.append(neighbour)
+            if len(parents[0]) + len(parents[1]) > max_visited:
+                return None
+            frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+            depth += 1
+        return None
+
+    def _join(self, parents, meeting):
+        """Edges from a source to the meeting node, then on to a target"""
+        edges = []
+        node = meeting
+        while parents[0][node] is not None:
+            previous, p, forward = parents[0][node]
+            edges.append((previous, p, node) if forward else (node, p, previous))
+            node = previous
+        edges.reverse()
+        node = meeting
+        while parents[1][node] is not None:
+            following, p, forward = parents[1][node]
+            # Found walking from the target side: forward means following -> node
+            edges.append((following, p, node) if forward else (node, p, following))
+            node = following
+        return [(self.iris[s], self.predicates[p], self.iris[o]) for s, p, o in edges]
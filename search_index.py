@@ -0,0 +1,119 @@
+import heapq
+import math
+from array import array
+
+from fuzzy_index import WORD_PATTERN
+
+# Words too common to tell concepts apart
+STOP_WORDS = frozenset('''
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each else few for from further
+had has have having he her here hers him his how i if in into is it its itself just me more most
+my no nor not now of off on once only or other our out over own same she should so some such than
+that the their them then there these they this those through to too under until up very was we
+were what when where which while who whom why will with would you your
+tell know explain describe define give show find called
+'''.split())
+
+
+def stem(word):
+    """Strip plural endings, so "blocks" finds "block" ("ies" -> "y", "es" -> "e", "s" -> "")"""
+    if len(word) <= 3 or word.endswith(('ss', 'us', 'is')):
+        return word
+    if word.endswith('ies') and not word.endswith(('eies', 'aies')):
+        return word[:-3] + 'y'
+    if word.endswith('es') and not word.endswith(('aes', 'ees', 'oes')):
+        return word[:-1]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def terms(text):
+    """Search terms of a text: lowercase words, stop words dropped, plurals stemmed"""
+    return [stem(word) for word in WORD_PATTERN.findall(str(text).lower()) if word not in STOP_WORDS]
+
+
+class SearchIndex:
+    """BM25 inverted index over the text written about each concept.
+
+    A concept's document is its labels, acronyms, alternative names,
+    definitions and comments. Each term's postings hold the BM25 weight of
+    the term in every document containing it (everything but the term's
+    idf), highest first. A query adds up the weights of its terms, reading
+    at most `max_postings` of each list: results are exact while no query
+    term is in more documents than that, and the cost of a query stops
+    growing with the ontology beyond it.
+    """
+
+    def __init__(self, documents, k1=1.2, b=0.75, max_postings=1000):
+        """
+        Args:
+            documents (iterable): (subject IRI, [text, ...]) pairs
+            k1 (float): Term frequency saturation
+            b (float): Document length normalization
+            max_postings (int): Most postings read per query term
+        """
+        self.k1 = k1
+        self.b = b
+        self.max_postings = max_postings
+        self.subjects = []      # document id -> subject IRI
+        counts = []             # document id -> {term: frequency}
+        lengths = array('i')
+        for subject, texts in documents:
+            words = [term for text in texts for term in terms(text)]
+            if not words:
+                continue
+            frequencies = {}
+            for term in words:
+                frequencies[term] = frequencies.get(term, 0) + 1
+            self.subjects.append(subject)
+            counts.append(frequencies)
+            lengths.append(len(words))
+        average = sum(lengths) / len(lengths) if lengths else 1.0
+
+        postings = {}           # term -> [(weight, document id), ...]
+        for doc, frequencies in enumerate(counts):
+            norm = k1 * (1 - b + b * lengths[doc] / average)
+            for term, frequency in frequencies.items():
+                postings.setdefault(term, []).append((frequency * (k1 + 1) / (frequency + norm), doc))
+        self.postings = {}      # term -> (array of document ids, array of weights), highest weight first
+        for term, entries in postings.items():
+            entries.sort(key=lambda entry: (-entry[0], entry[1]))
+            self.postings[term] = (array('i', (doc for _, doc in entries)),
+                                   array('f', (weight for weight, _ in entries)))
+
+    def __len__(self):
+        return len(self.subjects)
+
+    def idf(self, term):
+        postings = self.postings.get(term)
+        if postings is None:
+            return 0.0
+        df = len(postings[0])
+        return math.log(1 + (len(self.subjects) - df + 0.5) / (df + 0.5))
+
+    def search(self, text, limit=10):
+        """
+        Rank concepts by how well the text written about them matches a query.
+
+        Returns:
+            list: (subject IRI, score, coverage) of at most `limit` documents,
+            best first. Coverage is the score over the best score the query
+            could reach, between 0 and 1.
+        """
+        query = dict.fromkeys(terms(text))
+        scores = {}
+        best = 0.0
+        for term in query:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            idf = self.idf(term)
+            best += idf * (self.k1 + 1)
+            docs, weights = postings
+            for i in range(min(len(docs), self.max_postings)):
+                doc = docs[i]
+                scores[doc] = scores.get(doc, 0.0) + idf * weights[i]
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(self.subjects[doc], score, score / best) for doc, score in top]
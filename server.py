@@ -0,0 +1,269 @@
+"""Preforking server: load the app once, fork workers that share it.
+
+The master process imports app.py, which loads the ontology and renders
+its answers, loads the spaCy pipeline, and moves everything loaded so far
+to the collector's permanent generation with gc.freeze(). Workers forked
+from it share those pages copy-on-write: garbage collection in a worker
+never walks (and so never writes to) the frozen objects. Each worker
+serves the shared listening socket with a thread per request.
+
+The master only supervises. It restarts workers that die, and watches the
+ontology files itself: when a new version is loaded, it forks a new
+generation of workers sharing that version, and retires the old ones once
+the new ones are ready. SIGHUP restarts the workers the same way.
+SIGTERM and SIGINT stop them after their requests in progress.
+
+    python server.py [--bind 127.0.0.1:5000] [--workers 4]
+
+--workers 0 serves from the master process itself, without forking.
+"""
+import argparse
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+log = logging.getLogger('cryptology.server')
+
+# Seconds a retiring worker gets to finish its requests before it is killed
+GRACEFUL_TIMEOUT = 30
+# Seconds an idle keep-alive connection is held open, so that retiring
+# workers are not kept waiting by clients that send nothing more
+KEEPALIVE_TIMEOUT = 10
+
+
+class RequestHandler(WSGIRequestHandler):
+    timeout = KEEPALIVE_TIMEOUT
+
+
+def load_app(preload_nlp=True):
+    """Import the app, loading the ontology, and the spaCy pipeline it would load on first use"""
+    import app
+    ontology = app.ontologies.get()
+    if preload_nlp:
+        try:
+            ontology.processor.batcher
+            log.info('spaCy pipeline loaded in %.2f s', ontology.processor.timings['spacy_load'])
+        except OSError as e:
+            log.warning('spaCy pipeline not preloaded; workers load it on first use: %s', e)
+    return app
+
+
+def freeze():
+    """Move every object alive now out of the collector's reach"""
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+
+def digests(app):
+    return {version.name: version.digest for version in app.ontologies.loaded()}
+
+
+def serve(app, listener, state):
+    """Serve the listening socket until SIGTERM or SIGINT, then finish the requests in progress"""
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app.app, threaded=True, request_handler=RequestHandler,
+                         fd=listener.fileno())
+    # Join request threads on close instead of dropping them
+    server.daemon_threads = False
+
+    def drain(signum, frame):
+        state['draining'] = True
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain)
+    signal.signal(signal.SIGINT, drain)
+    return server
+
+
+class Master:
+    """Forks and supervises the workers"""
+
+    def __init__(self, app, listener, workers, poll_interval, freeze=True):
+        self.app = app
+        self.listener = listener
+        self.size = workers
+        self.poll_interval = poll_interval
+        self.freeze = freeze
+        self.generation = 0
+        self.announced = 0          # last generation found all ready
+        self.workers = {}           # pid -> (generation, index, fork time)
+        self.ready = set()          # pids that are serving
+        self.retiring = {}          # pid -> time it was asked to stop
+        self.stopping = False
+        self.restart_requested = False
+        self.digests = digests(app)
+        self._ready_read, self._ready_write = os.pipe()
+
+    def spawn(self, index):
+        forked_at = time.perf_counter()
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = (self.generation, index, forked_at)
+            return
+        # Worker
+        code = 0
+        try:
+            os.close(self._ready_read)
+            signal.signal(signal.SIGHUP, signal.SIG_DFL)
+            self.app.server_state.update({
+                'server': 'prefork', 'worker': index, 'generation': self.generation,
+                'master_pid': os.getppid(), 'started_at': time.time(), 'draining': False,
+            })
+            server = serve(self.app, self.listener, self.app.server_state)
+            os.write(self._ready_write, f'{os.getpid()}\n'.encode())
+            server.serve_forever()
+            server.server_close()
+        except BaseException:
+            log.exception('Worker %d failed', os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+
+    def spawn_generation(self):
+        """Fork a full set of workers from what the master has loaded now"""
+        self.generation += 1
+        if self.freeze:
+            freeze()
+        self.generation_started = time.perf_counter()
+        for index in range(self.size):
+            self.spawn(index)
+
+    def retire(self, pids):
+        now = time.monotonic()
+        for pid in pids:
+            if pid not in self.retiring:
+                self.retiring[pid] = now
+                self.kill(pid, signal.SIGTERM)
+
+    def kill(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def current(self):
+        return [pid for pid, (generation, _, _) in self.workers.items() if generation == self.generation]
+
+    def read_ready(self, timeout):
+        """Note the workers that started serving in the next `timeout` seconds"""
+        readable, _, _ = select.select([self._ready_read], [], [], timeout)
+        if not readable:
+            return
+        for line in os.read(self._ready_read, 4096).split():
+            pid = int(line)
+            if pid not in self.workers:
+                continue
+            self.ready.add(pid)
+            generation, index, forked_at = self.workers[pid]
+            log.info('Worker %d (#%d) ready %.0f ms after fork', pid, index, (time.perf_counter() - forked_at) * 1000)
+            current = self.current()
+            if generation == self.announced + 1 == self.generation and all(p in self.ready for p in current):
+                self.announced = generation
+                log.info('%d workers of generation %d ready in %.2f s', len(current), generation,
+                         time.perf_counter() - self.generation_started)
+                # The new generation serves; let the previous one finish
+                self.retire([p for p, (g, _, _) in self.workers.items() if g < self.generation])
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            generation, index, _ = self.workers.pop(pid, (None, None, None))
+            self.ready.discard(pid)
+            if self.retiring.pop(pid, None) is not None or generation is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if not self.stopping and generation == self.generation:
+                log.warning('Worker %d (#%d) exited with %d; restarting it', pid, index, code)
+                self.spawn(index)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGHUP, self._restart)
+        self.spawn_generation()
+        next_poll = time.monotonic() + self.poll_interval
+        while self.workers:
+            self.read_ready(0.5)
+            self.reap()
+            now = time.monotonic()
+            for pid, asked in list(self.retiring.items()):
+                if now - asked > GRACEFUL_TIMEOUT:
+                    log.warning('Worker %d did not stop in %d s; killing it', pid, GRACEFUL_TIMEOUT)
+                    self.kill(pid, signal.SIGKILL)
+            if self.stopping:
+                self.retire(list(self.workers))
+                continue
+            if self.poll_interval and now >= next_poll:
+                # Checked here rather than in a watcher thread: forking while
+                # another thread holds a lock would leave it held in the worker
+                self.app.ontologies.check()
+                next_poll = time.monotonic() + self.poll_interval
+                if digests(self.app) != self.digests:
+                    self.digests = digests(self.app)
+                    log.info('Ontology changed; starting generation %d', self.generation + 1)
+                    self.spawn_generation()
+            if self.restart_requested:
+                self.restart_requested = False
+                log.info('Restarting workers; starting generation %d', self.generation + 1)
+                self.spawn_generation()
+        log.info('All workers stopped')
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def _restart(self, signum, frame):
+        self.restart_requested = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bind', default=os.environ.get('BIND', '127.0.0.1:5000'), help='host:port; port 0 picks one')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--backlog', type=int, default=1024)
+    parser.add_argument('--no-preload-nlp', action='store_true', help='load spaCy in each worker on first use')
+    parser.add_argument('--no-freeze', action='store_true', help='fork without gc.freeze(), for comparison')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(process)d %(levelname)s %(message)s')
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    start = time.perf_counter()
+    # Without SECRET_KEY the app makes up a secret at import, here, so
+    # every worker still reads the sessions the others set
+    app = load_app(preload_nlp=not args.no_preload_nlp)
+    if args.workers > 1 and os.environ.get('CHAT_HISTORY_STORE', 'memory') == 'memory':
+        log.warning('Chat history is kept per worker; set CHAT_HISTORY_STORE=sqlite:///... to share it')
+    log.info('Loaded in %.2f s', time.perf_counter() - start)
+
+    host, port = args.bind.rsplit(':', 1)
+    listener = socket.create_server((host, int(port)), backlog=args.backlog)
+    listener.set_inheritable(True)
+    log.info('Listening on %s:%d with %d workers', host, listener.getsockname()[1], args.workers)
+
+    if args.workers == 0:
+        app.server_state['startup_seconds'] = time.perf_counter() - start
+        server = serve(app, listener, app.server_state)
+        server.serve_forever()
+        server.server_close()
+        return
+    # The master watches the ontology files itself, between supervising
+    app.ontologies.stop()
+    app.server_state['startup_seconds'] = time.perf_counter() - start
+    Master(app, listener, args.workers, app.ONTOLOGY_POLL_SECONDS, freeze=not args.no_freeze).run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RDF_FILE = os.path.join(ROOT, "crypto_2_1_1.rdf")
+
+
+@pytest.fixture(scope="session")
+def parser():
+    from ontology_parser import OntologyParser
+    return OntologyParser(RDF_FILE)
+
+
+@pytest.fixture(scope="session")
+def sparql_parser():
+    from ontology_parser import OntologyParser
+    return OntologyParser(RDF_FILE, use_sparql=True)
+
+
+@pytest.fixture(scope="session")
+def compact_parser():
+    from ontology_parser import OntologyParser
+    return OntologyParser(RDF_FILE, backend="compact")
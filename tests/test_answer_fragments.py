@@ -0,0 +1,59 @@
+import pytest
+
+from answer_generator import FRAGMENT_SLOTS, AnswerGenerator
+
+
+@pytest.fixture(scope="module")
+def generators(parser):
+    """A generator answering from precomputed blocks, and one looking everything up per request"""
+    precomputed = AnswerGenerator(parser)
+    precomputed.precompute()
+    return precomputed, AnswerGenerator(parser)
+
+
+def question(concepts, question_types, ref_type=None):
+    return {'concepts': concepts, 'question_types': question_types, 'ref_type': ref_type}
+
+
+def test_every_block_matches_the_per_request_answer(parser, generators):
+    precomputed, per_request = generators
+    for concept in parser.get_all_concepts():
+        assert concept in precomputed.fragments
+        for q_type, ref_type in FRAGMENT_SLOTS:
+            processed = question([concept], [q_type], ref_type)
+            assert precomputed.generate_answer(processed) == per_request.generate_answer(processed), \
+                (concept, q_type, ref_type)
+
+
+@pytest.mark.parametrize("processed", [
+    question(["qkd", "bb84"], ["definition", "acronym"]),
+    question(["advanced encryption standard", "cryptography"], ["related", "references"], "wiki"),
+    question(["qkd"], ["references"], "bogus"),
+    question(["qkd protocl"], ["definition"]),       # answered from the closest concept name
+    question(["nothing like any concept"], ["definition"]),
+])
+def test_questions_match_the_per_request_answer(generators, processed):
+    precomputed, per_request = generators
+    assert precomputed.generate_answer(processed) == per_request.generate_answer(processed)
+
+
+def test_unchanged_ontology_keeps_every_block(parser, generators):
+    precomputed, _ = generators
+    previous = precomputed.fragments
+    generator = AnswerGenerator(parser)
+    fragments = generator.precompute(previous)
+    assert fragments.rendered == 0
+    assert fragments.blocks == AnswerGenerator(parser).precompute().blocks
+
+
+def test_changed_concept_is_rendered_again(parser, generators):
+    precomputed, _ = generators
+    previous = precomputed.fragments
+    record, names = previous.sources["qkd"]
+    # As if qkd's relations had been named differently before
+    stale = AnswerGenerator(parser).precompute()
+    stale.sources["qkd"] = (record, [name + " (old)" for name in names])
+    stale.blocks["qkd"] = tuple(None for _ in FRAGMENT_SLOTS)
+    fragments = AnswerGenerator(parser).precompute(stale)
+    assert fragments.rendered == 1
+    assert fragments.blocks == previous.blocks
@@ -0,0 +1,49 @@
+from answer_generator import AnswerGenerator
+from answer_renderer import CLOSING_PHRASE, render_answer, render_fragment
+
+APOSTROPHE_URL = "https://en.wikipedia.org/wiki/Shor's_algorithm"
+QUERY_URL = "https://example.org/search?q=bb84&lang=en"
+
+
+def anchor(href, label=None):
+    return f'<a href="{href}" target="_blank" rel="noopener">{label or href}</a>'
+
+
+def references_block(*references):
+    record = {'references': list(references)}
+    return AnswerGenerator(None)._render('bb84', 'references', record)
+
+
+def test_reference_with_apostrophe():
+    block = references_block((APOSTROPHE_URL, 'http://example.org/onto#wikipedia_link'))
+    href = "https://en.wikipedia.org/wiki/Shor&#x27;s_algorithm"
+    assert render_fragment(block) == f"🔗 References:\n• Wikipedia Entry: {anchor(href)}"
+
+
+def test_reference_with_query():
+    block = references_block((QUERY_URL, 'http://example.org/onto#url'))
+    href = "https://example.org/search?q=bb84&amp;lang=en"
+    assert render_fragment(block) == f"🔗 References:\n• Url: {anchor(href)}"
+
+
+def test_anchor_with_apostrophe_in_single_quoted_href():
+    text = f"see <a href='{APOSTROPHE_URL}' target='_blank'>Shor</a> and <a href='{QUERY_URL}'>search</a>"
+    assert render_fragment(text) == (
+        f"see {anchor('https://en.wikipedia.org/wiki/Shor&#x27;s_algorithm', 'Shor')}"
+        f" and {anchor('https://example.org/search?q=bb84&amp;lang=en', 'search')}")
+
+
+def test_bare_url_stops_at_punctuation_and_quotes():
+    assert render_fragment("read 'https://example.org/a'.") == (
+        f"read &#x27;{anchor('https://example.org/a')}&#x27;.")
+    assert render_fragment("(see https://example.org/a_(b))") == (
+        f"(see {anchor('https://example.org/a_(b)')})")
+
+
+def test_text_is_escaped():
+    assert render_fragment("<b>AES</b> & DES") == "&lt;b&gt;AES&lt;/b&gt; &amp; DES"
+
+
+def test_closing_phrase_is_kept_once_at_the_end():
+    answer = f"AES\n{CLOSING_PHRASE}\nDES {CLOSING_PHRASE}"
+    assert render_answer(answer) == f"AES\nDES \n{CLOSING_PHRASE}"
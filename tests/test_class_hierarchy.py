@@ -0,0 +1,46 @@
+import pytest
+from rdflib import Graph, URIRef
+from rdflib.namespace import RDFS
+
+from class_hierarchy import ClassHierarchy
+
+EX = "http://example.org/#"
+
+
+def hierarchy(*edges):
+    graph = Graph()
+    for sub, sup in edges:
+        graph.add((URIRef(EX + sub), RDFS.subClassOf, URIRef(EX + sup)))
+    return ClassHierarchy(graph)
+
+
+def names(iris):
+    return sorted(iri[len(EX):] for iri in iris)
+
+
+def test_class_is_not_its_own_subclass_or_superclass():
+    h = hierarchy(("a", "b"), ("b", "c"))
+    assert names(h.subclasses([EX + "c"])) == ["a", "b"]
+    assert names(h.superclasses([EX + "a"])) == ["b", "c"]
+
+
+def test_classes_asked_about_together_stay_in_each_others_closure():
+    # b is a subclass of c, so it is among the subclasses of {b, c}
+    h = hierarchy(("a", "b"), ("b", "c"))
+    assert names(h.subclasses([EX + "b", EX + "c"])) == ["a", "b"]
+    assert names(h.superclasses([EX + "a", EX + "b"])) == ["b", "c"]
+
+
+def test_subclass_cycle():
+    h = hierarchy(("a", "b"), ("b", "a"), ("c", "a"))
+    assert names(h.subclasses([EX + "a"])) == ["b", "c"]
+    assert h.is_a(EX + "a", EX + "b") and h.is_a(EX + "b", EX + "a")
+
+
+@pytest.mark.parametrize("accessor", ["get_subclasses", "get_superclasses"])
+def test_label_of_several_classes_matches_sparql(parser, sparql_parser, accessor):
+    # 'Q' labels several classes, some of them below others
+    assert len(parser._resolve_classes("Q")) > 1
+    indexed = sorted(getattr(parser, accessor)("Q"))
+    assert indexed
+    assert indexed == sorted(getattr(sparql_parser, accessor)("Q"))
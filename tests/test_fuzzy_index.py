@@ -0,0 +1,82 @@
+import itertools
+import random
+
+import pytest
+
+from fuzzy_index import FuzzyIndex, edit_distance
+
+
+def osa_distance(a, b):
+    """Optimal string alignment distance by the textbook dynamic programme"""
+    rows = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a) + 1):
+        rows[i][0] = i
+    for j in range(len(b) + 1):
+        rows[0][j] = j
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            rows[i][j] = min(rows[i - 1][j] + 1, rows[i][j - 1] + 1, rows[i - 1][j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                rows[i][j] = min(rows[i][j], rows[i - 2][j - 2] + 1)
+    return rows[-1][-1]
+
+
+def expected(a, b, limit):
+    distance = osa_distance(a, b)
+    return distance if distance <= limit else limit + 1
+
+
+def test_every_pair_of_short_strings():
+    words = [''.join(chars) for length in range(5) for chars in itertools.product('abc', repeat=length)]
+    for a in words:
+        for b in words:
+            for limit in (0, 1, 2, 5):
+                assert edit_distance(a, b, limit) == expected(a, b, limit), (a, b, limit)
+
+
+def test_random_strings():
+    rng = random.Random(0)
+    for _ in range(3000):
+        a = ''.join(rng.choice('abcde') for _ in range(rng.randint(0, 20)))
+        b = list(a)
+        # A few random edits, so that most pairs are close
+        for _ in range(rng.randint(0, 4)):
+            i = rng.randint(0, len(b))
+            op = rng.choice('idst')
+            if op == 'i':
+                b.insert(i, rng.choice('abcdef'))
+            elif b and i < len(b):
+                if op == 'd':
+                    del b[i]
+                elif op == 's':
+                    b[i] = rng.choice('abcdef')
+                elif i + 1 < len(b):
+                    b[i], b[i + 1] = b[i + 1], b[i]
+        b = ''.join(b)
+        limit = rng.randint(0, 4)
+        assert edit_distance(a, b, limit) == expected(a, b, limit), (a, b, limit)
+
+
+def test_long_strings():
+    # Wider than a machine word: the bit vectors are Python ints
+    rng = random.Random(1)
+    a = ''.join(rng.choice('abcd') for _ in range(150))
+    b = a[:40] + a[41] + a[40] + a[42:100] + 'x' + a[100:]
+    assert edit_distance(a, b, 3) == osa_distance(a, b) == 2
+
+
+@pytest.mark.parametrize("a, b, distance", [
+    ("eliptic", "elliptic", 1),
+    ("crpytography", "cryptography", 1),
+    ("ca", "abc", 3),  # no edits of a transposed pair, unlike Damerau-Levenshtein
+])
+def test_known_distances(a, b, distance):
+    assert edit_distance(a, b, 5) == distance
+
+
+def test_misspelled_name_is_found():
+    index = FuzzyIndex([("elliptic curve cryptography", "elliptic curve cryptography"),
+                        ("ecc", "elliptic curve cryptography"),
+                        ("quantum key distribution", "quantum key distribution")])
+    assert index.match("what is eliptic curve cryptograhpy")[0] == "elliptic curve cryptography"
@@ -0,0 +1,47 @@
+import pytest
+
+from question_classifier import QuestionClassifier
+
+# (question, expected question types, expected ref_type)
+CASES = [
+    ("what is bb84", ['definition'], None),
+    ("define quantum key distribution", ['definition'], None),
+    ("what does qkd mean?", ['definition'], None),
+    ("tell me about the one-time pad", ['definition'], None),
+    ("bb84", ['definition'], None),
+    ("what is the acronym for advanced encryption standard", ['acronym'], None),
+    ("what is aes and its abbreviation", ['definition', 'acronym'], None),
+    ("what does ecc stand for", ['acronym'], None),
+    ("ecc stands for what?", ['acronym'], None),
+    ("give me the wikipedia entry for rsa", ['references'], 'wiki'),
+    ("link to the bb84 article", ['references'], 'url'),
+    ("is there a pdf or a wiki page about bb84", ['references'], 'pdf'),
+    ("doi of the e91 paper", ['references'], 'doi'),
+    ("any publications on quantum repeaters", ['references'], 'paper'),
+    ("where can i find references about qkd", ['references'], None),
+    ("further reading on lattice cryptography", ['references'], None),
+    ("what are the other names for a caesar cipher", ['definition', 'alternative_names'], None),
+    ("is rsa also known as something else", ['alternative_names'], None),
+    ("which category does bb84 belong to", ['category'], None),
+    ("what kind of protocol is e91", ['category'], None),
+    ("what are the types of block cipher", ['subclass'], None),
+    ("give examples of qkd protocols", ['subclass'], None),
+    ("what is the parent of bb84", ['superclass'], None),
+    ("bb84 is classified as what", ['superclass'], None),
+    ("what is related to quantum entanglement", ['related'], None),
+    ("connection between bb84 and e91", ['related'], None),
+    ("tell me more about bb84", ['comments'], None),
+    ("explain bb84 in detail and give me links", ['definition', 'comments', 'references'], 'url'),
+    ("what is the meaning of cipher and what are its references", ['definition', 'references'], None),
+    ("doing cryptography in a secure way", ['definition'], None),
+]
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return QuestionClassifier()
+
+
+@pytest.mark.parametrize("question, question_types, ref_type", CASES)
+def test_classify(classifier, question, question_types, ref_type):
+    assert classifier.classify(question) == (question_types, ref_type)
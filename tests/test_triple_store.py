@@ -0,0 +1,88 @@
+import pytest
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.namespace import RDFS
+
+from ontology_parser import ASPECTS, READ_PREDICATES, RELATION_PREDICATES
+from triple_store import TripleStore
+
+# Labels whose relations are compared with SPARQL, which takes seconds each
+RELATED_SAMPLE = ["qkd", "advanced encryption standard", "cryptography"]
+
+
+@pytest.fixture(scope="module")
+def graph(parser):
+    return parser.g
+
+
+@pytest.fixture(scope="module")
+def store(graph):
+    return TripleStore.from_graph(graph, READ_PREDICATES)
+
+
+def sample(parser, step):
+    return parser.get_all_concepts()[::step]
+
+
+def rdflib_values(graph, subject, predicate):
+    return [str(o) for o in graph.objects(subject, predicate) if not isinstance(o, BNode)]
+
+
+def test_values_match_rdflib(graph, store):
+    subjects = [s for s in dict.fromkeys(graph.subjects()) if isinstance(s, URIRef)]
+    assert subjects
+    for subject in subjects[::5]:
+        for predicate in READ_PREDICATES:
+            assert store.values(subject, predicate) == rdflib_values(graph, subject, predicate), (subject, predicate)
+
+
+def test_subclass_pattern_matches_rdflib(graph, store):
+    for parent in set(graph.objects(None, RDFS.subClassOf)):
+        if isinstance(parent, URIRef):
+            assert set(store.subjects(RDFS.subClassOf, parent)) == {
+                s for s in graph.subjects(RDFS.subClassOf, parent) if not isinstance(s, BNode)}, parent
+
+
+def test_relation_pattern_matches_rdflib(graph, store):
+    for predicate in RELATION_PREDICATES:
+        assert set(store.subject_objects(predicate)) == {
+            (s, o) for s, o in graph.subject_objects(predicate)
+            if not isinstance(s, BNode) and not isinstance(o, BNode)}, predicate
+
+
+def test_literals_keep_their_lexical_form():
+    subject, label = URIRef("http://example.org/#aes"), Literal("AES", lang="en")
+    graph = Graph()
+    graph.add((subject, RDFS.label, label))
+    graph.add((subject, RDFS.subClassOf, BNode()))
+    store = TripleStore.from_graph(graph)
+    assert store.values(subject, RDFS.label) == ["AES"]
+    assert list(store) == [(subject, RDFS.label, Literal("AES"))]
+
+
+def test_compact_backend_matches_rdflib_backend(parser, compact_parser):
+    concepts = parser.get_all_concepts()
+    assert compact_parser.get_all_concepts() == concepts
+    aspects = sorted(ASPECTS)
+    assert compact_parser.lookup(concepts, aspects) == parser.lookup(concepts, aspects)
+
+
+@pytest.mark.parametrize("aspect", ["subclasses", "superclasses", "definition", "comments", "acronyms",
+                                    "alternative_names", "proper_label"])
+def test_compact_backend_matches_sparql(compact_parser, sparql_parser, aspect):
+    # SPARQL does not order its results
+    for concept in sample(compact_parser, 10):
+        assert sorted(compact_parser.lookup([concept], [aspect])[concept]) == sorted(
+            sparql_parser.lookup([concept], [aspect])[concept]), concept
+
+
+def test_compact_references_match_sparql(compact_parser, sparql_parser):
+    for concept in sample(compact_parser, 25):
+        assert sorted(compact_parser.get_references(concept)) == sorted(
+            sparql_parser.get_references(concept)), concept
+
+
+@pytest.mark.parametrize("concept", RELATED_SAMPLE)
+def test_compact_related_matches_sparql(compact_parser, sparql_parser, concept):
+    related = compact_parser.get_related_concepts(concept)
+    assert related
+    assert sorted(related) == sorted(sparql_parser.get_related_concepts(concept))
@@ -0,0 +1,151 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from rdflib import BNode, Literal, URIRef
+
+
+class TripleStore:
+    """Read-only triples with every term interned to an integer id.
+
+    Terms are kept once each, in `terms`; triples are three parallel arrays
+    of 32-bit ids sorted by subject then predicate (SPO), plus the same
+    triples sorted by predicate then object (POS). The run of triples of a
+    subject starts at `subject_start[id]`; a predicate within that run, or
+    the run of a predicate in POS, is found by binary search. Within a run the triples keep the order of the graph they
+    were read from, so values come back in the same order as from rdflib.
+
+    Only what the parser reads is kept: triples of the given predicates
+    between IRIs and literals. Blank nodes (OWL restrictions) are dropped.
+    Literals keep their lexical form only.
+    """
+
+    def __init__(self, triples):
+        """
+        Args:
+            triples (iterable): (subject, predicate, object) rdflib terms
+        """
+        self.terms = []                 # id -> IRI or lexical form
+        self.literal = bytearray()      # id -> 1 if the term is a literal
+        self._ids = {}                  # IRI -> id
+        literal_ids = {}                # lexical form -> id, only while loading
+
+        def intern(term):
+            if isinstance(term, Literal):
+                key, ids, flag = str(term), literal_ids, 1
+            else:
+                key, ids, flag = str(term), self._ids, 0
+            term_id = ids.get(key)
+            if term_id is None:
+                term_id = ids[key] = len(self.terms)
+                self.terms.append(key)
+                self.literal.append(flag)
+            return term_id
+
+        rows = []
+        for s, p, o in triples:
+            if isinstance(s, BNode) or isinstance(o, BNode):
+                continue
+            rows.append((intern(s), intern(p), intern(o)))
+
+        # Stable sorts: triples sharing a key stay in the order they were read
+        spo = sorted(rows, key=lambda row: (row[0], row[1]))
+        self.spo_s = array('i', (row[0] for row in spo))
+        self.spo_p = array('i', (row[1] for row in spo))
+        self.spo_o = array('i', (row[2] for row in spo))
+        # subject_start[id]:subject_start[id + 1] is the SPO run of a subject
+        self.subject_start = array('i', [0] * (len(self.terms) + 1))
+        for s in self.spo_s:
+            self.subject_start[s + 1] += 1
+        for term_id in range(len(self.terms)):
+            self.subject_start[term_id + 1] += self.subject_start[term_id]
+        pos = sorted(rows, key=lambda row: (row[1], row[2]))
+        self.pos_p = array('i', (row[1] for row in pos))
+        self.pos_o = array('i', (row[2] for row in pos))
+        self.pos_s = array('i', (row[0] for row in pos))
+
+    @classmethod
+    def from_graph(cls, graph, predicates=None):
+        """Copy the triples of the given predicates (all by default) out of an rdflib graph"""
+        predicates = None if predicates is None else set(predicates)
+        # Subject by subject, so each subject's values keep the order rdflib
+        # returns them in for that subject
+        return cls((s, p, o) for s in dict.fromkeys(graph.subjects())
+                   for p, o in graph.predicate_objects(s)
+                   if predicates is None or p in predicates)
+
+    def __len__(self):
+        return len(self.spo_s)
+
+    def _term(self, term_id):
+        value = self.terms[term_id]
+        return Literal(value) if self.literal[term_id] else URIRef(value)
+
+    def _id(self, term):
+        """Id of an IRI; None if it is not in the store"""
+        if term is None or isinstance(term, Literal):
+            return None
+        return self._ids.get(str(term))
+
+    @staticmethod
+    def _run(column, key, lo, hi):
+        lo = bisect_left(column, key, lo, hi)
+        return lo, bisect_right(column, key, lo, hi)
+
+    def values(self, subject, predicate):
+        """
+        Values of one predicate of one subject, as strings.
+
+        This is the lookup the parser makes per concept, so it skips building
+        rdflib terms.
+        """
+        s, p = self._ids.get(str(subject)), self._ids.get(str(predicate))
+        if s is None or p is None:
+            return []
+        lo, hi = self._run(self.spo_p, p, self.subject_start[s], self.subject_start[s + 1])
+        return [self.terms[o] for o in self.spo_o[lo:hi]]
+
+    def triples(self, pattern):
+        """rdflib-style triple pattern match; unbound positions are None.
+
+        Objects can only be matched when they are IRIs.
+        """
+        s, p, o = pattern
+        s_id, p_id, o_id = self._id(s), self._id(p), self._id(o)
+        if (s is not None and s_id is None) or (p is not None and p_id is None) \
+                or (o is not None and o_id is None):
+            return
+        if s is not None:
+            lo, hi = self.subject_start[s_id], self.subject_start[s_id + 1]
+            if p is not None:
+                lo, hi = self._run(self.spo_p, p_id, lo, hi)
+            for i in range(lo, hi):
+                if o is None or self.spo_o[i] == o_id:
+                    yield self._term(s_id), self._term(self.spo_p[i]), self._term(self.spo_o[i])
+        elif p is not None:
+            lo, hi = self._run(self.pos_p, p_id, 0, len(self.pos_p))
+            if o is not None:
+                lo, hi = self._run(self.pos_o, o_id, lo, hi)
+            for i in range(lo, hi):
+                yield self._term(self.pos_s[i]), self._term(p_id), self._term(self.pos_o[i])
+        else:
+            for i in range(len(self.spo_s)):
+                if o is None or self.spo_o[i] == o_id:
+                    yield self._term(self.spo_s[i]), self._term(self.spo_p[i]), self._term(self.spo_o[i])
+
+    def __iter__(self):
+        return self.triples((None, None, None))
+
+    def subjects(self, predicate=None, object=None):
+        for s, _, _ in self.triples((None, predicate, object)):
+            yield s
+
+    def objects(self, subject=None, predicate=None):
+        for _, _, o in self.triples((subject, predicate, None)):
+            yield o
+
+    def subject_objects(self, predicate=None):
+        for s, _, o in self.triples((None, predicate, None)):
+            yield s, o
+
+    def predicate_objects(self, subject=None):
+        for _, p, o in self.triples((subject, None, None)):
+            yield p, o